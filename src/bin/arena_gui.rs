@@ -2,14 +2,17 @@ use chessmind::{
     engine::Engine,
     game::Game,
     pieces::{Color, Piece, PieceType},
+    types::pop_lsb,
 };
 use eframe::{App, Frame, egui};
 use egui::Color32;
-use num_cpus;
 use rand::seq::SliceRandom;
 use rand::thread_rng;
 use std::time::{Duration, Instant};
 
+const LIGHT_SQUARE: Color32 = Color32::from_rgb(240, 217, 181);
+const DARK_SQUARE: Color32 = Color32::from_rgb(181, 136, 99);
+
 #[derive(PartialEq)]
 enum Opponent {
     AiVsAi,
@@ -154,8 +157,11 @@ impl App for ArenaApp {
                 ui.allocate_exact_size(egui::vec2(board_size, board_size), egui::Sense::hover());
 
             let painter = ui.painter();
-            for x in 0..8 {
-                for y in 0..8 {
+            // One light rectangle under the whole board, then the 32 dark
+            // squares on top, instead of a shape per square.
+            painter.rect_filled(rect, 0.0, LIGHT_SQUARE);
+            for y in 0..8 {
+                for x in (1 - y % 2..8).step_by(2) {
                     let sq_rect = egui::Rect::from_min_size(
                         egui::pos2(
                             rect.left() + x as f32 * square_size,
@@ -163,45 +169,49 @@ impl App for ArenaApp {
                         ),
                         egui::vec2(square_size, square_size),
                     );
-                    let light = Color32::from_rgb(240, 217, 181);
-                    let dark = Color32::from_rgb(181, 136, 99);
-                    let color = if (x + y) % 2 == 0 { light } else { dark };
-                    painter.rect_filled(sq_rect, 0.0, color);
+                    painter.rect_filled(sq_rect, 0.0, DARK_SQUARE);
                 }
             }
 
-            for x in 0..8 {
-                for y in 0..8 {
-                    if let Some(p) = self.game.board.get_index(x, y) {
-                        let sq_rect = egui::Rect::from_min_size(
-                            egui::pos2(
-                                rect.left() + x as f32 * square_size,
-                                rect.top() + (7 - y) as f32 * square_size,
-                            ),
-                            egui::vec2(square_size, square_size),
-                        );
-                        painter.text(
-                            sq_rect.center(),
-                            egui::Align2::CENTER_CENTER,
-                            Self::piece_char(&p),
-                            egui::FontId::proportional(square_size * 0.8),
-                            if p.color == Color::White {
-                                egui::Color32::WHITE
-                            } else {
-                                egui::Color32::BLACK
-                            },
-                        );
-                    }
+            let mut occupied = self.game.board.occupied();
+            while occupied != 0 {
+                let sq = pop_lsb(&mut occupied);
+                let (x, y) = (sq % 8, sq / 8);
+                if let Some(p) = self.game.board.get_sq(sq as u8) {
+                    let sq_rect = egui::Rect::from_min_size(
+                        egui::pos2(
+                            rect.left() + x as f32 * square_size,
+                            rect.top() + (7 - y) as f32 * square_size,
+                        ),
+                        egui::vec2(square_size, square_size),
+                    );
+                    painter.text(
+                        sq_rect.center(),
+                        egui::Align2::CENTER_CENTER,
+                        Self::piece_char(&p),
+                        egui::FontId::proportional(square_size * 0.8),
+                        if p.color == Color::White {
+                            egui::Color32::WHITE
+                        } else {
+                            egui::Color32::BLACK
+                        },
+                    );
                 }
             }
         });
 
-        if self.running && self.last_move.elapsed() >= self.move_delay {
-            self.step();
-            self.last_move = Instant::now();
+        // The board only changes when a move is played, so repaint for the
+        // new position and otherwise sleep until the next move is due
+        // instead of redrawing every frame. Input still wakes the UI.
+        if self.running {
+            if self.last_move.elapsed() >= self.move_delay {
+                self.step();
+                self.last_move = Instant::now();
+                ctx.request_repaint();
+            } else {
+                ctx.request_repaint_after(self.move_delay.saturating_sub(self.last_move.elapsed()));
+            }
         }
-
-        ctx.request_repaint();
     }
 }
 
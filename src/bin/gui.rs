@@ -3,12 +3,15 @@ use chessmind::{
     engine::{Engine, TimeConfig},
     game::Game,
     pieces::{Color, Piece, PieceType},
+    types::pop_lsb,
 };
 use eframe::{App, Frame, egui};
 use egui::Color32;
-use num_cpus;
 use std::time::{Duration, Instant};
 
+const LIGHT_SQUARE: Color32 = Color32::from_rgb(240, 217, 181);
+const DARK_SQUARE: Color32 = Color32::from_rgb(181, 136, 99);
+
 #[derive(Clone, Copy, PartialEq)]
 enum TimePreset {
     Bullet1,   // 1+0
@@ -253,11 +256,7 @@ impl GuiApp {
                 self.last_ai_time = Some(duration);
 
                 if self.use_clock && self.game_started {
-                    let next_color = if self.ai_color == Color::White {
-                        Color::Black
-                    } else {
-                        Color::White
-                    };
+                    let next_color = self.ai_color.opposite();
                     self.clock.switch(next_color);
                 }
 
@@ -316,8 +315,10 @@ impl GuiApp {
 
 impl App for GuiApp {
     fn update(&mut self, ctx: &egui::Context, _frame: &mut Frame) {
+        // The clock text changes at most every tenth of a second; repaint at
+        // that rate rather than every frame. Moves and drags repaint on input.
         if self.use_clock && self.game_started && self.clock.running {
-            ctx.request_repaint();
+            ctx.request_repaint_after(Duration::from_millis(100));
         }
 
         self.check_ai_move();
@@ -494,8 +495,11 @@ impl App for GuiApp {
 
                     let painter = ui.painter();
 
-                    for x in 0..8 {
-                        for y in 0..8 {
+                    // One light rectangle under the whole board, then the 32 dark
+                    // squares on top, instead of a shape per square.
+                    painter.rect_filled(rect, 0.0, LIGHT_SQUARE);
+                    for y in 0..8 {
+                        for x in (1 - y % 2..8).step_by(2) {
                             let sq_rect = egui::Rect::from_min_size(
                                 egui::pos2(
                                     rect.left() + x as f32 * square_size,
@@ -503,42 +507,42 @@ impl App for GuiApp {
                                 ),
                                 egui::vec2(square_size, square_size),
                             );
-                            let light = Color32::from_rgb(240, 217, 181);
-                            let dark = Color32::from_rgb(181, 136, 99);
-                            let color = if (x + y) % 2 == 0 { light } else { dark };
-                            painter.rect_filled(sq_rect, 0.0, color);
+                            painter.rect_filled(sq_rect, 0.0, DARK_SQUARE);
                         }
                     }
 
-                    for x in 0..8 {
-                        for y in 0..8 {
-                            let piece_opt = self.game.board.get_index(x, y);
-                            if let Some(p) = piece_opt {
-                                if let Some((dx, dy, _)) = self.dragging {
-                                    if dx == x && dy == y {
-                                        continue;
-                                    }
-                                }
-                                let sq_rect = egui::Rect::from_min_size(
-                                    egui::pos2(
-                                        rect.left() + x as f32 * square_size,
-                                        rect.top() + (7 - y) as f32 * square_size,
-                                    ),
-                                    egui::vec2(square_size, square_size),
-                                );
-                                painter.text(
-                                    sq_rect.center(),
-                                    egui::Align2::CENTER_CENTER,
-                                    Self::piece_char(&p),
-                                    egui::FontId::proportional(square_size * 0.8),
-                                    if p.color == Color::White {
-                                        egui::Color32::WHITE
-                                    } else {
-                                        egui::Color32::BLACK
-                                    },
-                                );
+                    // Only occupied squares carry a piece; walk their bits
+                    // rather than probing all 64.
+                    let mut occupied = self.game.board.occupied();
+                    while occupied != 0 {
+                        let sq = pop_lsb(&mut occupied);
+                        let (x, y) = (sq % 8, sq / 8);
+                        let Some(p) = self.game.board.get_sq(sq as u8) else {
+                            continue;
+                        };
+                        if let Some((dx, dy, _)) = self.dragging {
+                            if dx == x && dy == y {
+                                continue;
                             }
                         }
+                        let sq_rect = egui::Rect::from_min_size(
+                            egui::pos2(
+                                rect.left() + x as f32 * square_size,
+                                rect.top() + (7 - y) as f32 * square_size,
+                            ),
+                            egui::vec2(square_size, square_size),
+                        );
+                        painter.text(
+                            sq_rect.center(),
+                            egui::Align2::CENTER_CENTER,
+                            Self::piece_char(&p),
+                            egui::FontId::proportional(square_size * 0.8),
+                            if p.color == Color::White {
+                                egui::Color32::WHITE
+                            } else {
+                                egui::Color32::BLACK
+                            },
+                        );
                     }
 
                     if response.drag_started() {
@@ -5,23 +5,103 @@ use chessmind::{
     san::parse_san,
 };
 use futures_util::{SinkExt, StreamExt};
-use num_cpus;
 use serde::Deserialize;
-use serde_json;
+use std::collections::HashMap;
 use std::env;
 use std::time::Instant;
 use tokio::net::TcpListener;
-use tokio_tungstenite::{accept_async, tungstenite::Message};
+use tokio_tungstenite::{
+    accept_async_with_config,
+    tungstenite::{Message, protocol::WebSocketConfig},
+};
 
+/// Whether `mv` starts with two square names (`e2e4`, `e7e8q`). Each byte
+/// is range-checked with one unsigned comparison.
 fn is_coordinate(mv: &str) -> bool {
-    mv.len() >= 4
-        && mv.as_bytes()[0].is_ascii_lowercase()
-        && mv.as_bytes()[1].is_ascii_digit()
-        && mv.as_bytes()[2].is_ascii_lowercase()
-        && mv.as_bytes()[3].is_ascii_digit()
+    let b = mv.as_bytes();
+    b.len() >= 4
+        && b[0].wrapping_sub(b'a') < 8
+        && b[1].wrapping_sub(b'1') < 8
+        && b[2].wrapping_sub(b'a') < 8
+        && b[3].wrapping_sub(b'1') < 8
 }
 
-#[derive(Deserialize)]
+/// Plays a move that passed `is_coordinate`. A promotion letter in the
+/// fifth place is passed on lowercased (`e7e8Q` promotes to a queen);
+/// anything after the move is ignored.
+fn play_coordinate(game: &mut Game, mv: &str) -> bool {
+    let mut end = String::with_capacity(3);
+    end.push_str(&mv[2..4]);
+    if let Some(c @ (b'q' | b'r' | b'b' | b'n')) = mv.as_bytes().get(4).map(u8::to_ascii_lowercase)
+    {
+        end.push(c as char);
+    }
+    game.make_move(&mv[0..2], &end)
+}
+
+/// Frames in this protocol are coordinates and short JSON objects; the
+/// largest is a full move list, a few kilobytes even in long games. Cap
+/// messages well below tungstenite's 64 MiB default so a client cannot make
+/// the server buffer more than that.
+const MAX_MESSAGE_SIZE: usize = 64 << 10;
+
+const RESULT_WHITE: &str = r#"{"result":"white"}"#;
+const RESULT_BLACK: &str = r#"{"result":"black"}"#;
+
+/// The reply carrying the engine's move. Square names and promotion letters
+/// never need escaping, so the JSON is written directly rather than built
+/// as a `serde_json::Value` first.
+fn move_reply(start: &str, end: &str, time_ms: u128) -> String {
+    format!(r#"{{"next_move":"{start}{end}","time_ms":{time_ms}}}"#)
+}
+
+/// Runs `best_move_timed` on tokio's blocking pool, so a long search does
+/// not stall the event loop and every other connection on it. The engine
+/// and game are moved into the search and handed back with its result.
+async fn search(
+    mut engine: Engine,
+    mut game: Game,
+    config: TimeConfig,
+) -> (Engine, Game, Option<((String, String), u32)>) {
+    tokio::task::spawn_blocking(move || {
+        let best = engine.best_move_timed(&mut game, &config);
+        (engine, game, best)
+    })
+    .await
+    .expect("search task panicked")
+}
+
+/// Parsed SAN keyed on the position it was played from and the move text.
+type SanCache = HashMap<(u64, String), (String, String)>;
+
+/// Entries kept per connection before the cache is emptied; a game's worth
+/// of moves is a few hundred.
+const SAN_CACHE_LIMIT: usize = 4096;
+
+/// `parse_san`, memoised per connection. A move list that does not extend
+/// the previous one is replayed from the start, so the same SAN is parsed
+/// from the same position again. Text that does not parse is not cached,
+/// and the cache is cleared once it reaches `SAN_CACHE_LIMIT`, so a client
+/// cannot grow it without bound.
+fn parse_san_cached(
+    cache: &mut SanCache,
+    game: &mut Game,
+    san: &str,
+    color: Color,
+) -> Option<(String, String)> {
+    let key = (game.board.hash(color), san.to_string());
+    if let Some(parsed) = cache.get(&key) {
+        return Some(parsed.clone());
+    }
+    let parsed = parse_san(game, san, color)?;
+    if cache.len() >= SAN_CACHE_LIMIT {
+        cache.clear();
+    }
+    cache.insert(key, parsed.clone());
+    Some(parsed)
+}
+
+#[derive(Deserialize, PartialEq)]
 struct MoveEntry {
     #[serde(rename = "move")]
     mov: String,
@@ -125,25 +205,50 @@ async fn main() {
     let listener = TcpListener::bind(&addr).await.expect("bind");
     println!("WebSocket server on ws://{}", addr);
     println!("Supports time control: wtime, btime, winc, binc, movestogo, depth, movetime");
+
+    // Built once and cloned per connection. Clones share the transposition
+    // table and tablebases, so entries stay warm from one game (and client)
+    // to the next, while search state such as history tables stays per
+    // connection.
+    let mut engine = Engine::from_env(6, num_cpus::get());
+    if let Ok(Some(path)) = engine.load_syzygy_from_env() {
+        println!("Loaded Syzygy tablebases from {}", path);
+    }
+
+    // Echoing every frame locks and writes stdout per message, and a full
+    // move list runs to kilobytes, so it is opt-in.
+    let log_messages = env::var_os("CHESSMIND_LOG_MESSAGES").is_some();
+
     while let Ok((stream, addr)) = listener.accept().await {
         println!("Client connected: {}", addr);
-        tokio::spawn(handle_conn(stream, addr));
+        tokio::spawn(handle_conn(stream, addr, engine.clone(), log_messages));
     }
 }
 
-async fn handle_conn(stream: tokio::net::TcpStream, addr: std::net::SocketAddr) {
-    let ws_stream = accept_async(stream).await.expect("ws accept");
+async fn handle_conn(
+    stream: tokio::net::TcpStream,
+    addr: std::net::SocketAddr,
+    mut engine: Engine,
+    log_messages: bool,
+) {
+    let config = WebSocketConfig {
+        max_message_size: Some(MAX_MESSAGE_SIZE),
+        max_frame_size: Some(MAX_MESSAGE_SIZE),
+        ..Default::default()
+    };
+    let ws_stream = accept_async_with_config(stream, Some(config))
+        .await
+        .expect("ws accept");
     let (mut write, mut read) = ws_stream.split();
 
     let mut game = Game::new();
-    let mut engine = Engine::from_env(6, num_cpus::get());
-    if let Ok(Some(path)) = engine.load_syzygy_from_env() {
-        println!("Loaded Syzygy tablebases from {}", path);
-    }
 
     let mut my_color: Option<Color> = None;
     let mut last_len: usize = 0;
     let mut current_time_control = TimeControl::default();
+    let mut san_cache = SanCache::new();
+    // The last `moves` list and the game replayed from it.
+    let mut replayed: (Vec<MoveEntry>, Game) = (Vec::new(), Game::new());
 
     while let Some(msg) = read.next().await {
         if let Ok(msg) = msg {
@@ -151,7 +256,9 @@ async fn handle_conn(stream: tokio::net::TcpStream, addr: std::net::SocketAddr)
                 continue;
             }
             let txt = msg.to_text().unwrap();
-            println!("Received from {}: {}", addr, txt);
+            if log_messages {
+                println!("Received from {}: {}", addr, txt);
+            }
 
             if let Ok(data) = serde_json::from_str::<ClientMsg>(txt) {
                 match data {
@@ -170,13 +277,13 @@ async fn handle_conn(stream: tokio::net::TcpStream, addr: std::net::SocketAddr)
                         );
                         game = Game::new();
                         last_len = 0;
+                        san_cache.clear();
 
                         if my_color == Some(Color::White) && game.current_turn == Color::White {
                             let time_config = current_time_control.to_time_config();
-                            let time_config = current_time_control.to_time_config();
-                            if let Some(((s, e), depth)) =
-                                engine.best_move_timed(&mut game, &time_config)
-                            {
+                            let best;
+                            (engine, game, best) = search(engine, game, time_config).await;
+                            if let Some(((s, e), depth)) = best {
                                 println!("AI calculated depth: {}", depth);
                                 game.make_move(&s, &e);
                                 last_len = 1;
@@ -192,15 +299,16 @@ async fn handle_conn(stream: tokio::net::TcpStream, addr: std::net::SocketAddr)
                         }
 
                         let mov = mov.replace('+', "").replace('#', "");
-                        if is_coordinate(&mov) {
-                            game.make_move(&mov[0..2], &mov[2..4]);
-                            last_len += 1;
+                        let mov = mov.trim();
+                        let played = if is_coordinate(mov) {
+                            play_coordinate(&mut game, mov)
                         } else {
                             let color = game.current_turn;
-                            if let Some((s, e)) = parse_san(&mut game, &mov, color) {
-                                game.make_move(&s, &e);
-                                last_len += 1;
-                            }
+                            parse_san_cached(&mut san_cache, &mut game, mov, color)
+                                .is_some_and(|(s, e)| game.make_move(&s, &e))
+                        };
+                        if played {
+                            last_len += 1;
                         }
                     }
 
@@ -213,21 +321,31 @@ async fn handle_conn(stream: tokio::net::TcpStream, addr: std::net::SocketAddr)
                             continue;
                         }
 
-                        game = Game::new();
-                        for entry in &moves {
+                        // The list is resent in full on every update. When it
+                        // extends the one replayed last time, carry on from
+                        // that game and play only the new moves.
+                        if !moves.starts_with(&replayed.0) {
+                            replayed = (Vec::new(), Game::new());
+                        }
+                        game = replayed.1.clone();
+                        for entry in &moves[replayed.0.len()..] {
                             let mv = entry.mov.replace('+', "").replace('#', "");
+                            let mv = mv.trim();
                             let color = if entry.color.to_lowercase().starts_with('w') {
                                 Color::White
                             } else {
                                 Color::Black
                             };
-                            if is_coordinate(&mv) {
-                                game.make_move(&mv[0..2], &mv[2..4]);
-                            } else if let Some((s, e)) = parse_san(&mut game, &mv, color) {
+                            if is_coordinate(mv) {
+                                play_coordinate(&mut game, mv);
+                            } else if let Some((s, e)) =
+                                parse_san_cached(&mut san_cache, &mut game, mv, color)
+                            {
                                 game.make_move(&s, &e);
                             }
                         }
                         last_len = moves.len();
+                        replayed = (moves, game.clone());
                     }
 
                     ClientMsg::Go { time } => {
@@ -237,9 +355,9 @@ async fn handle_conn(stream: tokio::net::TcpStream, addr: std::net::SocketAddr)
 
                         let time_config = current_time_control.to_time_config();
                         let start_time = Instant::now();
-                        if let Some(((s, e), depth)) =
-                            engine.best_move_timed(&mut game, &time_config)
-                        {
+                        let best;
+                        (engine, game, best) = search(engine, game, time_config).await;
+                        if let Some(((s, e), depth)) = best {
                             println!(
                                 "AI calculation took {:?} (depth: {})",
                                 start_time.elapsed(),
@@ -247,11 +365,7 @@ async fn handle_conn(stream: tokio::net::TcpStream, addr: std::net::SocketAddr)
                             );
                             game.make_move(&s, &e);
                             last_len += 1;
-                            let msg = serde_json::json!({
-                                "next_move": format!("{}{}", s, e),
-                                "time_ms": start_time.elapsed().as_millis()
-                            })
-                            .to_string();
+                            let msg = move_reply(&s, &e, start_time.elapsed().as_millis());
                             let _ = write.send(Message::Text(msg)).await;
                         }
                         continue;
@@ -272,18 +386,22 @@ async fn handle_conn(stream: tokio::net::TcpStream, addr: std::net::SocketAddr)
                     ClientMsg::NewGame => {
                         game = Game::new();
                         last_len = 0;
+                        san_cache.clear();
                         current_time_control = TimeControl::default();
                         println!("New game started");
                         continue;
                     }
                 }
-            } else if is_coordinate(txt) {
-                game.make_move(&txt[0..2], &txt[2..4]);
-                last_len += 1;
             } else {
-                let color = game.current_turn;
-                if let Some((s, e)) = parse_san(&mut game, txt, color) {
-                    game.make_move(&s, &e);
+                let txt = txt.trim();
+                let played = if is_coordinate(txt) {
+                    play_coordinate(&mut game, txt)
+                } else {
+                    let color = game.current_turn;
+                    parse_san_cached(&mut san_cache, &mut game, txt, color)
+                        .is_some_and(|(s, e)| game.make_move(&s, &e))
+                };
+                if played {
                     last_len += 1;
                 }
             }
@@ -291,15 +409,14 @@ async fn handle_conn(stream: tokio::net::TcpStream, addr: std::net::SocketAddr)
             if let Some(color) = my_color {
                 if let Some(res) = game.result {
                     let result = if res == Color::White {
-                        "white"
+                        RESULT_WHITE
                     } else {
-                        "black"
+                        RESULT_BLACK
                     };
-                    let _ = write
-                        .send(Message::Text(format!("{{\"result\":\"{}\"}}", result)))
-                        .await;
+                    let _ = write.send(Message::Text(result.to_string())).await;
                     game = Game::new();
                     last_len = 0;
+                    san_cache.clear();
                     my_color = None;
                     continue;
                 }
@@ -314,7 +431,9 @@ async fn handle_conn(stream: tokio::net::TcpStream, addr: std::net::SocketAddr)
                 let next = if color == Color::White && last_len == 0 {
                     Some((("d2".to_string(), "d4".to_string()), 0))
                 } else {
-                    engine.best_move_timed(&mut game, &time_config)
+                    let best;
+                    (engine, game, best) = search(engine, game, time_config).await;
+                    best
                 };
 
                 println!("AI calculation took {:?}", start_time.elapsed());
@@ -325,11 +444,7 @@ async fn handle_conn(stream: tokio::net::TcpStream, addr: std::net::SocketAddr)
                     }
                     game.make_move(&s, &e);
                     last_len += 1;
-                    let msg = serde_json::json!({
-                        "next_move": format!("{}{}", s, e),
-                        "time_ms": start_time.elapsed().as_millis()
-                    })
-                    .to_string();
+                    let msg = move_reply(&s, &e, start_time.elapsed().as_millis());
                     let _ = write.send(Message::Text(msg)).await;
                 }
             }
@@ -1,150 +1,252 @@
 use core::option::Option::None;
 
 use crate::pieces::{Color, Piece, PieceType};
-use crate::transposition::ZOBRIST;
-use crate::types::{Move, UndoState};
-
-#[derive(Clone)]
+use crate::transposition::{ZOBRIST_CASTLING, ZOBRIST_EP, zobrist_key};
+use crate::types::{Move, MoveList, SQUARE_NAMES, Square, UndoState, pop_lsb};
+use once_cell::sync::Lazy;
+
+/// Undo record for `make_move_state`. It is a small `Copy` value that
+/// lives in the caller's stack frame, so making and unmaking a move never
+/// allocates.
+#[derive(Clone, Copy)]
 pub struct MoveState {
-    pub start: (usize, usize),
-    pub end: (usize, usize),
+    pub start: u8,
+    pub end: u8,
     pub captured: Option<Piece>,
-    pub captured_sq: Option<(usize, usize)>,
-    pub prev_en_passant: Option<(usize, usize)>,
-    pub prev_castling: [[bool; 2]; 2],
-    pub rook_move: Option<((usize, usize), (usize, usize))>,
+    /// Square the captured piece stood on (differs from `end` en passant).
+    pub captured_sq: u8,
+    /// En-passant square before the move, `UndoState::NO_EP` if none.
+    pub prev_en_passant: u8,
+    pub prev_castling: u8,
+    pub rook_move: Option<(u8, u8)>,
+    /// Zobrist key before the move, restored as-is by `unmake_move`.
+    pub prev_hash: u64,
 }
 
-#[derive(Clone)]
+/// Plain data throughout (mailbox bytes, bitboards, rights mask), so a
+/// copy is a single flat memcpy.
+#[derive(Clone, Copy)]
 pub struct Board {
-    pub squares: [[Option<Piece>; 8]; 8],
+    /// Mailbox indexed by square, `y * 8 + x` (a1 = 0, h8 = 63), holding
+    /// piece codes (see `piece_code`); `EMPTY` marks a free square.
+    pub squares: [u8; 64],
     pub bitboards: [[u64; 6]; 2],
+    /// Union of each side's piece bitboards, kept in step by `set_index`.
+    pub occupancy: [u64; 2],
     pub hash: u64,
     pub en_passant: Option<(usize, usize)>,
-    pub castling: [[bool; 2]; 2],
+    /// Castling rights as a bit mask: bit `2 * color + side`, with side 0
+    /// king-side and 1 queen-side (the layout `ZOBRIST_CASTLING` is keyed by).
+    pub castling: u8,
 }
 
-pub fn color_idx(color: Color) -> usize {
-    match color {
-        Color::White => 0,
-        Color::Black => 1,
+pub const CASTLE_ALL: u8 = 0b1111;
+
+/// Rights kept when a move starts or ends on each square: touching e1/e8
+/// clears both of that side's rights, a1/h1/a8/h8 the matching one.
+const CASTLE_CLEAR: [u8; 64] = {
+    let mut t = [CASTLE_ALL; 64];
+    t[0] = !2 & CASTLE_ALL;
+    t[4] = !3 & CASTLE_ALL;
+    t[7] = !1 & CASTLE_ALL;
+    t[56] = !8 & CASTLE_ALL;
+    t[60] = !12 & CASTLE_ALL;
+    t[63] = !4 & CASTLE_ALL;
+    t
+};
+
+/// Code of an empty mailbox square.
+pub const EMPTY: u8 = 0;
+
+/// Piece type index of each code, 6 for `EMPTY`.
+const CODE_TYPE: [u8; 13] = [6, 0, 1, 2, 3, 4, 5, 0, 1, 2, 3, 4, 5];
+
+/// The piece each code stands for, for callers that want a `Piece`.
+const CODE_PIECE: [Option<Piece>; 13] = {
+    let mut t = [None; 13];
+    let mut i = 0;
+    while i < 12 {
+        t[i + 1] = Some(Piece {
+            piece_type: PieceType::ALL[i % 6],
+            color: if i < 6 { Color::White } else { Color::Black },
+        });
+        i += 1;
     }
+    t
+};
+
+/// FEN letter of each code, indexed like `CODE_TYPE`.
+const CODE_FEN: [u8; 13] = *b".PNBRQKpnbrqk";
+
+/// Mailbox code of a piece: `1 + 6 * color + type`, so white pawn is 1 and
+/// black king 12.
+#[inline(always)]
+pub fn piece_code(piece: Piece) -> u8 {
+    1 + 6 * piece.color as u8 + piece_index(piece.piece_type) as u8
 }
 
-pub fn piece_index(pt: PieceType) -> usize {
-    match pt {
-        PieceType::Pawn => 0,
-        PieceType::Knight => 1,
-        PieceType::Bishop => 2,
-        PieceType::Rook => 3,
-        PieceType::Queen => 4,
-        PieceType::King => 5,
+/// The standard starting position, built once. `Board` is `Copy`, so
+/// `setup_standard` is a single copy of this snapshot.
+static STARTPOS: Lazy<Board> = Lazy::new(|| {
+    let mut board = Board::new();
+    let back = [
+        PieceType::Rook,
+        PieceType::Knight,
+        PieceType::Bishop,
+        PieceType::Queen,
+        PieceType::King,
+        PieceType::Bishop,
+        PieceType::Knight,
+        PieceType::Rook,
+    ];
+    for (x, &pt) in back.iter().enumerate() {
+        for (y, piece_type, color) in [
+            (0, pt, Color::White),
+            (1, PieceType::Pawn, Color::White),
+            (6, PieceType::Pawn, Color::Black),
+            (7, pt, Color::Black),
+        ] {
+            board.set_index(x, y, Some(Piece { piece_type, color }));
+        }
     }
+    board
+});
+
+/// En-passant target as a square index, `UndoState::NO_EP` if none.
+#[inline(always)]
+fn ep_sq(ep: Option<(usize, usize)>) -> u8 {
+    ep.map_or(UndoState::NO_EP, |(x, y)| (y * 8 + x) as u8)
 }
 
-fn sq_mask(x: usize, y: usize) -> u64 {
-    1u64 << (y * 8 + x)
+#[inline(always)]
+fn ep_from_sq(sq: u8) -> Option<(usize, usize)> {
+    (sq != UndoState::NO_EP).then(|| ((sq % 8) as usize, (sq / 8) as usize))
+}
+
+#[inline(always)]
+pub fn color_idx(color: Color) -> usize {
+    color as usize
+}
+
+#[inline(always)]
+pub fn piece_index(pt: PieceType) -> usize {
+    pt as usize
 }
 
 impl Board {
     pub fn new() -> Self {
         Self {
-            squares: [[None; 8]; 8],
+            squares: [EMPTY; 64],
             bitboards: [[0u64; 6]; 2],
-            hash: 0,
+            occupancy: [0; 2],
+            hash: ZOBRIST_CASTLING[15],
             en_passant: None,
-            castling: [[true, true], [true, true]],
+            castling: CASTLE_ALL,
         }
     }
 
+    /// Resets to the standard starting position, copied from `STARTPOS`.
     pub fn setup_standard(&mut self) {
-        self.hash = 0;
-        for y in 0..8 {
-            for x in 0..8 {
-                self.squares[y][x] = None;
-            }
-        }
-        self.bitboards = [[0u64; 6]; 2];
-        let back = [
-            PieceType::Rook,
-            PieceType::Knight,
-            PieceType::Bishop,
-            PieceType::Queen,
-            PieceType::King,
-            PieceType::Bishop,
-            PieceType::Knight,
-            PieceType::Rook,
-        ];
-        for (x, &pt) in back.iter().enumerate() {
-            self.set_index(
-                x,
-                0,
-                Some(Piece {
-                    piece_type: pt,
-                    color: Color::White,
-                }),
-            );
-            self.set_index(
-                x,
-                7,
-                Some(Piece {
-                    piece_type: pt,
-                    color: Color::Black,
-                }),
-            );
-            self.set_index(
-                x,
-                1,
-                Some(Piece {
-                    piece_type: PieceType::Pawn,
-                    color: Color::White,
-                }),
-            );
-            self.set_index(
-                x,
-                6,
-                Some(Piece {
-                    piece_type: PieceType::Pawn,
-                    color: Color::Black,
-                }),
-            );
+        *self = *STARTPOS;
+    }
+
+    /// Zobrist contribution of the castling rights and en-passant file.
+    #[inline(always)]
+    pub fn state_key(&self) -> u64 {
+        let mut key = ZOBRIST_CASTLING[self.castling as usize];
+        if let Some((x, _)) = self.en_passant {
+            key ^= ZOBRIST_EP[x];
         }
-        self.en_passant = None;
-        self.castling = [[true, true], [true, true]];
+        key
     }
 
     pub fn set_index(&mut self, x: usize, y: usize, piece: Option<Piece>) {
-        let mask = sq_mask(x, y);
-        if let Some(old) = self.squares[y][x] {
-            let c = color_idx(old.color);
-            let p = piece_index(old.piece_type);
+        self.set_sq((y * 8 + x) as u8, piece);
+    }
+
+    /// `set_index` on a square index.
+    pub fn set_sq(&mut self, sq: u8, piece: Option<Piece>) {
+        let sq = sq as usize;
+        let mask = 1u64 << sq;
+        let old = self.squares[sq];
+        if old != EMPTY {
+            let c = (old > 6) as usize;
+            let p = CODE_TYPE[old as usize] as usize;
             self.bitboards[c][p] &= !mask;
-            self.hash ^= ZOBRIST[c][p][y * 8 + x];
+            self.occupancy[c] &= !mask;
+            self.hash ^= zobrist_key(c, p, sq);
         }
-        self.squares[y][x] = piece;
+        self.squares[sq] = piece.map_or(EMPTY, piece_code);
         if let Some(pce) = piece {
             let c = color_idx(pce.color);
             let p = piece_index(pce.piece_type);
             self.bitboards[c][p] |= mask;
-            self.hash ^= ZOBRIST[c][p][y * 8 + x];
+            self.occupancy[c] |= mask;
+            self.hash ^= zobrist_key(c, p, sq);
         }
     }
 
+    /// Moves the piece on `from` to the empty square `to`, updating the
+    /// mailbox, bitboards, occupancy and hash directly. Captured pieces must
+    /// be removed first.
+    #[inline(always)]
+    fn move_piece(&mut self, from: usize, to: usize) {
+        let code = self.squares[from];
+        debug_assert!(code != EMPTY && self.squares[to] == EMPTY);
+        let c = (code > 6) as usize;
+        let p = CODE_TYPE[code as usize] as usize;
+        let mask = (1u64 << from) | (1u64 << to);
+        self.bitboards[c][p] ^= mask;
+        self.occupancy[c] ^= mask;
+        self.squares[to] = code;
+        self.squares[from] = EMPTY;
+        self.hash ^= zobrist_key(c, p, from) ^ zobrist_key(c, p, to);
+    }
+
+    /// Takes the piece off the occupied square `sq`.
+    #[inline(always)]
+    fn remove_piece(&mut self, sq: usize) {
+        let code = self.squares[sq];
+        debug_assert!(code != EMPTY);
+        let c = (code > 6) as usize;
+        let p = CODE_TYPE[code as usize] as usize;
+        let mask = 1u64 << sq;
+        self.bitboards[c][p] ^= mask;
+        self.occupancy[c] ^= mask;
+        self.squares[sq] = EMPTY;
+        self.hash ^= zobrist_key(c, p, sq);
+    }
+
+    /// Puts the piece with mailbox `code` on the empty square `sq`.
+    #[inline(always)]
+    fn put_piece(&mut self, sq: usize, code: u8) {
+        debug_assert!(code != EMPTY && self.squares[sq] == EMPTY);
+        let c = (code > 6) as usize;
+        let p = CODE_TYPE[code as usize] as usize;
+        let mask = 1u64 << sq;
+        self.bitboards[c][p] ^= mask;
+        self.occupancy[c] ^= mask;
+        self.squares[sq] = code;
+        self.hash ^= zobrist_key(c, p, sq);
+    }
+
     pub fn get_index(&self, x: usize, y: usize) -> Option<Piece> {
-        self.squares[y][x]
+        self.get_sq((y * 8 + x) as u8)
+    }
+
+    /// `get_index` on a square index.
+    #[inline(always)]
+    pub fn get_sq(&self, sq: u8) -> Option<Piece> {
+        CODE_PIECE[self.squares[sq as usize] as usize]
     }
 
     pub fn get(&self, pos: &str) -> Option<Piece> {
-        if let Some((x, y)) = Self::algebraic_to_index(pos) {
-            self.get_index(x, y)
-        } else {
-            None
-        }
+        Square::from_algebraic(pos).and_then(|sq| self.get_sq(sq))
     }
 
     pub fn set(&mut self, pos: &str, piece: Option<Piece>) -> bool {
-        if let Some((x, y)) = Self::algebraic_to_index(pos) {
-            self.set_index(x, y, piece);
+        if let Some(sq) = Square::from_algebraic(pos) {
+            self.set_sq(sq, piece);
             true
         } else {
             false
@@ -152,466 +254,333 @@ impl Board {
     }
 
     pub fn make_move_state(&mut self, start: &str, end: &str) -> Option<MoveState> {
-        let (sx, sy) = Self::algebraic_to_index(start)?;
-        let (ex, ey) = Self::algebraic_to_index(end)?;
-        let piece = self.get_index(sx, sy)?;
-        let captured = self.get_index(ex, ey);
-        let mut captured_sq = if captured.is_some() {
-            Some((ex, ey))
-        } else {
-            None
-        };
+        self.make_move_sq(Square::from_algebraic(start)?, Square::from_algebraic(end)?)
+    }
+
+    /// `make_move_state` on square indices.
+    pub fn make_move_sq(&mut self, from: u8, to: u8) -> Option<MoveState> {
+        let piece = self.get_sq(from)?;
+        let captured = self.get_sq(to);
         let prev_ep = self.en_passant;
         let prev_castling = self.castling;
+        let prev_hash = self.hash;
         let mut rook_move = None;
+        self.hash ^= self.state_key();
 
-        let cidx = color_idx(piece.color);
+        self.castling &= CASTLE_CLEAR[from as usize] & CASTLE_CLEAR[to as usize];
         match piece.piece_type {
             PieceType::King => {
-                self.castling[cidx] = [false, false];
-                if (sx as isize - ex as isize).abs() == 2 {
-                    if ex == 6 {
-                        rook_move = Some(((7, sy), (5, sy)));
-                        let rook = self.get_index(7, sy);
-                        self.set_index(5, sy, rook);
-                        self.set_index(7, sy, None);
-                    } else if ex == 2 {
-                        rook_move = Some(((0, sy), (3, sy)));
-                        let rook = self.get_index(0, sy);
-                        self.set_index(3, sy, rook);
-                        self.set_index(0, sy, None);
+                if from.abs_diff(to) == 2 {
+                    let base = from & !7;
+                    if to & 7 == 6 {
+                        rook_move = Some((base + 7, base + 5));
+                    } else if to & 7 == 2 {
+                        rook_move = Some((base, base + 3));
+                    }
+                    // Hand-built positions may keep rights without the rook.
+                    rook_move = rook_move.filter(|&(rf, _)| self.squares[rf as usize] != EMPTY);
+                    if let Some((rook_from, rook_to)) = rook_move {
+                        self.move_piece(rook_from as usize, rook_to as usize);
                     }
-                }
-            }
-            PieceType::Rook => {
-                if sx == 0 {
-                    self.castling[cidx][1] = false;
-                }
-                if sx == 7 {
-                    self.castling[cidx][0] = false;
                 }
             }
             _ => {}
         }
 
         self.en_passant = None;
-        if piece.piece_type == PieceType::Pawn {
-            let dir_y: isize = if piece.color == Color::White { 1 } else { -1 };
-            if (sy as isize + 2 * dir_y) as usize == ey
-                && sx == ex
-                && self.get_index(ex, ey).is_none()
-            {
-                self.en_passant = Some((sx, (sy as isize + dir_y) as usize));
-            }
-            if let Some((epx, epy)) = prev_ep {
-                if ex == epx && ey == epy && self.get_index(ex, ey).is_none() {
-                    let cap_y = if piece.color == Color::White {
-                        ey - 1
-                    } else {
-                        ey + 1
-                    };
-                    let cap = self.get_index(ex, cap_y);
-                    self.set_index(ex, cap_y, None);
-                    self.set_index(ex, ey, Some(piece));
-                    self.set_index(sx, sy, None);
-                    captured_sq = Some((ex, cap_y));
-                    return Some(MoveState {
-                        start: (sx, sy),
-                        end: (ex, ey),
-                        captured: cap,
-                        captured_sq,
-                        prev_en_passant: prev_ep,
-                        prev_castling,
-                        rook_move,
-                    });
-                }
+        if piece.piece_type == PieceType::Pawn && captured.is_none() {
+            // Neither case depends on the side moving: a double push passes
+            // the square midway between its ends, and en passant takes the
+            // pawn one rank back on the target's file, `to ^ 8` either way.
+            if from.abs_diff(to) == 16 {
+                self.en_passant = ep_from_sq((from + to) / 2);
+            } else if to == ep_sq(prev_ep) {
+                let cap_sq = to ^ 8;
+                let cap = CODE_PIECE[self.squares[cap_sq as usize] as usize];
+                self.remove_piece(cap_sq as usize);
+                self.move_piece(from as usize, to as usize);
+                self.hash ^= self.state_key();
+                return Some(MoveState {
+                    start: from,
+                    end: to,
+                    captured: cap,
+                    captured_sq: cap_sq,
+                    prev_en_passant: ep_sq(prev_ep),
+                    prev_castling,
+                    rook_move,
+                    prev_hash,
+                });
             }
         }
 
-        self.set_index(ex, ey, Some(piece));
-        self.set_index(sx, sy, None);
+        if captured.is_some() {
+            self.remove_piece(to as usize);
+        }
+        self.move_piece(from as usize, to as usize);
+        self.hash ^= self.state_key();
 
         Some(MoveState {
-            start: (sx, sy),
-            end: (ex, ey),
+            start: from,
+            end: to,
             captured,
-            captured_sq,
-            prev_en_passant: prev_ep,
+            captured_sq: to,
+            prev_en_passant: ep_sq(prev_ep),
             prev_castling,
             rook_move,
+            prev_hash,
         })
     }
 
     pub fn unmake_move(&mut self, state: MoveState) {
-        let moving = self.get_index(state.end.0, state.end.1);
-        self.set_index(state.start.0, state.start.1, moving);
-        self.set_index(state.end.0, state.end.1, None);
-        if let Some((cx, cy)) = state.captured_sq {
-            self.set_index(cx, cy, state.captured);
+        self.move_piece(state.end as usize, state.start as usize);
+        if let Some(cap) = state.captured {
+            self.put_piece(state.captured_sq as usize, piece_code(cap));
         }
-        if let Some(((rsx, rsy), (rex, rey))) = state.rook_move {
-            let rook = self.get_index(rex, rey);
-            self.set_index(rsx, rsy, rook);
-            self.set_index(rex, rey, None);
+        if let Some((rook_from, rook_to)) = state.rook_move {
+            self.move_piece(rook_to as usize, rook_from as usize);
         }
-        self.en_passant = state.prev_en_passant;
+        self.en_passant = ep_from_sq(state.prev_en_passant);
         self.castling = state.prev_castling;
+        self.hash = state.prev_hash;
     }
 
+    /// File and rank of `pos`. Callers that want the square index should
+    /// use `Square::from_algebraic` and skip the split.
     pub fn algebraic_to_index(pos: &str) -> Option<(usize, usize)> {
-        if pos.len() != 2 {
-            return None;
-        }
-        let bytes = pos.as_bytes();
-        let file = bytes[0] as char;
-        let rank = bytes[1] as char;
-        let x = match file {
-            'a'..='h' => (file as u8 - b'a') as usize,
-            _ => return None,
-        };
-        let y = match rank {
-            '1'..='8' => (rank as u8 - b'1') as usize,
-            _ => return None,
-        };
-        Some((x, y))
+        Square::from_algebraic(pos).map(|sq| ((sq % 8) as usize, (sq / 8) as usize))
     }
 
-    pub fn index_to_algebraic(x: usize, y: usize) -> Option<String> {
+    /// Name of the square on file `x`, rank `y`, straight from the name
+    /// table; nothing is allocated.
+    pub fn index_to_algebraic(x: usize, y: usize) -> Option<&'static str> {
         if x < 8 && y < 8 {
-            let file = (b'a' + x as u8) as char;
-            let rank = (b'1' + y as u8) as char;
-            Some(format!("{}{}", file, rank))
+            Some(SQUARE_NAMES[y * 8 + x])
         } else {
             None
         }
     }
 
-    fn inside(x: isize, y: isize) -> bool {
-        x >= 0 && x < 8 && y >= 0 && y < 8
-    }
-
+    /// Pseudo-legal destinations of the piece on `pos`, by name. Internal
+    /// callers use `pseudo_targets` and never build these strings.
     pub fn pseudo_legal_moves(&self, pos: &str) -> Vec<String> {
-        let mut moves = Vec::new();
-        let (x, y) = match Self::algebraic_to_index(pos) {
-            Some(v) => v,
-            None => return moves,
+        let Some(sq) = Square::from_algebraic(pos) else {
+            return Vec::new();
         };
-        let piece = match self.get_index(x, y) {
+        let mut targets = self.pseudo_targets(sq);
+        let mut moves = Vec::with_capacity(targets.count_ones() as usize);
+        while targets != 0 {
+            moves.push(SQUARE_NAMES[pop_lsb(&mut targets)].to_string());
+        }
+        moves
+    }
+
+    /// Pseudo-legal destinations of the piece on `sq` (empty if none),
+    /// including castling squares and pawn pushes.
+    pub fn pseudo_targets(&self, sq: u8) -> u64 {
+        use crate::movegen::{KING_TABLE, KNIGHT_TABLE, bishop_attacks, pawn_moves, rook_attacks};
+        let sq = sq as usize;
+        let piece = match CODE_PIECE[self.squares[sq] as usize] {
             Some(p) => p,
-            None => return moves,
+            None => return 0,
         };
         let color = piece.color;
-        match piece.piece_type {
-            PieceType::Knight => {
-                for (dx, dy) in [
-                    (-2, -1),
-                    (-2, 1),
-                    (-1, -2),
-                    (-1, 2),
-                    (1, -2),
-                    (1, 2),
-                    (2, -1),
-                    (2, 1),
-                ] {
-                    let nx = x as isize + dx;
-                    let ny = y as isize + dy;
-                    if Self::inside(nx, ny) {
-                        if let Some(tgt) = self.get_index(nx as usize, ny as usize) {
-                            if tgt.color != color {
-                                if let Some(s) = Self::index_to_algebraic(nx as usize, ny as usize)
-                                {
-                                    moves.push(s);
-                                }
-                            }
-                        } else if let Some(s) = Self::index_to_algebraic(nx as usize, ny as usize) {
-                            moves.push(s);
-                        }
-                    }
-                }
-            }
-            PieceType::Bishop => {
-                for (dx, dy) in [(-1, -1), (-1, 1), (1, -1), (1, 1)] {
-                    self.add_ray(x, y, dx, dy, color, &mut moves);
-                }
-            }
-            PieceType::Rook => {
-                for (dx, dy) in [(0, 1), (0, -1), (1, 0), (-1, 0)] {
-                    self.add_ray(x, y, dx, dy, color, &mut moves);
-                }
-            }
-            PieceType::Queen => {
-                for (dx, dy) in [
-                    (-1, -1),
-                    (-1, 1),
-                    (1, -1),
-                    (1, 1),
-                    (0, 1),
-                    (0, -1),
-                    (1, 0),
-                    (-1, 0),
-                ] {
-                    self.add_ray(x, y, dx, dy, color, &mut moves);
-                }
-            }
+        let own = self.all_pieces(color);
+        let occ = self.occupied();
+        let targets = match piece.piece_type {
+            PieceType::Pawn => match color {
+                Color::White => pawn_moves::<0>(sq, occ, occ & !own, self.en_passant),
+                Color::Black => pawn_moves::<1>(sq, occ, occ & !own, self.en_passant),
+            },
+            PieceType::Knight => KNIGHT_TABLE[sq],
+            PieceType::Bishop => bishop_attacks(sq, occ),
+            PieceType::Rook => rook_attacks(sq, occ),
+            PieceType::Queen => bishop_attacks(sq, occ) | rook_attacks(sq, occ),
             PieceType::King => {
-                for (dx, dy) in [
-                    (-1, -1),
-                    (-1, 0),
-                    (-1, 1),
-                    (0, -1),
-                    (0, 1),
-                    (1, -1),
-                    (1, 0),
-                    (1, 1),
-                ] {
-                    let nx = x as isize + dx;
-                    let ny = y as isize + dy;
-                    if Self::inside(nx, ny) {
-                        if let Some(tgt) = self.get_index(nx as usize, ny as usize) {
-                            if tgt.color != color {
-                                if let Some(s) = Self::index_to_algebraic(nx as usize, ny as usize)
-                                {
-                                    moves.push(s);
-                                }
-                            }
-                        } else if let Some(s) = Self::index_to_algebraic(nx as usize, ny as usize) {
-                            moves.push(s);
-                        }
-                    }
-                }
-                let rank = if color == Color::White { 0 } else { 7 };
-                let cidx = color_idx(color);
-                if self.castling[cidx][0]
-                    && self.get_index(5, rank).is_none()
-                    && self.get_index(6, rank).is_none()
-                {
-                    if let Some(s) = Self::index_to_algebraic(6, rank) {
-                        moves.push(s);
-                    }
-                }
-                if self.castling[cidx][1]
-                    && self.get_index(1, rank).is_none()
-                    && self.get_index(2, rank).is_none()
-                    && self.get_index(3, rank).is_none()
-                {
-                    if let Some(s) = Self::index_to_algebraic(2, rank) {
-                        moves.push(s);
-                    }
-                }
-            }
-            PieceType::Pawn => {
-                let dir_y: isize = if color == Color::White { 1 } else { -1 };
-                let start_rank: usize = if color == Color::White { 1 } else { 6 };
-                let ny = y as isize + dir_y;
-                if Self::inside(x as isize, ny) && self.get_index(x, ny as usize).is_none() {
-                    if let Some(s) = Self::index_to_algebraic(x, ny as usize) {
-                        moves.push(s);
+                let back_rank = if color == Color::White { 0 } else { 56 };
+                let mut targets = KING_TABLE[sq];
+                if sq == back_rank + 4 {
+                    if self.can_castle(color, 0) && occ & (0x60u64 << back_rank) == 0 {
+                        targets |= 1u64 << (back_rank + 6);
                     }
-                    if y == start_rank {
-                        let ny2 = y as isize + 2 * dir_y;
-                        if Self::inside(x as isize, ny2)
-                            && self.get_index(x, ny2 as usize).is_none()
-                        {
-                            if let Some(s) = Self::index_to_algebraic(x, ny2 as usize) {
-                                moves.push(s);
-                            }
-                        }
-                    }
-                }
-                for dx in [-1, 1] {
-                    let nx = x as isize + dx;
-                    if Self::inside(nx, ny) {
-                        if let Some(tgt) = self.get_index(nx as usize, ny as usize) {
-                            if tgt.color != color {
-                                if let Some(s) = Self::index_to_algebraic(nx as usize, ny as usize)
-                                {
-                                    moves.push(s);
-                                }
-                            }
-                        } else if let Some((epx, epy)) = self.en_passant {
-                            if epx as isize == nx && epy as isize == ny {
-                                if let Some(s) = Self::index_to_algebraic(nx as usize, ny as usize)
-                                {
-                                    moves.push(s);
-                                }
-                            }
-                        }
+                    if self.can_castle(color, 1) && occ & (0x0Eu64 << back_rank) == 0 {
+                        targets |= 1u64 << (back_rank + 2);
                     }
                 }
+                targets
             }
-        }
-        moves
+        };
+        targets & !own
     }
 
-    fn add_ray(
-        &self,
-        x: usize,
-        y: usize,
-        dx: isize,
-        dy: isize,
-        color: Color,
-        acc: &mut Vec<String>,
-    ) {
-        let mut nx = x as isize + dx;
-        let mut ny = y as isize + dy;
-        while Self::inside(nx, ny) {
-            match self.get_index(nx as usize, ny as usize) {
-                None => {
-                    if let Some(s) = Self::index_to_algebraic(nx as usize, ny as usize) {
-                        acc.push(s);
-                    }
-                }
-                Some(p) => {
-                    if p.color != color {
-                        if let Some(s) = Self::index_to_algebraic(nx as usize, ny as usize) {
-                            acc.push(s);
-                        }
-                    }
-                    break;
-                }
-            }
-            nx += dx;
-            ny += dy;
-        }
+    pub fn square_attacked(&self, x: usize, y: usize, by_color: Color) -> bool {
+        self.is_square_attacked_by((y * 8 + x) as u8, by_color)
     }
 
-    pub fn square_attacked(&mut self, x: usize, y: usize, by_color: Color) -> bool {
-        for yy in 0..8 {
-            for xx in 0..8 {
-                if let Some(p) = self.get_index(xx, yy) {
-                    if p.color == by_color {
-                        if let Some(pos) = Self::index_to_algebraic(xx, yy) {
-                            for m in self.pseudo_legal_moves(&pos) {
-                                if let Some((tx, ty)) = Self::algebraic_to_index(&m) {
-                                    if tx == x && ty == y {
-                                        return true;
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-        false
+    /// Whether `color`'s king is attacked. Stops at the first attacker
+    /// found; use `checkers` when the attacking pieces are needed.
+    #[inline]
+    pub fn in_check(&self, color: Color) -> bool {
+        self.in_check_fast(color)
     }
 
-    pub fn in_check(&mut self, color: Color) -> bool {
-        let king_sq = self.find_king(color);
-        if king_sq.is_none() {
-            return false;
-        }
-        let k = king_sq.unwrap();
-        let opp = if color == Color::White {
-            Color::Black
-        } else {
-            Color::White
-        };
-        for y in 0..8 {
-            for x in 0..8 {
-                if let Some(p) = self.get_index(x, y) {
-                    if p.color == opp {
-                        if let Some(pos) = Self::index_to_algebraic(x, y) {
-                            for m in self.pseudo_legal_moves(&pos) {
-                                if let Some((tx, ty)) = Self::algebraic_to_index(&m) {
-                                    if tx == k.0 && ty == k.1 {
-                                        return true;
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
+    /// Enemy pieces giving check to `color`'s king, found by looking
+    /// outwards from the king square with every piece's attack pattern.
+    pub fn checkers(&self, color: Color) -> u64 {
+        let king_bb = self.bitboards[color_idx(color)][5];
+        if king_bb == 0 {
+            return 0;
         }
-        false
+        self.attackers_to(king_bb.trailing_zeros() as u8, color.opposite())
     }
 
+    /// Square of `color`'s king, read off its bitboard.
     pub fn find_king(&self, color: Color) -> Option<(usize, usize)> {
-        for y in 0..8 {
-            for x in 0..8 {
-                if let Some(p) = self.get_index(x, y) {
-                    if p.piece_type == PieceType::King && p.color == color {
-                        return Some((x, y));
-                    }
-                }
-            }
+        let king_bb = self.bitboards[color_idx(color)][5];
+        if king_bb == 0 {
+            return None;
         }
-        None
+        let sq = king_bb.trailing_zeros() as usize;
+        Some((sq % 8, sq / 8))
     }
 
+    /// Whether `color` may play `start`-`end`: the piece must be able to
+    /// reach `end` and the move must not leave its king in check.
     pub fn is_legal(&mut self, start: &str, end: &str, color: Color) -> bool {
-        let (sx, sy) = match Self::algebraic_to_index(start) {
-            Some(v) => v,
-            None => return false,
-        };
-        let (ex, ey) = match Self::algebraic_to_index(end) {
-            Some(v) => v,
-            None => return false,
-        };
-
-        let piece = match self.get_index(sx, sy) {
-            Some(p) => p,
-            None => return false,
-        };
-        if piece.color != color {
-            return false;
+        match (Square::from_algebraic(start), Square::from_algebraic(end)) {
+            (Some(from), Some(to)) => {
+                self.pseudo_targets(from) & (1u64 << to) != 0 && self.is_legal_sq(from, to, color)
+            }
+            _ => false,
         }
+    }
 
-        if let Some(dest) = self.get_index(ex, ey) {
-            if dest.color == color {
-                return false;
-            }
+    /// The king-safety half of `is_legal`, on square indices. Trusts the
+    /// caller that `to` is one of `pseudo_targets(from)`, as it is for
+    /// moves taken from the generators.
+    pub fn is_legal_sq(&self, from: u8, to: u8, color: Color) -> bool {
+        let (sx, sy) = ((from % 8) as usize, (from / 8) as usize);
+        let ex = (to % 8) as usize;
+
+        if self.color_at(from) != Some(color) || self.color_at(to) == Some(color) {
+            return false;
         }
 
-        let is_castle =
-            piece.piece_type == PieceType::King && (sx as isize - ex as isize).abs() == 2;
+        let is_castle = self.piece_type_idx_at(from) == 5 && sx.abs_diff(ex) == 2;
         if is_castle {
-            if self.in_check(color) {
+            // The rights and an empty path come with pseudo-legality, the
+            // rook itself is checked here. The king may not castle out of
+            // or through check; the landing square is vetted below.
+            let rook_sq = sy * 8 + if ex > sx { 7 } else { 0 };
+            if self.squares[rook_sq as usize] == EMPTY {
                 return false;
             }
-            let step = if ex > sx { 1 } else { -1 };
-            let opp = if color == Color::White {
-                Color::Black
-            } else {
-                Color::White
-            };
-            let mut x = sx as isize + step;
-            while x != ex as isize {
-                if self.square_attacked(x as usize, sy, opp) {
-                    return false;
-                }
-                x += step;
+            let opp = color.opposite();
+            let transit = (from + to) / 2;
+            if self.is_square_attacked_by(from, opp) || self.is_square_attacked_by(transit, opp) {
+                return false;
             }
         }
 
-        if let Some(state) = self.make_move_state(start, end) {
-            let check = self.in_check(color);
-            self.unmake_move(state);
-            !check
+        // Rather than playing the move, look at the king on the occupancy it
+        // would leave. Whatever stood on `to` (or the pawn taken en passant)
+        // is gone and cannot attack.
+        let king = self.bitboards[color_idx(color)][5];
+        if king == 0 {
+            return true;
+        }
+        let to_bit = 1u64 << to;
+        let mut occ = (self.occupied() ^ (1u64 << from)) | to_bit;
+        let mut removed = to_bit;
+        if self.infer_move(from, to).is_ep() {
+            let captured = 1u64 << ((from & !7) | (to & 7));
+            occ ^= captured;
+            removed |= captured;
+        }
+        let ksq = if king == 1u64 << from {
+            to
         } else {
-            false
+            king.trailing_zeros() as u8
+        };
+        self.attackers_to_with(ksq, color.opposite(), occ) & !removed == 0
+    }
+
+    /// The packed move for the piece on `from` going to `to`, with flags
+    /// read off the position. Pawns reaching the last rank promote to a
+    /// queen.
+    pub fn infer_move(&self, from: u8, to: u8) -> Move {
+        let capture = self.squares[to as usize] != EMPTY;
+        match CODE_TYPE[self.squares[from as usize] as usize] {
+            0 if to < 8 || to >= 56 => Move::promotion(from, to, PieceType::Queen, capture),
+            0 if from.abs_diff(to) == 16 => Move::new(from, to, Move::FLAG_DOUBLE_PUSH),
+            0 if !capture && ep_sq(self.en_passant) == to && from % 8 != to % 8 => {
+                Move::new(from, to, Move::FLAG_EP_CAPTURE)
+            }
+            5 if to == from + 2 => Move::new(from, to, Move::FLAG_KING_CASTLE),
+            5 if to + 2 == from => Move::new(from, to, Move::FLAG_QUEEN_CASTLE),
+            _ if capture => Move::capture(from, to),
+            _ => Move::normal(from, to),
         }
     }
 
     pub fn all_legal_moves(&mut self, color: Color) -> Vec<(String, String)> {
-        let mut res = Vec::new();
-        for y in 0..8 {
-            for x in 0..8 {
-                if let Some(pos) = Self::index_to_algebraic(x, y) {
-                    if let Some(p) = self.get_index(x, y) {
-                        if p.color == color {
-                            for m in self.pseudo_legal_moves(&pos) {
-                                if self.is_legal(&pos, &m, color) {
-                                    res.push((pos.clone(), m));
-                                }
-                            }
-                        }
+        self.legal_moves_to(color, !0)
+    }
+
+    /// Legal moves of `color` as packed moves, replacing the contents of
+    /// `list`. Callers that only iterate should prefer this to the string
+    /// APIs, which allocate two names per move.
+    pub fn legal_moves_into(&mut self, color: Color, list: &mut MoveList) {
+        list.clear();
+        crate::movegen::generate_moves_fast(self, color, list);
+    }
+
+    /// Legal moves of `color` landing on `mask`, named only on output.
+    /// A promotion is listed once, as its from/to pair.
+    fn legal_moves_to(&mut self, color: Color, mask: u64) -> Vec<(String, String)> {
+        let mut list = MoveList::new();
+        self.legal_moves_into(color, &mut list);
+        list.iter()
+            .filter(|mv| {
+                mask & (1u64 << mv.to_sq()) != 0
+                    && mv.promotion_piece().is_none_or(|pt| pt == PieceType::Queen)
+            })
+            .map(|mv| {
+                (
+                    SQUARE_NAMES[mv.from_sq() as usize].to_string(),
+                    SQUARE_NAMES[mv.to_sq() as usize].to_string(),
+                )
+            })
+            .collect()
+    }
+
+    /// Squares holding a `piece_type` of `color` that can legally move to
+    /// `dest`. Works backwards from the destination, so only the pieces
+    /// that actually reach it are tried. Castling is not included.
+    pub fn legal_sources(&self, dest: u8, piece_type: PieceType, color: Color) -> u64 {
+        let pieces = self.bitboards[color_idx(color)][piece_index(piece_type)];
+        let mut candidates = match piece_type {
+            // Pushes are not attacks, so ask each pawn where it can go.
+            PieceType::Pawn => {
+                let mut pawns = pieces;
+                let mut reach = 0;
+                while pawns != 0 {
+                    let sq = pop_lsb(&mut pawns) as u8;
+                    if self.pseudo_targets(sq) & (1u64 << dest) != 0 {
+                        reach |= 1u64 << sq;
                     }
                 }
+                reach
+            }
+            _ => self.attackers_to(dest, color) & pieces,
+        };
+        let mut sources = 0;
+        while candidates != 0 {
+            let sq = pop_lsb(&mut candidates) as u8;
+            if self.is_legal_sq(sq, dest, color) {
+                sources |= 1u64 << sq;
             }
         }
-        res
+        sources
     }
 
     pub fn all_legal_moves_fast(&mut self, color: Color) -> Vec<(String, String)> {
@@ -619,111 +588,48 @@ impl Board {
     }
 
     pub fn capture_moves(&mut self, color: Color) -> Vec<(String, String)> {
-        let mut res = Vec::new();
-        for y in 0..8 {
-            for x in 0..8 {
-                if let Some(pos) = Self::index_to_algebraic(x, y) {
-                    if let Some(p) = self.get_index(x, y) {
-                        if p.color == color {
-                            for m in self.pseudo_legal_moves(&pos) {
-                                if let Some((mx, my)) = Self::algebraic_to_index(&m) {
-                                    if self.get_index(mx, my).is_some() {
-                                        if self.is_legal(&pos, &m, color) {
-                                            res.push((pos.clone(), m));
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-        res
+        let occ = self.occupied();
+        self.legal_moves_to(color, occ)
     }
 
     pub fn capture_moves_fast(&mut self, color: Color) -> Vec<(String, String)> {
-        self.all_legal_moves_fast(color)
-            .into_iter()
-            .filter(|(_, e)| {
-                if let Some((ex, ey)) = Board::algebraic_to_index(e) {
-                    self.get_index(ex, ey).is_some()
-                } else {
-                    false
-                }
-            })
-            .collect()
+        crate::movegen::generate_moves_to(self, color, self.occupied())
     }
 
     pub fn piece_count(&self, piece_type: PieceType) -> usize {
-        let mut c = 0;
-        for y in 0..8 {
-            for x in 0..8 {
-                if let Some(p) = self.get_index(x, y) {
-                    if p.piece_type == piece_type {
-                        c += 1;
-                    }
-                }
-            }
-        }
-        c
+        let p = piece_index(piece_type);
+        (self.bitboards[0][p].count_ones() + self.bitboards[1][p].count_ones()) as usize
     }
 
     pub fn piece_count_color(&self, piece_type: PieceType, color: Color) -> usize {
-        let cidx = color_idx(color);
-        let mut count = 0;
-        let mut bb = self.bitboards[cidx][piece_index(piece_type)];
-        while bb != 0 {
-            count += 1;
-            bb &= bb - 1;
-        }
-        count
+        self.bitboards[color_idx(color)][piece_index(piece_type)].count_ones() as usize
     }
 
     pub fn piece_count_total(&self, color: Color) -> usize {
-        let cidx = color_idx(color);
-        self.bitboards[cidx]
-            .iter()
-            .map(|bb| bb.count_ones() as usize)
-            .sum()
+        self.occupancy[color_idx(color)].count_ones() as usize
     }
 
     pub fn piece_count_all(&self) -> usize {
-        self.bitboards
-            .iter()
-            .flat_map(|b| b.iter())
-            .map(|bb| bb.count_ones() as usize)
-            .sum()
+        self.occupied().count_ones() as usize
     }
 
     pub fn to_fen(&self, turn: Color) -> String {
-        let mut fen = String::new();
+        let mut fen = String::with_capacity(90);
         for rank in (0..8).rev() {
             let mut empty = 0;
-            for file in 0..8 {
-                if let Some(piece) = self.get_index(file, rank) {
-                    if empty > 0 {
-                        fen.push_str(&empty.to_string());
-                        empty = 0;
-                    }
-                    let mut ch = match piece.piece_type {
-                        PieceType::Pawn => 'p',
-                        PieceType::Knight => 'n',
-                        PieceType::Bishop => 'b',
-                        PieceType::Rook => 'r',
-                        PieceType::Queen => 'q',
-                        PieceType::King => 'k',
-                    };
-                    if piece.color == Color::White {
-                        ch = ch.to_ascii_uppercase();
-                    }
-                    fen.push(ch);
-                } else {
+            for &code in &self.squares[rank * 8..rank * 8 + 8] {
+                if code == EMPTY {
                     empty += 1;
+                    continue;
+                }
+                if empty > 0 {
+                    fen.push((b'0' + empty) as char);
+                    empty = 0;
                 }
+                fen.push(CODE_FEN[code as usize] as char);
             }
             if empty > 0 {
-                fen.push_str(&empty.to_string());
+                fen.push((b'0' + empty) as char);
             }
             if rank > 0 {
                 fen.push('/');
@@ -733,31 +639,19 @@ impl Board {
         fen.push(if turn == Color::White { 'w' } else { 'b' });
         fen.push(' ');
         let mut castle = String::new();
-        if self.castling[0][0] {
-            castle.push('K');
-        }
-        if self.castling[0][1] {
-            castle.push('Q');
-        }
-        if self.castling[1][0] {
-            castle.push('k');
-        }
-        if self.castling[1][1] {
-            castle.push('q');
+        for (bit, c) in ['K', 'Q', 'k', 'q'].into_iter().enumerate() {
+            if self.castling & (1 << bit) != 0 {
+                castle.push(c);
+            }
         }
         if castle.is_empty() {
             castle.push('-');
         }
         fen.push_str(&castle);
         fen.push(' ');
-        if let Some((x, y)) = self.en_passant {
-            if let Some(ep) = Self::index_to_algebraic(x, y) {
-                fen.push_str(&ep);
-            } else {
-                fen.push('-');
-            }
-        } else {
-            fen.push('-');
+        match self.en_passant {
+            Some((x, y)) => fen.push_str(SQUARE_NAMES[y * 8 + x]),
+            None => fen.push('-'),
         }
         fen.push_str(" 0 1");
         fen
@@ -767,105 +661,52 @@ impl Board {
     pub fn make_move_fast(&mut self, mv: Move, color: Color) -> UndoState {
         let from_sq = mv.from_sq();
         let to_sq = mv.to_sq();
-        let from_x = (from_sq % 8) as usize;
-        let from_y = (from_sq / 8) as usize;
-        let to_x = (to_sq % 8) as usize;
-        let to_y = (to_sq / 8) as usize;
-
-        let piece = self.get_index(from_x, from_y).unwrap();
-        let captured = self.get_index(to_x, to_y);
-
-        let prev_ep = self
-            .en_passant
-            .map(|(x, y)| (y * 8 + x) as u8)
-            .unwrap_or(UndoState::NO_EP);
-        let prev_castling = self.pack_castling();
+        let (from, to) = (from_sq as usize, to_sq as usize);
+
+        let prev_ep = ep_sq(self.en_passant);
+        let prev_castling = self.castling;
         let prev_hash = self.hash;
+        self.hash ^= self.state_key();
 
-        let mut captured_piece_idx = UndoState::NO_CAPTURE;
+        // `CODE_TYPE` maps an empty square to `NO_CAPTURE`.
+        let mut captured_piece_idx = CODE_TYPE[self.squares[to] as usize];
         let mut captured_sq = to_sq;
 
         if mv.is_ep() {
-            let cap_y = if color == Color::White {
-                to_y - 1
-            } else {
-                to_y + 1
-            };
-            captured_sq = (cap_y * 8 + to_x) as u8;
-            let cap_piece = self.get_index(to_x, cap_y).unwrap();
-            captured_piece_idx = piece_index(cap_piece.piece_type) as u8;
-            self.set_index(to_x, cap_y, None);
-        } else if let Some(cap) = captured {
-            captured_piece_idx = piece_index(cap.piece_type) as u8;
+            // The captured pawn stands beside the mover, on its from rank.
+            captured_sq = ((from & !7) | (to & 7)) as u8;
+            captured_piece_idx = CODE_TYPE[self.squares[captured_sq as usize] as usize];
+            self.remove_piece(captured_sq as usize);
+        } else if captured_piece_idx != UndoState::NO_CAPTURE {
+            self.remove_piece(to);
         }
 
-        let cidx = color_idx(color);
-        match piece.piece_type {
-            PieceType::King => {
-                self.castling[cidx] = [false, false];
-            }
-            PieceType::Rook => {
-                if from_x == 0 {
-                    self.castling[cidx][1] = false; // Queen-side
-                }
-                if from_x == 7 {
-                    self.castling[cidx][0] = false; // King-side
-                }
-            }
-            _ => {}
-        }
-
-        if captured.is_some() {
-            let opp = 1 - cidx;
-            if to_x == 0 && (to_y == 0 || to_y == 7) {
-                let rank = if opp == 0 { 0 } else { 7 };
-                if to_y == rank {
-                    self.castling[opp][1] = false;
-                }
-            }
-            if to_x == 7 && (to_y == 0 || to_y == 7) {
-                let rank = if opp == 0 { 0 } else { 7 };
-                if to_y == rank {
-                    self.castling[opp][0] = false;
-                }
-            }
-        }
+        // Moving from or onto a king or rook home square drops the rights
+        // tied to it.
+        self.castling &= CASTLE_CLEAR[from_sq as usize] & CASTLE_CLEAR[to_sq as usize];
 
         self.en_passant = None;
 
         if mv.is_castle() {
-            let rank = from_y;
             if mv.flags() == Move::FLAG_KING_CASTLE {
-                let rook = self.get_index(7, rank);
-                self.set_index(5, rank, rook);
-                self.set_index(7, rank, None);
+                self.move_piece(from + 3, from + 1);
             } else {
-                let rook = self.get_index(0, rank);
-                self.set_index(3, rank, rook);
-                self.set_index(0, rank, None);
+                self.move_piece(from - 4, from - 1);
             }
         }
 
         if mv.is_double_push() {
-            let ep_y = if color == Color::White {
-                from_y + 1
-            } else {
-                from_y - 1
-            };
-            self.en_passant = Some((from_x, ep_y));
+            self.en_passant = Some((from & 7, (from + to) / 16));
         }
 
-        let moving_piece = if let Some(promo_type) = mv.promotion_piece() {
-            Piece {
-                piece_type: promo_type,
-                color,
+        match mv.promotion_piece() {
+            Some(piece_type) => {
+                self.remove_piece(from);
+                self.put_piece(to, piece_code(Piece { piece_type, color }));
             }
-        } else {
-            piece
-        };
-
-        self.set_index(to_x, to_y, Some(moving_piece));
-        self.set_index(from_x, from_y, None);
+            None => self.move_piece(from, to),
+        }
+        self.hash ^= self.state_key();
 
         UndoState {
             mv,
@@ -880,129 +721,140 @@ impl Board {
     #[inline]
     pub fn unmake_move_fast(&mut self, state: UndoState, color: Color) {
         let mv = state.mv;
-        let from_sq = mv.from_sq();
-        let to_sq = mv.to_sq();
-        let from_x = (from_sq % 8) as usize;
-        let from_y = (from_sq / 8) as usize;
-        let to_x = (to_sq % 8) as usize;
-        let to_y = (to_sq / 8) as usize;
-
-        let mut moving_piece = self.get_index(to_x, to_y).unwrap();
+        let (from, to) = (mv.from_sq() as usize, mv.to_sq() as usize);
 
         if mv.is_promotion() {
-            moving_piece.piece_type = PieceType::Pawn;
+            self.remove_piece(to);
+            let pawn = Piece {
+                piece_type: PieceType::Pawn,
+                color,
+            };
+            self.put_piece(from, piece_code(pawn));
+        } else {
+            self.move_piece(to, from);
         }
 
-        self.set_index(from_x, from_y, Some(moving_piece));
-        self.set_index(to_x, to_y, None);
-
         if state.has_capture() {
-            let cap_sq = state.captured_sq;
-            let cap_x = (cap_sq % 8) as usize;
-            let cap_y = (cap_sq / 8) as usize;
-            let opp_color = if color == Color::White {
-                Color::Black
-            } else {
-                Color::White
+            let captured = Piece {
+                piece_type: Self::piece_type_from_idx(state.captured as usize),
+                color: color.opposite(),
             };
-            let cap_type = Self::piece_type_from_idx(state.captured as usize);
-            self.set_index(
-                cap_x,
-                cap_y,
-                Some(Piece {
-                    piece_type: cap_type,
-                    color: opp_color,
-                }),
-            );
+            self.put_piece(state.captured_sq as usize, piece_code(captured));
         }
 
         if mv.is_castle() {
-            let rank = from_y;
             if mv.flags() == Move::FLAG_KING_CASTLE {
-                let rook = self.get_index(5, rank);
-                self.set_index(7, rank, rook);
-                self.set_index(5, rank, None);
+                self.move_piece(from + 1, from + 3);
             } else {
-                let rook = self.get_index(3, rank);
-                self.set_index(0, rank, rook);
-                self.set_index(3, rank, None);
+                self.move_piece(from - 1, from - 4);
             }
         }
 
-        self.en_passant = if state.prev_ep == UndoState::NO_EP {
-            None
-        } else {
-            Some(((state.prev_ep % 8) as usize, (state.prev_ep / 8) as usize))
-        };
+        self.en_passant = ep_from_sq(state.prev_ep);
 
-        self.unpack_castling(state.prev_castling);
+        self.castling = state.prev_castling;
 
         self.hash = state.prev_hash;
     }
 
-    #[inline(always)]
-    fn pack_castling(&self) -> u8 {
-        let mut c = 0u8;
-        if self.castling[0][0] {
-            c |= 1;
-        } // White king-side
-        if self.castling[0][1] {
-            c |= 2;
-        } // White queen-side
-        if self.castling[1][0] {
-            c |= 4;
-        } // Black king-side
-        if self.castling[1][1] {
-            c |= 8;
-        } // Black queen-side
-        c
+    /// Passes the turn: only the en-passant square changes on the board, the
+    /// side to move is folded in by `hash(color)`. Returns the previous
+    /// en-passant square for `unmake_null_move`.
+    #[inline]
+    pub fn make_null_move(&mut self) -> Option<(usize, usize)> {
+        let prev_ep = self.en_passant.take();
+        if let Some((x, _)) = prev_ep {
+            self.hash ^= ZOBRIST_EP[x];
+        }
+        prev_ep
+    }
+
+    #[inline]
+    pub fn unmake_null_move(&mut self, prev_ep: Option<(usize, usize)>) {
+        if let Some((x, _)) = prev_ep {
+            self.hash ^= ZOBRIST_EP[x];
+        }
+        self.en_passant = prev_ep;
     }
 
+    /// Whether `color` may still castle on `side` (0 king-side, 1 queen-side).
     #[inline(always)]
-    fn unpack_castling(&mut self, c: u8) {
-        self.castling[0][0] = (c & 1) != 0;
-        self.castling[0][1] = (c & 2) != 0;
-        self.castling[1][0] = (c & 4) != 0;
-        self.castling[1][1] = (c & 8) != 0;
+    pub fn can_castle(&self, color: Color, side: usize) -> bool {
+        self.castling & (1 << (color_idx(color) * 2 + side)) != 0
     }
 
     #[inline(always)]
     fn piece_type_from_idx(idx: usize) -> PieceType {
-        match idx {
-            0 => PieceType::Pawn,
-            1 => PieceType::Knight,
-            2 => PieceType::Bishop,
-            3 => PieceType::Rook,
-            4 => PieceType::Queen,
-            _ => PieceType::King,
-        }
+        PieceType::ALL[idx]
     }
 
     #[inline(always)]
     pub fn all_pieces(&self, color: Color) -> u64 {
-        let cidx = color_idx(color);
-        self.bitboards[cidx].iter().fold(0, |a, &b| a | b)
+        self.occupancy[color_idx(color)]
     }
 
     #[inline(always)]
     pub fn occupied(&self) -> u64 {
-        self.all_pieces(Color::White) | self.all_pieces(Color::Black)
+        self.occupancy[0] | self.occupancy[1]
+    }
+
+    /// Squares of `by_color` pieces attacking `sq` with the current occupancy.
+    #[inline]
+    pub fn attackers_to(&self, sq: u8, by_color: Color) -> u64 {
+        self.attackers_to_with(sq, by_color, self.occupied())
+    }
+
+    /// Like `attackers_to`, but sliders see through everything not in `occ`
+    /// (e.g. the king itself when vetting its own destination squares).
+    pub fn attackers_to_with(&self, sq: u8, by_color: Color, occ: u64) -> u64 {
+        use crate::movegen::{KING_TABLE, KNIGHT_TABLE, PAWN_ATTACKS};
+        let s = sq as usize;
+        let bb = &self.bitboards[color_idx(by_color)];
+        // A pawn attacks `sq` from the squares an enemy pawn on `sq` attacks.
+        (PAWN_ATTACKS[color_idx(by_color.opposite())][s] & bb[0])
+            | (KNIGHT_TABLE[s] & bb[1])
+            | (KING_TABLE[s] & bb[5])
+            | (self.diagonal_attacks(sq, occ) & (bb[2] | bb[4]))
+            | (self.straight_attacks(sq, occ) & (bb[3] | bb[4]))
+    }
+
+    /// Every square attacked by `by_color`, with sliders seeing through
+    /// anything not in `occ`.
+    pub fn attacked_by(&self, by_color: Color, occ: u64) -> u64 {
+        use crate::movegen::{
+            KING_TABLE, KNIGHT_TABLE, PAWN_ATTACKS, bishop_attacks, rook_attacks,
+        };
+        let cidx = color_idx(by_color);
+        let bb = &self.bitboards[cidx];
+        let mut attacked = 0u64;
+        for (piece, table) in [
+            (0, &PAWN_ATTACKS[cidx]),
+            (1, &KNIGHT_TABLE),
+            (5, &KING_TABLE),
+        ] {
+            let mut pieces = bb[piece];
+            while pieces != 0 {
+                attacked |= table[pop_lsb(&mut pieces)];
+            }
+        }
+        let mut diagonal = bb[2] | bb[4];
+        while diagonal != 0 {
+            attacked |= bishop_attacks(pop_lsb(&mut diagonal), occ);
+        }
+        let mut straight = bb[3] | bb[4];
+        while straight != 0 {
+            attacked |= rook_attacks(pop_lsb(&mut straight), occ);
+        }
+        attacked
     }
 
     #[inline]
     pub fn is_square_attacked_by(&self, sq: u8, by_color: Color) -> bool {
         let cidx = color_idx(by_color);
-        let sq_bb = 1u64 << sq;
         let occ = self.occupied();
 
-        let pawn_attacks = if by_color == Color::White {
-            let pawns = self.bitboards[cidx][0];
-            ((pawns & !0x0101010101010101) << 7) | ((pawns & !0x8080808080808080) << 9)
-        } else {
-            let pawns = self.bitboards[cidx][0];
-            ((pawns & !0x8080808080808080) >> 7) | ((pawns & !0x0101010101010101) >> 9)
-        };
-        if (pawn_attacks & sq_bb) != 0 {
+        let pawns = self.bitboards[cidx][0];
+        if (crate::movegen::PAWN_ATTACKS[1 - cidx][sq as usize] & pawns) != 0 {
             return true;
         }
 
@@ -1030,48 +882,14 @@ impl Board {
         false
     }
 
-    #[inline]
+    #[inline(always)]
     fn diagonal_attacks(&self, sq: u8, occ: u64) -> u64 {
-        let x = (sq % 8) as isize;
-        let y = (sq / 8) as isize;
-        let mut attacks = 0u64;
-
-        for (dx, dy) in [(1, 1), (1, -1), (-1, 1), (-1, -1)] {
-            let mut nx = x + dx;
-            let mut ny = y + dy;
-            while nx >= 0 && nx < 8 && ny >= 0 && ny < 8 {
-                let idx = (ny * 8 + nx) as usize;
-                attacks |= 1u64 << idx;
-                if (occ & (1u64 << idx)) != 0 {
-                    break;
-                }
-                nx += dx;
-                ny += dy;
-            }
-        }
-        attacks
+        crate::movegen::bishop_attacks(sq as usize, occ)
     }
 
-    #[inline]
+    #[inline(always)]
     fn straight_attacks(&self, sq: u8, occ: u64) -> u64 {
-        let x = (sq % 8) as isize;
-        let y = (sq / 8) as isize;
-        let mut attacks = 0u64;
-
-        for (dx, dy) in [(1, 0), (-1, 0), (0, 1), (0, -1)] {
-            let mut nx = x + dx;
-            let mut ny = y + dy;
-            while nx >= 0 && nx < 8 && ny >= 0 && ny < 8 {
-                let idx = (ny * 8 + nx) as usize;
-                attacks |= 1u64 << idx;
-                if (occ & (1u64 << idx)) != 0 {
-                    break;
-                }
-                nx += dx;
-                ny += dy;
-            }
-        }
-        attacks
+        crate::movegen::rook_attacks(sq as usize, occ)
     }
 
     #[inline]
@@ -1082,30 +900,29 @@ impl Board {
             return false;
         }
         let king_sq = king_bb.trailing_zeros() as u8;
-        let opp = if color == Color::White {
-            Color::Black
-        } else {
-            Color::White
-        };
+        let opp = color.opposite();
         self.is_square_attacked_by(king_sq, opp)
     }
 
     #[inline(always)]
     pub fn piece_at_sq(&self, sq: u8) -> Option<(PieceType, Color)> {
-        let x = (sq % 8) as usize;
-        let y = (sq / 8) as usize;
-        self.get_index(x, y).map(|p| (p.piece_type, p.color))
+        CODE_PIECE[self.squares[sq as usize] as usize].map(|p| (p.piece_type, p.color))
     }
 
+    /// Colour of the piece on `sq`, if any, straight from its code.
     #[inline(always)]
-    pub fn piece_type_idx_at(&self, sq: u8) -> usize {
-        let x = (sq % 8) as usize;
-        let y = (sq / 8) as usize;
-        match self.get_index(x, y) {
-            Some(p) => piece_index(p.piece_type),
-            None => 6,
+    pub fn color_at(&self, sq: u8) -> Option<Color> {
+        match self.squares[sq as usize] {
+            EMPTY => None,
+            code if code > 6 => Some(Color::Black),
+            _ => Some(Color::White),
         }
     }
+
+    #[inline(always)]
+    pub fn piece_type_idx_at(&self, sq: u8) -> usize {
+        CODE_TYPE[self.squares[sq as usize] as usize] as usize
+    }
 }
 
 #[cfg(test)]
@@ -1136,6 +953,42 @@ mod tests {
         );
     }
 
+    #[test]
+    fn test_pseudo_legal_moves_start_position() {
+        let board = setup_board();
+        assert_eq!(board.pseudo_legal_moves("e2"), vec!["e3", "e4"]);
+        assert_eq!(board.pseudo_legal_moves("g8"), vec!["f6", "h6"]);
+        assert!(board.pseudo_legal_moves("e1").is_empty());
+        assert!(board.pseudo_legal_moves("e4").is_empty());
+        assert_eq!(board.pseudo_targets(12), (1u64 << 20) | (1u64 << 28));
+    }
+
+    #[test]
+    fn test_find_king() {
+        let board = setup_board();
+        assert_eq!(board.find_king(Color::White), Some((4, 0)));
+        assert_eq!(board.find_king(Color::Black), Some((4, 7)));
+        assert_eq!(Board::new().find_king(Color::White), None);
+    }
+
+    #[test]
+    fn test_piece_codes_round_trip() {
+        for code in 1..13u8 {
+            let piece = CODE_PIECE[code as usize].unwrap();
+            assert_eq!(piece_code(piece), code);
+        }
+        assert!(CODE_PIECE[EMPTY as usize].is_none());
+    }
+
+    #[test]
+    fn test_attacked_by_start_position() {
+        let board = setup_board();
+        let attacked = board.attacked_by(Color::White, board.occupied());
+        // Every third-rank square is covered by a pawn or a knight.
+        assert_eq!(attacked & 0x0000_0000_00FF_0000, 0x0000_0000_00FF_0000);
+        assert_eq!(attacked & 0xFFFF_FFFF_0000_0000, 0);
+    }
+
     #[test]
     fn test_make_unmake_capture() {
         let mut board = setup_board();
@@ -1157,6 +1010,46 @@ mod tests {
         );
     }
 
+    #[test]
+    fn test_is_legal_rejects_unreachable_squares() {
+        let mut board = setup_board();
+        assert!(board.is_legal("g1", "f3", Color::White));
+        assert!(!board.is_legal("g1", "g3", Color::White));
+        assert!(!board.is_legal("e2", "e5", Color::White));
+        assert!(!board.is_legal("d1", "d3", Color::White));
+    }
+
+    #[test]
+    fn test_capture_lists_agree() {
+        let mut board = setup_board();
+        board.make_move_state("e2", "e4");
+        board.make_move_state("d7", "d5");
+        assert_eq!(
+            board.capture_moves(Color::White),
+            vec![("e4".into(), "d5".into())]
+        );
+        assert_eq!(
+            board.capture_moves_fast(Color::White),
+            vec![("e4".into(), "d5".into())]
+        );
+
+        let mut board = Board::new();
+        for (pos, piece_type, color) in [
+            ("e7", PieceType::Pawn, Color::White),
+            ("e1", PieceType::King, Color::White),
+            ("d8", PieceType::Rook, Color::Black),
+            ("h8", PieceType::King, Color::Black),
+        ] {
+            board.set(pos, Some(Piece { piece_type, color }));
+        }
+        assert_eq!(
+            board.capture_moves(Color::White),
+            vec![("e7".into(), "d8".into())]
+        );
+        // The named list spells out each promotion piece.
+        assert_eq!(board.capture_moves_fast(Color::White).len(), 4);
+    }
+
     #[test]
     fn test_make_unmake_kingside_castling() {
         let mut board = setup_board();
@@ -1187,6 +1080,25 @@ mod tests {
         );
     }
 
+    #[test]
+    fn test_castling_through_attacked_square_is_illegal() {
+        let mut board = setup_board();
+        board.set("f1", None);
+        board.set("g1", None);
+        assert!(board.is_legal("e1", "g1", Color::White));
+
+        // A bishop on c4 covers f1, the square the king passes over.
+        board.set("e2", None);
+        board.set(
+            "c4",
+            Some(Piece {
+                piece_type: PieceType::Bishop,
+                color: Color::Black,
+            }),
+        );
+        assert!(!board.is_legal("e1", "g1", Color::White));
+    }
+
     #[test]
     fn test_make_unmake_queenside_castling() {
         let mut board = setup_board();
@@ -1295,6 +1207,57 @@ mod tests {
         assert_eq!(board.hash, original_hash);
     }
 
+    #[test]
+    fn test_zobrist_tracks_castling_and_en_passant() {
+        let mut board = setup_board();
+        board.make_move_state("e2", "e4");
+        assert!(board.en_passant.is_some());
+        let mut fresh = board.clone();
+        fresh.recompute_hash();
+        assert_eq!(board.hash, fresh.hash);
+
+        board.make_move_state("e7", "e5");
+        board.make_move_state("e1", "e2");
+        assert!(!board.can_castle(Color::White, 0) && !board.can_castle(Color::White, 1));
+        assert!(board.can_castle(Color::Black, 0) && board.can_castle(Color::Black, 1));
+        let mut fresh = board.clone();
+        fresh.recompute_hash();
+        assert_eq!(board.hash, fresh.hash);
+
+        let mut no_rights = setup_board();
+        no_rights.castling = 0;
+        no_rights.recompute_hash();
+        assert_ne!(no_rights.hash, setup_board().hash);
+    }
+
+    #[test]
+    fn test_attackers_to() {
+        let mut board = setup_board();
+        board.make_move_state("e2", "e4");
+        board.make_move_state("d7", "d5");
+        let d5 = 35;
+        // Only the e4 pawn attacks d5 for white; the d8 queen defends it.
+        assert_eq!(board.attackers_to(d5, Color::White), 1u64 << 28);
+        assert_eq!(board.attackers_to(d5, Color::Black), 1u64 << 59);
+    }
+
+    #[test]
+    fn test_null_move_keeps_hash_consistent() {
+        let mut board = setup_board();
+        board.make_move_state("e2", "e4");
+        let before = board.hash;
+
+        let ep = board.make_null_move();
+        assert!(board.en_passant.is_none());
+        let mut fresh = board.clone();
+        fresh.recompute_hash();
+        assert_eq!(board.hash, fresh.hash);
+
+        board.unmake_null_move(ep);
+        assert_eq!(board.en_passant, ep);
+        assert_eq!(board.hash, before);
+    }
+
     #[test]
     fn test_in_check_detection() {
         let mut board = Board::new();
@@ -1370,6 +1333,12 @@ mod tests {
 
         let fen = board.to_fen(Color::White);
         assert!(fen.starts_with("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR"));
+
+        board.make_move_state("e2", "e4");
+        assert_eq!(
+            board.to_fen(Color::Black),
+            "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+        );
     }
 
     #[test]
@@ -1402,4 +1371,19 @@ mod tests {
         assert!(board.get("e4").is_none());
         assert_eq!(board.hash, original_hash);
     }
+
+    #[test]
+    fn test_occupancy_tracks_pieces() {
+        let mut board = setup_board();
+        let union = |b: &Board, c: usize| b.bitboards[c].iter().fold(0, |a, &bb| a | bb);
+
+        let undo = board.make_move_fast(Move::new(12, 28, Move::FLAG_DOUBLE_PUSH), Color::White);
+        assert_eq!(board.occupancy[0], union(&board, 0));
+        assert_eq!(board.occupancy[1], union(&board, 1));
+        board.unmake_move_fast(undo, Color::White);
+
+        board.set("d7", None);
+        assert_eq!(board.occupancy[1], union(&board, 1));
+        assert_eq!(board.occupied(), union(&board, 0) | union(&board, 1));
+    }
 }
@@ -1,12 +1,13 @@
 use crate::board::Board; // Removed color_idx, UndoState
+use crate::eval::PawnCache;
 use crate::game::Game;
 use crate::opening::book_move;
-use crate::pieces::{Color, Piece, PieceType};
+use crate::pieces::{Color, PieceType};
 use crate::transposition::{Bound, TABLE_SIZE, TTEntry, Table};
-use crate::types::{Move, mvv_lva_score}; // Import Move, mvv_lva_score
+use crate::types::{Move, MoveList, PieceValues, Square, mvv_lva_score, pop_lsb};
+use once_cell::sync::Lazy;
 use shakmaty::{CastlingMode, Chess, fen::Fen};
 use shakmaty_syzygy::{Tablebase, Wdl};
-use std::collections::HashMap;
 use std::env;
 use std::sync::Arc;
 use std::sync::atomic::{AtomicBool, AtomicU64, Ordering};
@@ -221,19 +222,48 @@ const LMP_LIMITS: [usize; 5] = [0, 5, 7, 10, 14];
 const MATE_VALUE: i32 = 10000;
 const MAX_PLY: usize = 128;
 const MAX_DEPTH: u32 = 64;
+const SEARCH_STACK_SIZE: usize = 16 * 1024 * 1024;
+const EVAL_CACHE_SIZE: usize = 1 << 16;
+const CONT_HISTORY_MAX: i32 = 16384;
+const NODE_BATCH: u64 = 2048;
+// Per-helper depth skipping pattern for Lazy SMP: helper `i` uses entry
+// `(i - 1) % 20` and skips depth `d` when `(d + phase) / size` is odd.
+const SKIP_SIZE: [u32; 20] = [1, 1, 2, 2, 2, 2, 3, 3, 3, 3, 3, 3, 4, 4, 4, 4, 4, 4, 4, 4];
+const SKIP_PHASE: [u32; 20] = [0, 1, 0, 1, 2, 3, 0, 1, 2, 3, 4, 5, 0, 1, 2, 3, 4, 5, 6, 7];
+// Late-move reductions `ln(depth) * ln(idx + 1) / 1.5`, at least one ply
+// once both depth and move index reach 3, indexed `[depth][move index]`.
+static LMR_TABLE: Lazy<[[u8; 64]; MAX_DEPTH as usize + 1]> = Lazy::new(|| {
+    let mut table = [[0u8; 64]; MAX_DEPTH as usize + 1];
+    for (depth, row) in table.iter_mut().enumerate().skip(3) {
+        for (idx, r) in row.iter_mut().enumerate().skip(3) {
+            let d = (depth as f64).ln();
+            let m = ((idx + 1) as f64).ln();
+            *r = ((d * m / 1.5) as u8).max(1);
+        }
+    }
+    table
+});
+
+/// History scores indexed `[color][from][to]`.
+type ButterflyTable = [[[i32; 64]; 64]; 2];
 
 pub struct Engine {
     pub depth: u32,
     pub threads: usize,
     tt: Table,
-    killers: Vec<[Option<Move>; 2]>,
-    quiet_history: [[i32; 64]; 64],
-    capture_history: [[i32; 64]; 64],
-    cont_history: HashMap<(u16, u16), i32>,
+    killers: Box<[[Move; 2]; MAX_PLY]>,
+    quiet_history: Box<ButterflyTable>,
+    capture_history: Box<ButterflyTable>,
+    cont_history: Box<[[i32; 384]]>,
     tb: Option<Arc<Tablebase<Chess>>>,
     stop_flag: Arc<AtomicBool>,
     time_manager: Option<Arc<TimeManager>>,
     search_history: Vec<u64>,
+    root_moves: Option<(u64, MoveList)>,
+    root_pv: Option<Move>,
+    eval_cache: Box<[u64]>,
+    nodes: u64,
+    pawn_cache: PawnCache,
 }
 
 impl Clone for Engine {
@@ -243,13 +273,18 @@ impl Clone for Engine {
             threads: self.threads,
             tt: self.tt.clone(), // Arc clone - shares the table!
             killers: self.killers.clone(),
-            quiet_history: self.quiet_history,     // Array copy
-            capture_history: self.capture_history, // Array copy
+            quiet_history: self.quiet_history.clone(),
+            capture_history: self.capture_history.clone(),
             cont_history: self.cont_history.clone(),
             tb: self.tb.clone(),
             stop_flag: self.stop_flag.clone(),
             time_manager: self.time_manager.clone(),
             search_history: self.search_history.clone(),
+            root_moves: self.root_moves.clone(),
+            root_pv: self.root_pv,
+            eval_cache: self.eval_cache.clone(),
+            nodes: 0,
+            pawn_cache: self.pawn_cache.clone(),
         }
     }
 }
@@ -268,14 +303,19 @@ impl Engine {
             depth,
             threads,
             tt: Table::new(table_size.max(1)),
-            killers: vec![[None, None]; MAX_PLY],
-            quiet_history: [[0; 64]; 64],
-            capture_history: [[0; 64]; 64],
-            cont_history: HashMap::new(),
+            killers: Box::new([[Move::NONE; 2]; MAX_PLY]),
+            quiet_history: Box::new([[[0; 64]; 64]; 2]),
+            capture_history: Box::new([[[0; 64]; 64]; 2]),
+            cont_history: vec![[0; 384]; 384].into_boxed_slice(),
             tb: None,
             stop_flag: Arc::new(AtomicBool::new(false)),
             time_manager: None,
             search_history: Vec::new(),
+            root_moves: None,
+            root_pv: None,
+            eval_cache: vec![0; EVAL_CACHE_SIZE].into_boxed_slice(),
+            nodes: 0,
+            pawn_cache: PawnCache::new(),
         }
     }
 
@@ -322,165 +362,124 @@ impl Engine {
         self.stop_flag = Arc::new(AtomicBool::new(false));
     }
 
-    #[inline(always)]
-    fn piece_value(t: PieceType) -> i32 {
-        crate::types::PieceValues::value(t)
-    }
-
-    fn string_to_move(&self, board: &Board, s: &str, e: &str) -> Move {
-        let (sx, sy) = Board::algebraic_to_index(s).unwrap();
-        let (ex, ey) = Board::algebraic_to_index(e).unwrap();
-        let from = (sy * 8 + sx) as u8;
-        let to = (ey * 8 + ex) as u8;
-
-        let piece = board.get_index(sx, sy).unwrap();
-        let captured = board.get_index(ex, ey);
-
-        let is_capture = captured.is_some();
-        let mut flags = Move::FLAG_NORMAL;
-
-        match piece.piece_type {
-            PieceType::Pawn => {
-                let diff_y = (ey as isize - sy as isize).abs();
-                let diff_x = (ex as isize - sx as isize).abs();
-
-                if ey == 0 || ey == 7 {
-                    if is_capture {
-                        flags = Move::FLAG_PROMO_QUEEN_CAP;
-                    } else {
-                        flags = Move::FLAG_PROMO_QUEEN;
-                    }
-                } else if diff_y == 2 && diff_x == 0 {
-                    flags = Move::FLAG_DOUBLE_PUSH;
-                } else if diff_x != 0 && !is_capture {
-                    flags = Move::FLAG_EP_CAPTURE;
-                } else if is_capture {
-                    flags = Move::FLAG_CAPTURE;
-                }
-            }
-            PieceType::King => {
-                let diff_x = (ex as isize - sx as isize).abs();
-                if diff_x == 2 {
-                    if ex > sx {
-                        flags = Move::FLAG_KING_CASTLE;
-                    } else {
-                        flags = Move::FLAG_QUEEN_CASTLE;
-                    }
-                } else if is_capture {
-                    flags = Move::FLAG_CAPTURE;
-                }
-            }
-            _ => {
-                if is_capture {
-                    flags = Move::FLAG_CAPTURE;
-                }
-            }
-        }
-
-        Move::new(from, to, flags)
-    }
-
     fn generate_legal_moves(&self, board: &mut Board, color: Color) -> crate::types::MoveList {
         let mut list = crate::types::MoveList::new();
         crate::movegen::generate_moves_fast(board, color, &mut list);
         list
     }
 
+    #[allow(dead_code)]
     #[inline(always)]
     fn evaluate(board: &Board, color: Color) -> i32 {
         crate::eval::evaluate(board, color)
     }
 
-    fn cheapest_attacker(
-        board: &mut Board,
-        color: Color,
-        tx: usize,
-        ty: usize,
-    ) -> Option<((usize, usize), Piece)> {
-        let target = Board::index_to_algebraic(tx, ty)?;
-        let mut best: Option<((usize, usize), Piece)> = None;
-        for y in 0..8 {
-            for x in 0..8 {
-                if let Some(p) = board.get_index(x, y) {
-                    if p.color == color {
-                        if let Some(from) = Board::index_to_algebraic(x, y) {
-                            if board.pseudo_legal_moves(&from).iter().any(|m| m == &target)
-                                && board.is_legal(&from, &target, color)
-                            {
-                                if best.as_ref().map_or(true, |(_, bp)| {
-                                    Self::piece_value(p.piece_type)
-                                        < Self::piece_value(bp.piece_type)
-                                }) {
-                                    best = Some(((x, y), p));
-                                }
-                            }
-                        }
-                    }
+    /// Static evaluation through a direct-mapped cache. Each slot packs the
+    /// upper half of the position key with the score, so a probe is one load
+    /// and a compare; quiescence revisits the same leaves across iterations.
+    fn evaluate_cached(&mut self, board: &Board, color: Color) -> i32 {
+        let key = board.hash(color);
+        let slot = (key as usize) & (EVAL_CACHE_SIZE - 1);
+        let entry = self.eval_cache[slot];
+        if entry != 0 && entry >> 32 == key >> 32 {
+            return entry as u32 as i32;
+        }
+        let value = crate::eval::evaluate_cached(board, color, &mut self.pawn_cache);
+        self.eval_cache[slot] = (key & 0xFFFF_FFFF_0000_0000) | value as u32 as u64;
+        value
+    }
+
+    /// Cheapest legal capture by `color` onto the occupied square `target`,
+    /// found from the attacker bitboards in piece-value order. Pawns capturing
+    /// onto the last rank promote to a queen.
+    fn cheapest_attacker(board: &Board, color: Color, target: u8) -> Option<Move> {
+        let attackers = board.attackers_to(target, color);
+        let cidx = color as usize;
+        for pt in 0..6 {
+            let mut bb = attackers & board.bitboards[cidx][pt];
+            while bb != 0 {
+                let from = pop_lsb(&mut bb) as u8;
+                // Attackers are pseudo-legal captures, so only king safety is
+                // left to check, on bitboards rather than by playing it.
+                if !board.is_legal_sq(from, target, color) {
+                    continue;
                 }
+                return Some(if pt == 0 && (target < 8 || target >= 56) {
+                    Move::promotion(from, target, PieceType::Queen, true)
+                } else {
+                    Move::capture(from, target)
+                });
             }
         }
-        best
+        None
     }
 
-    fn see_rec(&self, board: &mut Board, color: Color, tx: usize, ty: usize) -> i32 {
-        if let Some(((sx, sy), _piece)) = Self::cheapest_attacker(board, color, tx, ty) {
-            let from = Board::index_to_algebraic(sx, sy).unwrap();
-            let to = Board::index_to_algebraic(tx, ty).unwrap();
-            if let Some(state) = board.make_move_state(&from, &to) {
-                let captured_val = state
-                    .captured
-                    .map_or(0, |p| Self::piece_value(p.piece_type));
-                let gain = captured_val - self.see_rec(board, opposite(color), tx, ty);
-                board.unmake_move(state);
-                return gain.max(0);
-            }
+    fn see_rec(board: &mut Board, color: Color, target: u8) -> i32 {
+        if let Some(m) = Self::cheapest_attacker(board, color, target) {
+            let undo = board.make_move_fast(m, color);
+            let captured_val = if undo.has_capture() {
+                PieceValues::value_by_idx(undo.captured as usize)
+            } else {
+                0
+            };
+            let gain = captured_val - Self::see_rec(board, color.opposite(), target);
+            board.unmake_move_fast(undo, color);
+            return gain.max(0);
         }
         0
     }
 
     #[inline(always)]
-    fn static_exchange_eval(&self, board: &Board, mv: Move) -> i32 {
-        let sx = (mv.from_sq() % 8) as usize;
-        let sy = (mv.from_sq() / 8) as usize;
-        let ex = (mv.to_sq() % 8) as usize;
-        let ey = (mv.to_sq() / 8) as usize;
-
-        if board.get_index(sx, sy).is_none() {
-            return 0; // Should not happen for legal moves
-        }
-
-        let mut b = board.clone(); // Clone is expensive! Use with caution.
-
-        let color = board.get_index(sx, sy).unwrap().color;
-
-        let undo = b.make_move_fast(mv, color);
+    fn static_exchange_eval(&self, board: &mut Board, mv: Move) -> i32 {
+        let color = match board.color_at(mv.from_sq()) {
+            Some(c) => c,
+            None => return 0, // Should not happen for legal moves
+        };
+        let undo = board.make_move_fast(mv, color);
 
         let captured_val = if undo.has_capture() {
-            crate::types::PieceValues::value_by_idx(undo.captured as usize)
+            PieceValues::value_by_idx(undo.captured as usize)
         } else {
             0
         };
 
-        let gain = captured_val - self.see_rec(&mut b, opposite(color), ex, ey);
-        b.unmake_move_fast(undo, color);
-        return gain;
+        let gain = captured_val - Self::see_rec(board, color.opposite(), mv.to_sq());
+        board.unmake_move_fast(undo, color);
+        gain
     }
 
+    /// Whether `mv` loses material by static exchange. A capture of a piece
+    /// worth at least the capturer cannot: whatever recaptures, it wins no
+    /// more than the capturer back. So ordering and quiescence only pay for
+    /// the exchange walk on the rest. Promotions are excluded, since the
+    /// piece left on the square is worth more than the pawn that moved.
     #[inline(always)]
-    fn lmr_value(depth: u32, idx: usize) -> u32 {
-        if depth < 3 || idx < 3 {
-            return 0;
-        }
-        let d = (depth as f64).ln();
-        let m = ((idx + 1) as f64).ln();
-        let mut r = (d * m / 1.5) as i32;
-        if r < 1 {
-            r = 1;
-        }
-        if r as u32 > depth - 1 {
-            r = (depth - 1) as i32;
+    fn loses_exchange(&self, board: &mut Board, mv: Move) -> bool {
+        if !mv.is_promotion() {
+            let victim = if mv.is_ep() {
+                0
+            } else {
+                board.piece_type_idx_at(mv.to_sq())
+            };
+            let attacker = board.piece_type_idx_at(mv.from_sq());
+            if PieceValues::value_by_idx(victim) >= PieceValues::value_by_idx(attacker) {
+                return false;
+            }
         }
-        r as u32
+        self.static_exchange_eval(board, mv) < 0
+    }
+
+    #[inline(always)]
+    fn lmr_value(depth: u32, idx: usize) -> u32 {
+        let r = LMR_TABLE[(depth as usize).min(MAX_DEPTH as usize)][idx.min(63)] as u32;
+        r.min(depth.saturating_sub(1))
+    }
+
+    /// Whether the position `hash` already occurred in the game. Below the
+    /// root it is scored as a draw.
+    #[inline]
+    fn is_repetition(&self, hash: u64) -> bool {
+        self.search_history.contains(&hash)
     }
 
     fn probe_syzygy(&self, board: &Board, color: Color, ply: usize) -> Option<i32> {
@@ -502,62 +501,78 @@ impl Engine {
         })
     }
 
-    fn move_score(&self, board: &Board, mv: Move, ply: usize, prev: Option<&Move>) -> i32 {
+    fn move_score(
+        &self,
+        board: &mut Board,
+        color: Color,
+        mv: Move,
+        ply: usize,
+        prev: Option<&Move>,
+    ) -> i32 {
         let mut score = 0;
         let capture = mv.is_capture();
         let from = mv.from_sq() as usize;
         let to = mv.to_sq() as usize;
+        let side = color as usize;
 
         if capture {
-            score += self.capture_history[from][to];
+            score += self.capture_history[side][from][to];
 
             let victim_idx = if mv.is_ep() {
                 0 // Pawn
             } else {
-                let tx = to % 8;
-                let ty = to / 8;
-                board.piece_type_idx_at((ty * 8 + tx) as u8)
+                board.piece_type_idx_at(to as u8)
             };
-
             let attacker_idx = board.piece_type_idx_at(from as u8);
+            score += mvv_lva_score(victim_idx, attacker_idx) * 100;
 
-            if victim_idx < 6 && attacker_idx < 6 {
-                score += mvv_lva_score(victim_idx, attacker_idx) * 100;
-            }
-
-            if self.static_exchange_eval(board, mv) < 0 {
+            if self.loses_exchange(board, mv) {
                 score -= 1000;
             }
         } else {
-            score += self.quiet_history[from][to];
+            score += self.quiet_history[side][from][to];
+            // Empty slots hold Move::NONE, which never matches a real move.
             if let Some(k) = self.killers.get(ply) {
-                if let Some(m) = &k[0] {
-                    if m.0 == mv.0 {
-                        score += 10_000;
-                    }
-                }
-                if let Some(m) = &k[1] {
-                    if m.0 == mv.0 {
-                        score += 9_000;
-                    }
+                if k[0] == mv {
+                    score += 10_000;
+                } else if k[1] == mv {
+                    score += 9_000;
                 }
             }
         }
 
         if let Some(pmv) = prev {
-            score += *self.cont_history.get(&(pmv.0, mv.0)).unwrap_or(&0);
+            let (p, c) = Self::cont_index(board, *pmv, mv);
+            score += self.cont_history[p][c];
         }
         score
     }
 
+    /// Continuation-history slots for `mv` played in reply to `prev`, keyed
+    /// by (piece, destination) of each move. `board` must be the position in
+    /// which `mv` is about to be played, so `prev`'s piece sits on its target.
     #[inline(always)]
-    fn should_stop(&self) -> bool {
+    fn cont_index(board: &Board, prev: Move, mv: Move) -> (usize, usize) {
+        let prev_piece = board.piece_type_idx_at(prev.to_sq()).min(5);
+        let piece = board.piece_type_idx_at(mv.from_sq()).min(5);
+        (
+            prev_piece * 64 + prev.to_sq() as usize,
+            piece * 64 + mv.to_sq() as usize,
+        )
+    }
+
+    #[inline(always)]
+    fn should_stop(&mut self) -> bool {
         if self.stop_flag.load(Ordering::Relaxed) {
             return true;
         }
         if let Some(tm) = &self.time_manager {
-            let count = tm.node_count.fetch_add(1, Ordering::Relaxed);
-            if count & 2047 == 0 {
+            // Count nodes locally and publish them in batches: a shared
+            // fetch_add per node makes every search thread contend for the
+            // same cache line.
+            self.nodes += 1;
+            if self.nodes & (NODE_BATCH - 1) == 0 {
+                tm.node_count.fetch_add(NODE_BATCH, Ordering::Relaxed);
                 if tm.should_stop() {
                     self.stop_flag.store(true, Ordering::Release);
                     return true;
@@ -580,7 +595,7 @@ impl Engine {
             return 0;
         }
 
-        let stand_pat = Self::evaluate(board, color);
+        let stand_pat = self.evaluate_cached(board, color);
 
         if stand_pat >= beta {
             return beta;
@@ -595,34 +610,35 @@ impl Engine {
             return alpha;
         }
 
-        let list = self.generate_legal_moves(board, color);
-        let mut capt_list = crate::types::MoveList::new();
-        for m in list.iter() {
-            if m.is_capture() {
-                capt_list.push(*m);
-            }
-        }
-        let mut moves = capt_list;
+        let mut moves = crate::types::MoveList::new();
+        crate::movegen::generate_captures_fast(board, color, &mut moves);
 
+        // Captures only: MVV-LVA is enough to order them, and SEE is applied
+        // below only where a capture could lose material. Most nodes cut off
+        // after one or two captures, so pick the best remaining one on demand
+        // rather than sorting.
         let len = moves.len();
-        if len > 1 {
-            let slice = moves.as_mut_slice();
-            slice.sort_by(|a, b| {
-                let score_a = self.move_score(board, *a, ply, None);
-                let score_b = self.move_score(board, *b, ply, None);
-                score_b.cmp(&score_a)
-            });
+        let moves = moves.as_mut_slice();
+        let mut scores = [0i32; 256];
+        for (score, m) in scores.iter_mut().zip(moves.iter()) {
+            let victim = if m.is_ep() {
+                0
+            } else {
+                board.piece_type_idx_at(m.to_sq())
+            };
+            *score = mvv_lva_score(victim, board.piece_type_idx_at(m.from_sq()));
         }
 
-        for m in moves.iter() {
-            let see_value = self.static_exchange_eval(board, *m);
-            if see_value < 0 {
+        for idx in 0..len {
+            pick_next(moves, &mut scores[..len], idx);
+            let m = &moves[idx];
+            if self.loses_exchange(board, *m) {
                 continue;
             }
 
             let undo = board.make_move_fast(*m, color);
 
-            let score = -self.quiescence(board, opposite(color), -beta, -alpha, ply + 1);
+            let score = -self.quiescence(board, color.opposite(), -beta, -alpha, ply + 1);
 
             board.unmake_move_fast(undo, color);
 
@@ -650,19 +666,14 @@ impl Engine {
         mut beta: i32,
         ply: usize,
         prev_move: Option<Move>,
-        _use_iir: bool,
+        known_check: Option<bool>,
     ) -> i32 {
         if self.should_stop() {
             return 0;
         }
 
-        if ply > 0 {
-            let current_hash = board.hash(color);
-            for &h in &self.search_history {
-                if h == current_hash {
-                    return 0; // Draw by repetition
-                }
-            }
+        if ply > 0 && self.is_repetition(board.hash(color)) {
+            return 0; // Draw by repetition
         }
 
         let mate_max = MATE_VALUE - ply as i32;
@@ -692,13 +703,12 @@ impl Engine {
                     return entry.value;
                 }
             }
-            if let Some((fs, ts)) = entry.best {
-                let f_str =
-                    Board::index_to_algebraic((fs % 8) as usize, (fs / 8) as usize).unwrap();
-                let t_str =
-                    Board::index_to_algebraic((ts % 8) as usize, (ts / 8) as usize).unwrap();
-                tt_best = Some(self.string_to_move(board, &f_str, &t_str));
-            }
+            tt_best = entry.best;
+        }
+        // The root entry can be overwritten between iterations; fall back to
+        // the best root move found so far so re-searches never start cold.
+        if ply == 0 && tt_best.is_none() {
+            tt_best = self.root_pv;
         }
 
         if let Some(tb_val) = self.probe_syzygy(board, color, ply) {
@@ -709,10 +719,14 @@ impl Engine {
             return self.quiescence(board, color, alpha, beta, ply);
         }
 
-        let in_check = board.in_check(color);
+        // The parent already tested whether its move gives check.
+        let in_check = match known_check {
+            Some(c) => c,
+            None => board.in_check_fast(color),
+        };
 
         if depth <= 3 && !in_check {
-            let eval = Self::evaluate(board, color);
+            let eval = self.evaluate_cached(board, color);
             if eval - RFP_MARGIN[depth as usize] >= beta {
                 return eval;
             }
@@ -721,20 +735,18 @@ impl Engine {
         let can_null = !in_check && board.piece_count_total(color) > 3 && depth >= 3;
         if can_null {
             let r = if depth > 6 { 3 } else { 2 };
-            let ep = board.en_passant; // Backup EP
-
-            board.en_passant = None;
+            let ep = board.make_null_move();
             let score = -self.pvs(
                 board,
-                opposite(color),
+                color.opposite(),
                 depth - 1 - r,
                 -beta,
                 -beta + 1,
                 ply + 1,
                 None, // Prev move is null
-                false,
+                Some(false),
             );
-            board.en_passant = ep; // Restore EP
+            board.unmake_null_move(ep);
 
             if self.stop_flag.load(Ordering::Relaxed) {
                 return 0;
@@ -750,7 +762,7 @@ impl Engine {
                         beta,
                         ply,
                         prev_move,
-                        false,
+                        Some(false),
                     );
                     if verify >= beta {
                         return beta;
@@ -761,7 +773,12 @@ impl Engine {
             }
         }
 
-        let mut moves_list = self.generate_legal_moves(board, color);
+        // The root position is searched once per iteration and again on every
+        // aspiration re-search; its move list is generated once per search.
+        let mut moves_list = match &self.root_moves {
+            Some((key, list)) if ply == 0 && *key == hash => list.clone(),
+            _ => self.generate_legal_moves(board, color),
+        };
         if moves_list.len() == 0 {
             if in_check {
                 return -MATE_VALUE + ply as i32;
@@ -771,30 +788,36 @@ impl Engine {
 
         let moves_slice = moves_list.as_mut_slice();
 
+        let len = moves_slice.len();
         let mut scores = [0i32; 256];
-        for (i, m) in moves_slice.iter().enumerate() {
-            scores[i] = self.move_score(board, *m, ply, prev_move.as_ref());
-            if let Some(ttm) = tt_best {
-                if m.0 == ttm.0 {
-                    scores[i] = 1_000_000;
-                }
-            }
-        }
 
-        let len = moves_slice.len();
-        for i in 0..len {
-            for j in 0..len - 1 - i {
-                if scores[j] < scores[j + 1] {
-                    scores.swap(j, j + 1);
-                    moves_slice.swap(j, j + 1);
-                }
+        // Search the TT move before scoring anything else: where it exists it
+        // usually produces the cutoff on its own.
+        let mut scored_from = 0;
+        if let Some(ttm) = tt_best {
+            if let Some(pos) = moves_slice.iter().position(|m| *m == ttm) {
+                moves_slice.swap(0, pos);
+                scores[0] = 1_000_000;
+                scored_from = 1;
             }
         }
+        let mut scored = false;
 
         let mut best_move: Option<Move> = None;
         let mut skip_quiets = false;
 
-        for (idx, m) in moves_slice.iter().enumerate() {
+        for idx in 0..len {
+            if idx >= scored_from {
+                if !scored {
+                    for i in scored_from..len {
+                        scores[i] =
+                            self.move_score(board, color, moves_slice[i], ply, prev_move.as_ref());
+                    }
+                    scored = true;
+                }
+                pick_next(moves_slice, &mut scores[..len], idx);
+            }
+            let m = &moves_slice[idx];
             let capture = m.is_capture();
 
             if !in_check && !capture && depth <= 4 && idx >= LMP_LIMITS[depth as usize] {
@@ -804,15 +827,15 @@ impl Engine {
                 continue;
             }
             if !in_check && !capture && depth <= HLP_THRESHOLD && idx > 0 {
-                let s = self.move_score(board, *m, ply, prev_move.as_ref());
-                if s < HLP_BASE {
+                if scores[idx] < HLP_BASE {
                     skip_quiets = true;
                     continue;
                 }
             }
 
             let undo = board.make_move_fast(*m, color);
-            let gives_check = board.in_check_fast(opposite(color)); // Fast check
+            self.tt.prefetch(board.hash(color.opposite()));
+            let gives_check = board.in_check_fast(color.opposite()); // Fast check
 
             let mut new_depth = depth - 1;
             if gives_check && depth < MAX_DEPTH - 1 {
@@ -828,35 +851,35 @@ impl Engine {
             if idx == 0 {
                 score = -self.pvs(
                     board,
-                    opposite(color),
+                    color.opposite(),
                     new_depth,
                     -beta,
                     -alpha,
                     ply + 1,
                     Some(*m),
-                    true,
+                    Some(gives_check),
                 );
             } else {
                 score = -self.pvs(
                     board,
-                    opposite(color),
+                    color.opposite(),
                     new_depth,
                     -alpha - 1,
                     -alpha,
                     ply + 1,
                     Some(*m),
-                    true,
+                    Some(gives_check),
                 );
                 if score > alpha && score < beta {
                     score = -self.pvs(
                         board,
-                        opposite(color),
+                        color.opposite(),
                         new_depth,
                         -beta,
                         -alpha,
                         ply + 1,
                         Some(*m),
-                        true,
+                        Some(gives_check),
                     );
                 }
             }
@@ -868,14 +891,14 @@ impl Engine {
             }
 
             if score >= beta {
+                // Killers are preallocated for MAX_PLY plies; deeper cutoffs
+                // are simply not recorded rather than growing the table here.
                 if !capture {
-                    if self.killers.len() <= ply {
-                        self.killers.resize(ply + 1, [None, None]);
-                    }
-                    let k = &mut self.killers[ply];
-                    if k[0] != Some(*m) {
-                        k[1] = k[0];
-                        k[0] = Some(*m);
+                    if let Some(k) = self.killers.get_mut(ply) {
+                        if k[0] != *m {
+                            k[1] = k[0];
+                            k[0] = *m;
+                        }
                     }
                 }
 
@@ -884,13 +907,16 @@ impl Engine {
                 let bonus = (depth * depth) as i32;
 
                 if capture {
-                    self.capture_history[from][to] += bonus;
+                    self.capture_history[color as usize][from][to] += bonus;
                 } else {
-                    self.quiet_history[from][to] += bonus;
+                    self.quiet_history[color as usize][from][to] += bonus;
                 }
 
-                if let Some(pmv) = prev_move {
-                    *self.cont_history.entry((pmv.0, m.0)).or_insert(0) += bonus;
+                if !capture {
+                    if let Some(pmv) = prev_move {
+                        let (p, c) = Self::cont_index(board, pmv, *m);
+                        update_cont_history(&mut self.cont_history[p][c], bonus);
+                    }
                 }
 
                 self.tt.store(
@@ -899,7 +925,7 @@ impl Engine {
                         depth,
                         value: beta,
                         bound: Bound::Lower,
-                        best: Some((from as u8, to as u8)),
+                        best: Some(*m),
                     },
                 );
 
@@ -909,15 +935,22 @@ impl Engine {
                 let to = m.to_sq() as usize;
                 let penalty = (depth * depth) as i32;
                 if capture {
-                    self.capture_history[from][to] -= penalty;
+                    self.capture_history[color as usize][from][to] -= penalty;
                 } else {
-                    self.quiet_history[from][to] -= penalty;
+                    self.quiet_history[color as usize][from][to] -= penalty;
+                    if let Some(pmv) = prev_move {
+                        let (p, c) = Self::cont_index(board, pmv, *m);
+                        update_cont_history(&mut self.cont_history[p][c], -penalty);
+                    }
                 }
             }
 
             if score > alpha {
                 alpha = score;
                 best_move = Some(*m);
+                if ply == 0 {
+                    self.root_pv = best_move;
+                }
             }
         }
 
@@ -927,15 +960,13 @@ impl Engine {
             Bound::Exact
         };
 
-        let best_idx = best_move.map(|m| (m.from_sq(), m.to_sq()));
-
         self.tt.store(
             hash,
             TTEntry {
                 depth,
                 value: alpha,
                 bound,
-                best: best_idx,
+                best: best_move,
             },
         );
 
@@ -950,7 +981,7 @@ impl Engine {
         self.reset_stop();
         self.tt.next_age();
 
-        if let Some(book_mv) = book_move(&game.history, &game.board, game.current_turn) {
+        if let Some(book_mv) = book_move(&game.board, game.current_turn) {
             return Some((book_mv, 0));
         }
 
@@ -958,7 +989,11 @@ impl Engine {
         let time_manager = TimeManager::new(config, game.current_turn, self.stop_flag.clone());
         self.time_manager = Some(Arc::new(time_manager));
 
-        let result = self.best_move_single(game, max_depth);
+        let result = if self.threads > 1 {
+            self.best_move_smp(game, max_depth)
+        } else {
+            self.best_move_single(game, max_depth, 0)
+        };
 
         self.time_manager = None;
         result
@@ -969,10 +1004,80 @@ impl Engine {
         self.best_move_timed(game, &config).map(|(m, _)| m)
     }
 
+    /// Depth-1 iteration: resolves each root move with a quiescence search
+    /// (or a mate test for checking moves) and keeps the best, skipping the
+    /// pvs and aspiration machinery for a tree that is only one ply deep.
+    fn score_root_moves(&mut self, board: &mut Board, color: Color) -> Option<(Move, i32)> {
+        let moves = self.root_moves.as_ref()?.1.clone();
+        let mut best: Option<(Move, i32)> = None;
+        let mut alpha = -100000;
+        for m in moves.iter() {
+            let undo = board.make_move_fast(*m, color);
+            // Repetitions and tablebase hits are scored first, as in pvs.
+            // Quiescence stands pat while in check, so a mating move would
+            // look quiet; catch it here so it leads the depth-2 ordering.
+            let score = if self.is_repetition(board.hash(color.opposite())) {
+                0
+            } else if let Some(tb_val) = self.probe_syzygy(board, color.opposite(), 1) {
+                -tb_val
+            } else if board.in_check_fast(color.opposite())
+                && self.generate_legal_moves(board, color.opposite()).len() == 0
+            {
+                MATE_VALUE - 1
+            } else {
+                -self.quiescence(board, color.opposite(), -100000, -alpha, 1)
+            };
+            board.unmake_move_fast(undo, color);
+            if best.is_none() || score > alpha {
+                alpha = score;
+                best = Some((*m, score));
+            }
+        }
+        best
+    }
+
+    /// Lazy SMP: helper threads run the same iterative deepening on their own
+    /// copy of the game, with private killers and histories, and only share
+    /// the transposition table, stop flag and time manager with the main
+    /// thread. Helpers skip some iterations following SKIP_SIZE/SKIP_PHASE,
+    /// so at any moment they are spread over several depths and fill the
+    /// table with different subtrees instead of repeating the main thread's
+    /// work. The main thread's result is returned; helpers are stopped once
+    /// it is done.
+    fn best_move_smp(
+        &mut self,
+        game: &mut Game,
+        max_depth: u32,
+    ) -> Option<((String, String), u32)> {
+        let helpers: Vec<(usize, Engine, Game)> = (1..self.threads)
+            .map(|id| (id, self.clone(), game.search_copy()))
+            .collect();
+
+        std::thread::scope(|scope| {
+            for (id, mut engine, mut helper_game) in helpers {
+                let spawned = std::thread::Builder::new()
+                    .stack_size(SEARCH_STACK_SIZE)
+                    .spawn_scoped(scope, move || {
+                        engine.best_move_single(&mut helper_game, max_depth, id);
+                    });
+                if spawned.is_err() {
+                    break;
+                }
+            }
+
+            let result = self.best_move_single(game, max_depth, 0);
+            self.stop_flag.store(true, Ordering::Release);
+            result
+        })
+    }
+
+    /// Iterative deepening for one thread. `helper` is 0 for the main thread
+    /// and the helper index otherwise.
     fn best_move_single(
         &mut self,
         game: &mut Game,
         max_depth: u32,
+        helper: usize,
     ) -> Option<((String, String), u32)> {
         const ASPIRATION: i32 = 50;
         let color = game.current_turn;
@@ -982,6 +1087,9 @@ impl Engine {
         let mut reached_depth = 0;
 
         self.search_history = game.hash_history.clone();
+        let root_moves = self.generate_legal_moves(&mut game.board, color);
+        self.root_moves = Some((root_hash, root_moves));
+        self.root_pv = None;
 
         for d in 1..=max_depth {
             if let Some(ref tm) = self.time_manager {
@@ -989,46 +1097,84 @@ impl Engine {
                     break;
                 }
             }
+            if helper > 0 && d < max_depth {
+                let i = (helper - 1) % SKIP_SIZE.len();
+                if ((d + SKIP_PHASE[i]) / SKIP_SIZE[i]) % 2 == 1 {
+                    continue;
+                }
+            }
 
-            let mut alpha = -100000;
-            let mut beta = 100000;
-            if d > 1 {
-                alpha = guess - ASPIRATION;
-                beta = guess + ASPIRATION;
+            if d == 1 {
+                if let Some((mv, score)) = self.score_root_moves(&mut game.board, color) {
+                    if self.stop_flag.load(Ordering::Relaxed) {
+                        break;
+                    }
+                    guess = score;
+                    best_move = Some(mv);
+                    self.root_pv = best_move;
+                    self.tt.store(
+                        root_hash,
+                        TTEntry {
+                            depth: 1,
+                            value: score,
+                            bound: Bound::Exact,
+                            best: best_move,
+                        },
+                    );
+                }
+                reached_depth = 1;
+                continue;
             }
 
+            let mut delta = ASPIRATION;
+            let mut alpha = guess - delta;
+            let mut beta = guess + delta;
+
             loop {
                 if self.stop_flag.load(Ordering::Relaxed) {
                     break;
                 }
 
-                let mut board = game.board.clone();
-
-                let score = self.pvs(&mut board, color, d, alpha, beta, 0, None, true);
+                // Every make inside pvs is paired with its unmake, so the
+                // root position can be searched in place instead of cloned.
+                let score = self.pvs(&mut game.board, color, d, alpha, beta, 0, None, None);
+                debug_assert_eq!(game.board.hash(color), root_hash);
 
                 if self.stop_flag.load(Ordering::Relaxed) {
                     break;
                 }
 
+                // Widen only the side that failed, by a margin that doubles on
+                // each retry so a large score swing costs a few re-searches
+                // rather than one per 100 centipawns.
+                delta *= 2;
                 if score <= alpha {
-                    alpha = (alpha - ASPIRATION * 2).max(-100000);
+                    alpha = (score - delta).max(-100000);
                     continue;
                 }
                 if score >= beta {
-                    beta = (beta + ASPIRATION * 2).min(100000);
+                    beta = (score + delta).min(100000);
                     continue;
                 }
 
                 guess = score;
 
-                if let Some(entry) = self.tt.get(root_hash) {
-                    if let Some((fs, ts)) = entry.best {
-                        let f_str = Board::index_to_algebraic((fs % 8) as usize, (fs / 8) as usize)
-                            .unwrap();
-                        let t_str = Board::index_to_algebraic((ts % 8) as usize, (ts / 8) as usize)
-                            .unwrap();
-                        best_move = Some(self.string_to_move(&game.board, &f_str, &t_str));
-                    }
+                // pvs records each new best root move in `root_pv`. It stays
+                // empty only if the root returned before any move was
+                // searched (a table or tablebase hit) and no earlier
+                // iteration set it; the table's move is then taken only if
+                // it is a root move, as its 16-bit key check can match
+                // another position.
+                if self.root_pv.is_none() {
+                    let root_moves = self.root_moves.as_ref().map(|(_, list)| list);
+                    self.root_pv = self
+                        .tt
+                        .get(root_hash)
+                        .and_then(|entry| entry.best)
+                        .filter(|m| root_moves.is_some_and(|list| list.iter().any(|r| r == m)));
+                }
+                if self.root_pv.is_some() {
+                    best_move = self.root_pv;
                 }
                 break;
             }
@@ -1038,41 +1184,51 @@ impl Engine {
             }
         }
 
+        // Square names only appear here, at the API boundary.
         best_move.map(|m| {
-            let f =
-                Board::index_to_algebraic((m.from_sq() % 8) as usize, (m.from_sq() / 8) as usize)
-                    .unwrap();
-            let t = Board::index_to_algebraic((m.to_sq() % 8) as usize, (m.to_sq() / 8) as usize)
-                .unwrap();
-            let mut t_string = t;
-            if m.is_promotion() {
-                if let Some(pt) = m.promotion_piece() {
-                    let c = match pt {
-                        PieceType::Queen => 'q',
-                        PieceType::Rook => 'r',
-                        PieceType::Bishop => 'b',
-                        PieceType::Knight => 'n',
-                        _ => 'q',
-                    };
-                    t_string.push(c);
-                }
+            let mut to = Square::name(m.to_sq()).to_string();
+            if let Some(pt) = m.promotion_piece() {
+                to.push(match pt {
+                    PieceType::Rook => 'r',
+                    PieceType::Bishop => 'b',
+                    PieceType::Knight => 'n',
+                    _ => 'q',
+                });
             }
-            ((f, t_string), reached_depth)
+            ((Square::name(m.from_sq()).to_string(), to), reached_depth)
         })
     }
 }
 
+/// Selection step of move ordering: swaps the best-scored move among
+/// `moves[idx..]` into slot `idx`. Most nodes cut off after a few moves, so
+/// ordering on demand beats sorting the whole list up front.
 #[inline(always)]
-fn opposite(c: Color) -> Color {
-    match c {
-        Color::White => Color::Black,
-        Color::Black => Color::White,
+fn pick_next(moves: &mut [Move], scores: &mut [i32], idx: usize) {
+    let mut best = idx;
+    for j in idx + 1..moves.len() {
+        if scores[j] > scores[best] {
+            best = j;
+        }
+    }
+    if best != idx {
+        moves.swap(idx, best);
+        scores.swap(idx, best);
     }
 }
 
+/// Moves a continuation-history score by `delta`, scaled down as it nears
+/// `CONT_HISTORY_MAX`, so entries stay bounded and old results fade instead
+/// of dominating for the rest of the game.
+#[inline(always)]
+fn update_cont_history(entry: &mut i32, delta: i32) {
+    *entry += delta - *entry * delta.abs() / CONT_HISTORY_MAX;
+}
+
 #[cfg(test)]
 mod tests {
     use super::*;
+    use crate::pieces::Piece;
 
     fn setup_game() -> Game {
         Game::new()
@@ -1144,6 +1300,37 @@ mod tests {
         assert_eq!(to, "d8", "Queen should capture rook on d8");
     }
 
+    #[test]
+    fn test_depth_one_scores_repetition_as_draw() {
+        // Qxd8 would win the rook, but it repeats a position from the game.
+        let mut game = Game::new();
+        game.board = Board::new();
+        for (sq, piece_type, color) in [
+            ("e1", PieceType::King, Color::White),
+            ("d1", PieceType::Queen, Color::White),
+            ("h8", PieceType::King, Color::Black),
+            ("d8", PieceType::Rook, Color::Black),
+        ] {
+            game.board.set(sq, Some(Piece { piece_type, color }));
+        }
+
+        let mut engine = Engine::new(1);
+        let moves = engine.generate_legal_moves(&mut game.board, Color::White);
+        let capture = *moves
+            .iter()
+            .find(|m| m.from_sq() == 3 && m.to_sq() == 59)
+            .unwrap();
+        let mut after = game.board;
+        after.make_move_fast(capture, Color::White);
+        engine.search_history = vec![after.hash(Color::Black)];
+
+        let mut only_capture = MoveList::new();
+        only_capture.push(capture);
+        engine.root_moves = Some((game.board.hash(Color::White), only_capture));
+        let scored = engine.score_root_moves(&mut game.board, Color::White);
+        assert_eq!(scored.map(|(_, score)| score), Some(0));
+    }
+
     #[test]
     fn test_mate_in_one() {
         let mut game = Game::new();
@@ -1196,6 +1383,44 @@ mod tests {
         assert_eq!(to, "a8", "Rook should deliver mate on a8");
     }
 
+    #[test]
+    fn test_lazy_smp_returns_legal_move() {
+        let mut game = setup_game();
+        game.make_move("e2", "e4");
+        game.make_move("c7", "c5");
+        game.make_move("g1", "f3");
+        game.make_move("d7", "d6");
+        game.make_move("b1", "c3");
+        let mut engine = Engine::with_threads(3, 3);
+
+        let config = TimeConfig::fixed_depth(3);
+        let ((from, to), depth) = engine.best_move_timed(&mut game, &config).unwrap();
+        assert_eq!(depth, 3);
+        assert!(game.board.is_legal(&from, &to, Color::Black));
+    }
+
+    #[test]
+    fn test_root_ignores_colliding_table_move() {
+        // An entry under the root key whose move belongs to another position
+        // (a1h8 is not a move here), deep enough to cut off every iteration.
+        let mut game = setup_game();
+        game.make_move("a2", "a3");
+        let mut engine = Engine::new(3);
+        let root_hash = game.board.hash(game.current_turn);
+        engine.tt.store(
+            root_hash,
+            TTEntry {
+                depth: 60,
+                value: 0,
+                bound: Bound::Exact,
+                best: Some(Move::new(0, 63, Move::FLAG_NORMAL)),
+            },
+        );
+
+        let ((s, e), _) = engine.best_move_single(&mut game, 3, 0).unwrap();
+        assert!(game.make_move(&s, &e), "illegal root move {}{}", s, e);
+    }
+
     #[test]
     fn test_fixed_depth_search() {
         let mut game = setup_game();
@@ -1242,6 +1467,41 @@ mod tests {
         );
     }
 
+    #[test]
+    fn test_cont_history_update_is_bounded() {
+        let mut entry = 0;
+        for _ in 0..10_000 {
+            update_cont_history(&mut entry, 400);
+        }
+        assert!(entry > 0 && entry <= CONT_HISTORY_MAX);
+        for _ in 0..10_000 {
+            update_cont_history(&mut entry, -400);
+        }
+        assert!(entry < 0 && entry >= -CONT_HISTORY_MAX);
+    }
+
+    #[test]
+    fn test_lmr_table_is_monotonic_and_bounded() {
+        assert_eq!(Engine::lmr_value(2, 40), 0);
+        assert_eq!(Engine::lmr_value(10, 2), 0);
+        assert!(Engine::lmr_value(10, 40) >= Engine::lmr_value(10, 4));
+        assert!(Engine::lmr_value(20, 40) >= Engine::lmr_value(10, 40));
+        for depth in 3..=MAX_DEPTH {
+            assert!(Engine::lmr_value(depth, 255) < depth);
+        }
+    }
+
+    #[test]
+    fn test_eval_cache_matches_evaluate() {
+        let mut engine = Engine::new(1);
+        let game = setup_game();
+        for color in [Color::White, Color::Black] {
+            let direct = Engine::evaluate(&game.board, color);
+            assert_eq!(engine.evaluate_cached(&game.board, color), direct);
+            assert_eq!(engine.evaluate_cached(&game.board, color), direct);
+        }
+    }
+
     #[test]
     fn test_time_config_creation() {
         let fixed = TimeConfig::fixed_depth(5);
@@ -1,6 +1,7 @@
 use crate::board::{Board, color_idx};
+use crate::movegen::PAWN_ATTACKS;
 use crate::pieces::Color;
-use crate::types::{Phase, Square};
+use crate::types::{Phase, Square, pop_lsb};
 
 #[derive(Copy, Clone, Default, Eq, PartialEq)]
 pub struct Score(i32);
@@ -185,6 +186,96 @@ const PST_EG: [[i16; 64]; 6] = [
 const MATERIAL_MG: [i16; 6] = [100, 320, 330, 500, 900, 0];
 const MATERIAL_EG: [i16; 6] = [120, 300, 320, 550, 1000, 0];
 
+/// Material and piece-square values merged into one packed score per
+/// `[color][piece][square]`, built at compile time. Black entries are
+/// already mirrored and negated, so the material pass is a single lookup
+/// and add per piece for both sides.
+static PSQT: [[[Score; 64]; 6]; 2] = {
+    let mut table = [[[Score::ZERO; 64]; 6]; 2];
+    let mut pt = 0;
+    while pt < 6 {
+        let mut sq = 0;
+        while sq < 64 {
+            let white = Score::new(
+                MATERIAL_MG[pt] + PST_MG[pt][sq],
+                MATERIAL_EG[pt] + PST_EG[pt][sq],
+            );
+            table[0][pt][sq] = white;
+            table[1][pt][Square::flip(sq as u8) as usize] = Score(-white.0);
+            sq += 1;
+        }
+        pt += 1;
+    }
+    table
+};
+
+const FILE_A: u64 = 0x0101010101010101;
+
+/// Files either side of each file (not the file itself).
+static ADJACENT_FILES: [u64; 8] = {
+    let mut masks = [0u64; 8];
+    let mut f = 0;
+    while f < 8 {
+        if f > 0 {
+            masks[f] |= FILE_A << (f - 1);
+        }
+        if f < 7 {
+            masks[f] |= FILE_A << (f + 1);
+        }
+        f += 1;
+    }
+    masks
+};
+
+/// Ranks strictly in front of each rank, from `color`'s point of view.
+static FORWARD_RANKS: [[u64; 8]; 2] = {
+    let mut masks = [[0u64; 8]; 2];
+    let mut rank = 0;
+    while rank < 8 {
+        masks[0][rank] = if rank == 7 {
+            0
+        } else {
+            !0u64 << ((rank + 1) * 8)
+        };
+        masks[1][rank] = (1u64 << (rank * 8)) - 1;
+        rank += 1;
+    }
+    masks
+};
+
+/// Squares an enemy pawn must not occupy for a pawn on `sq` to be passed:
+/// its own and adjacent files, in front of it.
+static PASSED_MASKS: [[u64; 64]; 2] = {
+    let mut masks = [[0u64; 64]; 2];
+    let mut sq = 0;
+    while sq < 64 {
+        let span = ADJACENT_FILES[sq % 8] | (FILE_A << (sq % 8));
+        masks[0][sq] = FORWARD_RANKS[0][sq / 8] & span;
+        masks[1][sq] = FORWARD_RANKS[1][sq / 8] & span;
+        sq += 1;
+    }
+    masks
+};
+
+/// Adjacent-file squares on the same rank or one rank either side.
+static NEIGHBOUR_MASKS: [u64; 64] = {
+    let mut masks = [0u64; 64];
+    let mut sq = 0;
+    while sq < 64 {
+        let rank = sq / 8;
+        let mut ranks = 0xFFu64 << (rank * 8);
+        if rank > 0 {
+            ranks |= 0xFFu64 << ((rank - 1) * 8);
+        }
+        if rank < 7 {
+            ranks |= 0xFFu64 << ((rank + 1) * 8);
+        }
+        masks[sq] = ADJACENT_FILES[sq % 8] & ranks;
+        sq += 1;
+    }
+    masks
+};
+
 const PASSED_PAWN_BONUS_MG: [i16; 8] = [0, 5, 10, 20, 40, 70, 120, 0];
 const PASSED_PAWN_BONUS_EG: [i16; 8] = [0, 10, 20, 40, 70, 120, 200, 0];
 
@@ -218,6 +309,8 @@ const ROOK_ON_7TH_BONUS: Score = Score::new(20, 30);
 const KNIGHT_OUTPOST_BONUS: Score = Score::new(25, 15);
 
 const TEMPO_BONUS: i32 = 15;
+/// White-relative scores are multiplied by this to view them from `color`.
+const SIDE_SIGN: [i32; 2] = [1, -1];
 
 #[allow(dead_code)]
 pub struct Evaluator<'a> {
@@ -230,37 +323,46 @@ pub struct Evaluator<'a> {
 
 impl<'a> Evaluator<'a> {
     pub fn new(board: &'a Board) -> Self {
-        let white_pieces: u64 = board.bitboards[0].iter().fold(0, |a, b| a | b);
-        let black_pieces: u64 = board.bitboards[1].iter().fold(0, |a, b| a | b);
-
-        let phase = Self::calculate_phase(board);
-
+        // The occupancy masks are kept by the board; only the phase needs
+        // a pass over the piece bitboards.
         Self {
             board,
-            white_pieces,
-            black_pieces,
-            occupied: white_pieces | black_pieces,
-            phase,
+            white_pieces: board.occupancy[0],
+            black_pieces: board.occupancy[1],
+            occupied: board.occupied(),
+            phase: Self::calculate_phase(board),
         }
     }
 
     fn calculate_phase(board: &Board) -> i32 {
         let mut phase = 0;
-        for color in 0..2 {
-            phase += board.bitboards[color][1].count_ones() as i32 * Phase::KNIGHT_PHASE;
-            phase += board.bitboards[color][2].count_ones() as i32 * Phase::BISHOP_PHASE;
-            phase += board.bitboards[color][3].count_ones() as i32 * Phase::ROOK_PHASE;
-            phase += board.bitboards[color][4].count_ones() as i32 * Phase::QUEEN_PHASE;
+        for side in &board.bitboards {
+            for (p, &bb) in side.iter().enumerate() {
+                phase += bb.count_ones() as i32 * Phase::WEIGHTS[p];
+            }
         }
         phase.min(Phase::TOTAL_PHASE)
     }
 
     pub fn evaluate(&self, color: Color) -> i32 {
+        self.evaluate_with_pawns(color, self.eval_pawn_structure())
+    }
+
+    /// Same as `evaluate`, taking the pawn-structure term from `cache` when
+    /// this pawn configuration has been scored before.
+    pub fn evaluate_cached(&self, color: Color, cache: &mut PawnCache) -> i32 {
+        let white = self.board.bitboards[0][0];
+        let black = self.board.bitboards[1][0];
+        let pawns = cache.get_or_insert(white, black, || self.eval_pawn_structure());
+        self.evaluate_with_pawns(color, pawns)
+    }
+
+    fn evaluate_with_pawns(&self, color: Color, pawns: Score) -> i32 {
         let mut score = Score::ZERO;
 
         score += self.eval_material_and_pst();
 
-        score += self.eval_pawn_structure();
+        score += pawns;
 
         score += self.eval_pieces();
 
@@ -268,11 +370,7 @@ impl<'a> Evaluator<'a> {
 
         let tapered = score.taper(self.phase);
 
-        let final_score = if color == Color::White {
-            tapered + TEMPO_BONUS
-        } else {
-            -tapered + TEMPO_BONUS
-        };
+        let final_score = SIDE_SIGN[color as usize] * tapered + TEMPO_BONUS;
 
         final_score
     }
@@ -280,26 +378,12 @@ impl<'a> Evaluator<'a> {
     fn eval_material_and_pst(&self) -> Score {
         let mut score = Score::ZERO;
 
-        for pt in 0..6 {
-            let mut bb = self.board.bitboards[0][pt];
-            while bb != 0 {
-                let sq = bb.trailing_zeros() as usize;
-                score += Score::new(
-                    MATERIAL_MG[pt] + PST_MG[pt][sq],
-                    MATERIAL_EG[pt] + PST_EG[pt][sq],
-                );
-                bb &= bb - 1;
-            }
-
-            let mut bb = self.board.bitboards[1][pt];
-            while bb != 0 {
-                let sq = bb.trailing_zeros() as usize;
-                let flipped = Square::flip(sq as u8) as usize;
-                score -= Score::new(
-                    MATERIAL_MG[pt] + PST_MG[pt][flipped],
-                    MATERIAL_EG[pt] + PST_EG[pt][flipped],
-                );
-                bb &= bb - 1;
+        for (side, table) in self.board.bitboards.iter().zip(&PSQT) {
+            for (&pieces, psqt) in side.iter().zip(table) {
+                let mut bb = pieces;
+                while bb != 0 {
+                    score += psqt[pop_lsb(&mut bb)];
+                }
             }
         }
 
@@ -323,7 +407,7 @@ impl<'a> Evaluator<'a> {
         let mut pawns = own_pawns;
 
         while pawns != 0 {
-            let sq = pawns.trailing_zeros() as u8;
+            let sq = pop_lsb(&mut pawns) as u8;
             let file = Square::file(sq) as usize;
             let rank = if color == Color::White {
                 Square::rank(sq) as usize
@@ -331,18 +415,12 @@ impl<'a> Evaluator<'a> {
                 7 - Square::rank(sq) as usize
             };
 
-            let file_mask = 0x0101010101010101u64 << file;
-            let pawns_on_file = (own_pawns & file_mask).count_ones();
+            let pawns_on_file = (own_pawns & (FILE_A << file)).count_ones();
             if pawns_on_file > 1 {
                 score -= DOUBLED_PAWN_PENALTY;
             }
 
-            let adjacent_files = match file {
-                0 => 0x0202020202020202u64,
-                7 => 0x4040404040404040u64,
-                _ => (0x0101010101010101u64 << (file - 1)) | (0x0101010101010101u64 << (file + 1)),
-            };
-            if (own_pawns & adjacent_files) == 0 {
+            if (own_pawns & ADJACENT_FILES[file]) == 0 {
                 score -= ISOLATED_PAWN_PENALTY;
             }
 
@@ -358,91 +436,27 @@ impl<'a> Evaluator<'a> {
             if self.is_backward_pawn(sq, color, own_pawns, enemy_pawns) {
                 score -= BACKWARD_PAWN_PENALTY;
             }
-
-            pawns &= pawns - 1;
         }
 
         score
     }
 
+    #[inline(always)]
     fn is_passed_pawn(&self, sq: u8, color: Color, enemy_pawns: u64) -> bool {
-        let file = Square::file(sq) as usize;
-        let rank = Square::rank(sq) as usize;
-
-        let mut mask = 0u64;
-
-        match color {
-            Color::White => {
-                for r in (rank + 1)..8 {
-                    for f in file.saturating_sub(1)..=(file + 1).min(7) {
-                        mask |= 1u64 << (r * 8 + f);
-                    }
-                }
-            }
-            Color::Black => {
-                for r in 0..rank {
-                    for f in file.saturating_sub(1)..=(file + 1).min(7) {
-                        mask |= 1u64 << (r * 8 + f);
-                    }
-                }
-            }
-        }
-
-        (enemy_pawns & mask) == 0
+        (enemy_pawns & PASSED_MASKS[color_idx(color)][sq as usize]) == 0
     }
 
+    #[inline(always)]
     fn has_adjacent_pawn(&self, sq: u8, _color: Color, own_pawns: u64) -> bool {
-        let file = Square::file(sq) as usize;
-        let rank = Square::rank(sq) as usize;
-
-        for f in file.saturating_sub(1)..=(file + 1).min(7) {
-            if f == file {
-                continue;
-            }
-            for r in rank.saturating_sub(1)..=(rank + 1).min(7) {
-                let check_sq = r * 8 + f;
-                if (own_pawns & (1u64 << check_sq)) != 0 {
-                    return true;
-                }
-            }
-        }
-        false
+        (own_pawns & NEIGHBOUR_MASKS[sq as usize]) != 0
     }
 
     fn is_backward_pawn(&self, sq: u8, color: Color, own_pawns: u64, enemy_pawns: u64) -> bool {
         let file = Square::file(sq) as usize;
         let rank = Square::rank(sq) as usize;
 
-        let _support_files = match file {
-            0 => 0x0202020202020202u64,
-            7 => 0x4040404040404040u64,
-            _ => (0x0101010101010101u64 << (file - 1)) | (0x0101010101010101u64 << (file + 1)),
-        };
-
-        let support_mask = match color {
-            Color::White => {
-                let mut m = 0u64;
-                for r in 0..=rank {
-                    for f in file.saturating_sub(1)..=(file + 1).min(7) {
-                        if f != file {
-                            m |= 1u64 << (r * 8 + f);
-                        }
-                    }
-                }
-                m
-            }
-            Color::Black => {
-                let mut m = 0u64;
-                for r in rank..8 {
-                    for f in file.saturating_sub(1)..=(file + 1).min(7) {
-                        if f != file {
-                            m |= 1u64 << (r * 8 + f);
-                        }
-                    }
-                }
-                m
-            }
-        };
+        // Adjacent-file squares level with or behind the pawn.
+        let support_mask = ADJACENT_FILES[file] & !FORWARD_RANKS[color_idx(color)][rank];
 
         if (own_pawns & support_mask) == 0 {
             let advance_sq = match color {
@@ -451,30 +465,10 @@ impl<'a> Evaluator<'a> {
                 _ => None,
             };
 
-            if let Some(_adv) = advance_sq {
-                let enemy_attacks = match color {
-                    Color::White => {
-                        let mut attacks = 0u64;
-                        if file > 0 && rank < 6 {
-                            attacks |= 1u64 << ((rank + 2) * 8 + file - 1);
-                        }
-                        if file < 7 && rank < 6 {
-                            attacks |= 1u64 << ((rank + 2) * 8 + file + 1);
-                        }
-                        attacks
-                    }
-                    Color::Black => {
-                        let mut attacks = 0u64;
-                        if file > 0 && rank > 1 {
-                            attacks |= 1u64 << ((rank - 2) * 8 + file - 1);
-                        }
-                        if file < 7 && rank > 1 {
-                            attacks |= 1u64 << ((rank - 2) * 8 + file + 1);
-                        }
-                        attacks
-                    }
-                };
-                return (enemy_pawns & enemy_attacks) != 0;
+            if let Some(adv) = advance_sq {
+                // Enemy pawns attacking the advance square stand where one
+                // of our pawns on it would attack.
+                return PAWN_ATTACKS[color_idx(color)][adv] & enemy_pawns != 0;
             }
         }
 
@@ -506,10 +500,11 @@ impl<'a> Evaluator<'a> {
         let own_pawns = self.board.bitboards[cidx][0];
         let enemy_pawns = self.board.bitboards[1 - cidx][0];
         let rooks = self.board.bitboards[cidx][3];
+        let seventh = if color == Color::White { 6 } else { 1 };
 
         let mut bb = rooks;
         while bb != 0 {
-            let sq = bb.trailing_zeros() as usize;
+            let sq = pop_lsb(&mut bb);
             let file = sq % 8;
             let rank = sq / 8;
 
@@ -521,12 +516,9 @@ impl<'a> Evaluator<'a> {
                 score += ROOK_SEMI_OPEN_FILE_BONUS;
             }
 
-            let seventh = if color == Color::White { 6 } else { 1 };
             if rank == seventh {
                 score += ROOK_ON_7TH_BONUS;
             }
-
-            bb &= bb - 1;
         }
 
         score
@@ -541,7 +533,7 @@ impl<'a> Evaluator<'a> {
 
         let mut bb = knights;
         while bb != 0 {
-            let sq = bb.trailing_zeros() as usize;
+            let sq = pop_lsb(&mut bb);
             let file = sq % 8;
             let rank = sq / 8;
 
@@ -551,65 +543,17 @@ impl<'a> Evaluator<'a> {
             };
 
             if in_enemy_territory {
-                let supported = match color {
-                    Color::White => {
-                        let support_mask = if file > 0 && rank > 0 {
-                            1u64 << ((rank - 1) * 8 + file - 1)
-                        } else {
-                            0
-                        } | if file < 7 && rank > 0 {
-                            1u64 << ((rank - 1) * 8 + file + 1)
-                        } else {
-                            0
-                        };
-                        (own_pawns & support_mask) != 0
-                    }
-                    Color::Black => {
-                        let support_mask = if file > 0 && rank < 7 {
-                            1u64 << ((rank + 1) * 8 + file - 1)
-                        } else {
-                            0
-                        } | if file < 7 && rank < 7 {
-                            1u64 << ((rank + 1) * 8 + file + 1)
-                        } else {
-                            0
-                        };
-                        (own_pawns & support_mask) != 0
-                    }
-                };
-
-                let adjacent_files = match file {
-                    0 => 0x0202020202020202u64,
-                    7 => 0x4040404040404040u64,
-                    _ => {
-                        (0x0101010101010101u64 << (file - 1))
-                            | (0x0101010101010101u64 << (file + 1))
-                    }
-                };
-
-                let cant_be_attacked = match color {
-                    Color::White => {
-                        let mut attack_mask = 0u64;
-                        for r in (rank + 1)..8 {
-                            attack_mask |= adjacent_files & (0xFFu64 << (r * 8));
-                        }
-                        (enemy_pawns & attack_mask) == 0
-                    }
-                    Color::Black => {
-                        let mut attack_mask = 0u64;
-                        for r in 0..rank {
-                            attack_mask |= adjacent_files & (0xFFu64 << (r * 8));
-                        }
-                        (enemy_pawns & attack_mask) == 0
-                    }
-                };
+                // Our pawns defending the square stand where an enemy pawn
+                // on it would attack.
+                let supported = PAWN_ATTACKS[1 - cidx][sq as usize] & own_pawns != 0;
+
+                let attack_mask = ADJACENT_FILES[file] & FORWARD_RANKS[cidx][rank];
+                let cant_be_attacked = (enemy_pawns & attack_mask) == 0;
 
                 if supported && cant_be_attacked {
                     score += KNIGHT_OUTPOST_BONUS;
                 }
             }
-
-            bb &= bb - 1;
         }
 
         score
@@ -673,15 +617,51 @@ pub fn evaluate(board: &Board, color: Color) -> i32 {
     evaluator.evaluate(color)
 }
 
+#[inline]
+pub fn evaluate_cached(board: &Board, color: Color, cache: &mut PawnCache) -> i32 {
+    let evaluator = Evaluator::new(board);
+    evaluator.evaluate_cached(color, cache)
+}
+
+const PAWN_CACHE_SIZE: usize = 1 << 14;
+
+/// Direct-mapped cache of pawn-structure scores. The pawn term depends only
+/// on the two pawn bitboards, which change on a small fraction of moves, so
+/// most positions in a search share a handful of pawn configurations. Slots
+/// hold the full bitboards, so a hit is never a collision.
+#[derive(Clone)]
+pub struct PawnCache(Box<[(u64, u64, Score)]>);
+
+impl PawnCache {
+    pub fn new() -> Self {
+        Self(vec![(0, 0, Score::ZERO); PAWN_CACHE_SIZE].into_boxed_slice())
+    }
+
+    #[inline]
+    fn get_or_insert(&mut self, white: u64, black: u64, score: impl FnOnce() -> Score) -> Score {
+        let mix =
+            white.wrapping_mul(0x9E37_79B9_7F4A_7C15) ^ black.wrapping_mul(0xC2B2_AE3D_27D4_EB4F);
+        let slot = &mut self.0[(mix >> (64 - PAWN_CACHE_SIZE.trailing_zeros())) as usize];
+        if slot.0 != white || slot.1 != black {
+            *slot = (white, black, score());
+        }
+        slot.2
+    }
+}
+
+impl Default for PawnCache {
+    fn default() -> Self {
+        Self::new()
+    }
+}
+
 #[inline]
 pub fn game_phase(board: &Board) -> i32 {
     Evaluator::calculate_phase(board)
 }
 
 pub fn is_drawn_endgame(board: &Board) -> bool {
-    let white_pieces: u64 = board.bitboards[0].iter().fold(0, |a, b| a | b);
-    let black_pieces: u64 = board.bitboards[1].iter().fold(0, |a, b| a | b);
-    let total = (white_pieces | black_pieces).count_ones();
+    let total = board.occupied().count_ones();
 
     if total <= 2 {
         return true;
@@ -745,6 +725,20 @@ mod tests {
         assert!(score.abs() < 50, "Starting eval: {}", score);
     }
 
+    #[test]
+    fn test_pawn_cache_matches_uncached_eval() {
+        let mut game = Game::new();
+        let mut cache = PawnCache::new();
+        for (from, to) in [("e2", "e4"), ("d7", "d5"), ("e4", "d5"), ("g8", "f6")] {
+            game.make_move(from, to);
+            for color in [Color::White, Color::Black] {
+                let direct = evaluate(&game.board, color);
+                assert_eq!(evaluate_cached(&game.board, color, &mut cache), direct);
+                assert_eq!(evaluate_cached(&game.board, color, &mut cache), direct);
+            }
+        }
+    }
+
     #[test]
     fn test_material_advantage() {
         let mut game = Game::new();
@@ -1,13 +1,50 @@
 use crate::board::Board;
-use crate::pieces::Color;
+use crate::movegen::move_names;
+use crate::pieces::{Color, PieceType};
+use crate::types::{Move, MoveList, Square};
+use std::collections::HashMap;
+use std::hash::{BuildHasherDefault, Hasher};
 
+/// Hasher for maps keyed by Zobrist keys, which are already uniformly
+/// random: the key is used as its own hash instead of running SipHash.
+#[derive(Default)]
+pub struct ZobristHasher(u64);
+
+impl Hasher for ZobristHasher {
+    #[inline]
+    fn finish(&self) -> u64 {
+        self.0
+    }
+
+    #[inline]
+    fn write(&mut self, bytes: &[u8]) {
+        for &b in bytes {
+            self.0 = (self.0 << 8) | b as u64;
+        }
+    }
+
+    #[inline]
+    fn write_u64(&mut self, key: u64) {
+        self.0 = key;
+    }
+}
+
+/// Occurrence count of each position (by Zobrist key) in the game.
+pub type HashCounts = HashMap<u64, usize, BuildHasherDefault<ZobristHasher>>;
+
+#[derive(Clone)]
 pub struct Game {
     pub board: Board,
     pub current_turn: Color,
     pub history: Vec<(String, String)>,
     pub hash_history: Vec<u64>,
-    pub hash_counts: std::collections::HashMap<u64, usize>,
+    pub hash_counts: HashCounts,
     pub result: Option<Color>,
+    /// Legal moves of the last position asked about, packed and keyed by
+    /// its Zobrist key with the side to move folded in. Any change to
+    /// `board` or `current_turn` changes the key, so the entry never goes
+    /// stale.
+    legal_cache: Option<(u64, Vec<Move>)>,
 }
 
 impl Game {
@@ -21,52 +58,90 @@ impl Game {
             history: Vec::new(),
             hash_history: vec![hash],
             hash_counts: {
-                let mut m = std::collections::HashMap::new();
+                let mut m = HashCounts::default();
                 m.insert(hash, 1);
                 m
             },
             result: None,
+            legal_cache: None,
         }
     }
 
+    /// A copy for a search helper thread. The board is a plain copy and the
+    /// repetition history is kept. The move names (never read by the search)
+    /// and the legal move cache are left empty instead of being cloned
+    /// string by string.
+    pub fn search_copy(&self) -> Game {
+        Game {
+            board: self.board,
+            current_turn: self.current_turn,
+            history: Vec::new(),
+            hash_history: self.hash_history.clone(),
+            hash_counts: self.hash_counts.clone(),
+            result: self.result,
+            legal_cache: None,
+        }
+    }
+
+    /// Plays `start` to `end` for the side to move. A promotion piece is
+    /// given as a suffix on `end` (`e8n`), as `legal_moves` and the engine
+    /// spell it; without one a pawn promotes to a queen.
     pub fn make_move(&mut self, start: &str, end: &str) -> bool {
         if start == end {
             return false;
         }
-        if !self.board.is_legal(start, end, self.current_turn) {
+        let (Some(dest), Some(suffix)) = (end.get(..2), end.get(2..)) else {
             return false;
-        }
-        if self.board.make_move_state(start, end).is_some() {
-            self.history.push((start.to_string(), end.to_string()));
-            self.current_turn = if self.current_turn == Color::White {
-                Color::Black
-            } else {
-                Color::White
-            };
-            let h = self.board.hash(self.current_turn);
-            self.hash_history.push(h);
-            *self.hash_counts.entry(h).or_insert(0) += 1;
-            if self
-                .board
-                .all_legal_moves_fast(self.current_turn)
-                .is_empty()
-            {
-                if self.board.in_check(self.current_turn) {
-                    self.result = Some(if self.current_turn == Color::White {
-                        Color::Black
-                    } else {
-                        Color::White
-                    });
-                }
+        };
+        let promotion = match suffix {
+            "" | "q" => PieceType::Queen,
+            "r" => PieceType::Rook,
+            "b" => PieceType::Bishop,
+            "n" => PieceType::Knight,
+            _ => return false,
+        };
+        let (Some(from), Some(to)) = (Square::from_algebraic(start), Square::from_algebraic(dest))
+        else {
+            return false;
+        };
+        // The position's move list is usually cached already (the GUI and
+        // the game-end test below both ask for it), so checking against it
+        // is a scan instead of a fresh legality test.
+        let Some(mv) = self.cached_moves().iter().copied().find(|m| {
+            m.from_sq() == from
+                && m.to_sq() == to
+                && m.promotion_piece().is_none_or(|pt| pt == promotion)
+        }) else {
+            return false;
+        };
+        self.board.make_move_fast(mv, self.current_turn);
+        self.history.push((start.to_string(), end.to_string()));
+        self.current_turn = self.current_turn.opposite();
+        let h = self.board.hash(self.current_turn);
+        self.hash_history.push(h);
+        *self.hash_counts.entry(h).or_insert(0) += 1;
+        if self.cached_moves().is_empty() {
+            if self.board.in_check_fast(self.current_turn) {
+                self.result = Some(self.current_turn.opposite());
             }
-            true
-        } else {
-            false
         }
+        true
     }
 
     pub fn legal_moves(&mut self) -> Vec<(String, String)> {
-        self.board.all_legal_moves_fast(self.current_turn)
+        self.cached_moves().iter().map(|&m| move_names(m)).collect()
+    }
+
+    /// Packed legal moves of the current position, generated at most once
+    /// per position.
+    fn cached_moves(&mut self) -> &[Move] {
+        let key = self.board.hash(self.current_turn);
+        if !matches!(&self.legal_cache, Some((cached, _)) if *cached == key) {
+            let mut list = MoveList::new();
+            self.board.legal_moves_into(self.current_turn, &mut list);
+            self.legal_cache = Some((key, list.as_slice().to_vec()));
+        }
+        self.legal_cache.as_ref().map_or(&[], |(_, moves)| moves)
     }
 
     pub fn repetition_count(&self, hash: u64) -> usize {
@@ -1,5 +1,6 @@
-use crate::board::{Board, color_idx, piece_index};
+use crate::board::{Board, color_idx};
 use crate::pieces::{Color, PieceType};
+use crate::types::{Move, MoveList, SQUARE_NAMES, pop_lsb};
 use once_cell::sync::Lazy;
 
 const DIRS_KNIGHT: &[(isize, isize)] = &[
@@ -23,412 +24,581 @@ const DIRS_KING: &[(isize, isize)] = &[
     (1, 1),
 ];
 
-pub static KNIGHT_TABLE: Lazy<[u64; 64]> = Lazy::new(|| {
+/// Targets of a leaper on each square for the given steps, built at
+/// compile time.
+const fn step_table(dirs: &[(isize, isize)]) -> [u64; 64] {
     let mut arr = [0u64; 64];
-    for y in 0..8 {
-        for x in 0..8 {
-            let mut bb = 0u64;
-            for (dx, dy) in DIRS_KNIGHT {
-                let nx = x as isize + dx;
-                let ny = y as isize + dy;
-                if nx >= 0 && nx < 8 && ny >= 0 && ny < 8 {
-                    bb |= 1u64 << (ny * 8 + nx);
-                }
+    let mut sq = 0;
+    while sq < 64 {
+        let (x, y) = ((sq % 8) as isize, (sq / 8) as isize);
+        let mut i = 0;
+        while i < dirs.len() {
+            let (nx, ny) = (x + dirs[i].0, y + dirs[i].1);
+            if nx >= 0 && nx < 8 && ny >= 0 && ny < 8 {
+                arr[sq] |= 1u64 << (ny * 8 + nx);
             }
-            arr[y * 8 + x] = bb;
+            i += 1;
         }
+        sq += 1;
     }
     arr
-});
+}
 
-pub static KING_TABLE: Lazy<[u64; 64]> = Lazy::new(|| {
-    let mut arr = [0u64; 64];
-    for y in 0..8 {
-        for x in 0..8 {
-            let mut bb = 0u64;
-            for (dx, dy) in DIRS_KING {
-                let nx = x as isize + dx;
-                let ny = y as isize + dy;
-                if nx >= 0 && nx < 8 && ny >= 0 && ny < 8 {
-                    bb |= 1u64 << (ny * 8 + nx);
+// The leaper and pawn tables are plain statics computed at compile time, so
+// lookups in the movegen and attack loops carry no lazy-init check.
+pub static KNIGHT_TABLE: [u64; 64] = step_table(DIRS_KNIGHT);
+
+pub static KING_TABLE: [u64; 64] = step_table(DIRS_KING);
+
+/// Pawn capture targets indexed `[color][square]`, so callers pick the side
+/// with an index rather than a branch on the colour.
+pub static PAWN_ATTACKS: [[u64; 64]; 2] = [
+    step_table(&[(-1, 1), (1, 1)]),
+    step_table(&[(-1, -1), (1, -1)]),
+];
+
+const ROOK_DIRS: [(isize, isize); 4] = [(1, 0), (-1, 0), (0, 1), (0, -1)];
+const BISHOP_DIRS: [(isize, isize); 4] = [(1, 1), (1, -1), (-1, 1), (-1, -1)];
+
+// Multipliers mapping every relevant occupancy of a square to a distinct
+// (or attack-equivalent) slot; found offline by random search.
+#[rustfmt::skip]
+const ROOK_MAGICS: [u64; 64] = [
+    0x1080004008801020, 0x0840092002c03000, 0x1900200010400900, 0x0880100008000480,
+    0x4200100420080200, 0x8100020100080400, 0x0200040110886200, 0x0200008040220411,
+    0x0404800084400220, 0x0000401000402000, 0x0086001081220440, 0x0408800800100280,
+    0x000a001201040820, 0x8848800200840080, 0x4001000100040200, 0x0442000102105084,
+    0x9080010020804100, 0x0040404000201009, 0x0000808010002009, 0x2200090021d00100,
+    0x0008008008040080, 0x0004004002010040, 0x0011040008015042, 0x00000a0001768104,
+    0x0000800080204009, 0x2010004140002001, 0x9800200280100080, 0x1000100080080080,
+    0x0442000a00049020, 0x2100040080020080, 0x0800120400900148, 0x0010040a00128541,
+    0x2800804000800030, 0x1010002000400041, 0x4000200011004100, 0x0610008410800800,
+    0x0400802402800800, 0xc100020080800400, 0x0002000802000401, 0x0182085882000401,
+    0x0220204000808000, 0x2860100040024022, 0x0001002004110040, 0x99101042000a0020,
+    0x0004080004008080, 0x0010040002008080, 0x2012004881020004, 0x8300842444820011,
+    0x0088403882010200, 0x0820400080210100, 0x0110910040a00300, 0x0801100280080480,
+    0x0242009008200600, 0x1002000489500200, 0x0040800200010080, 0x0091800041000080,
+    0x0000209300488001, 0x04c1002414824001, 0x020020000b001041, 0x7000100004200901,
+    0x8002002004100802, 0x30010002084c0007, 0x0888221800813004, 0x4000002840840112,
+];
+
+#[rustfmt::skip]
+const BISHOP_MAGICS: [u64; 64] = [
+    0xa010041108003100, 0x006082020a002900, 0x6810010619200000, 0x08281a0520000408,
+    0x0001104001000400, 0x0018901008048400, 0x00040a0210245280, 0x000200210808a402,
+    0x9140048410821200, 0x0800091010820041, 0x20504804832202c0, 0x0100091401081000,
+    0x8021011140000012, 0x0810020804450400, 0x208b0542109008a2, 0x0080084a08040204,
+    0x0040e2a80811244c, 0x2505022008008108, 0x0430220100420040, 0x010a040420220040,
+    0x1105000290400000, 0x0093001200822120, 0x4000a62048043004, 0x280120048a015004,
+    0x006090002a020814, 0x44042000240800d0, 0x01102800040a4400, 0x1004080080220040,
+    0x0001001011004024, 0x0010044000805040, 0x0914041200820100, 0x0004821012821480,
+    0x0024040500c05021, 0x0088611002080200, 0x0116080a00040020, 0x4000020080080080,
+    0x2450450140840040, 0x0000880201484100, 0x0222020404020092, 0x8081110600002e00,
+    0x2842101105000801, 0x1100809008001025, 0x00020202221c0400, 0x0422014022009020,
+    0x0210046102100c00, 0xc004008082029102, 0x00aa461801101200, 0x0404080080201108,
+    0x020542108c205002, 0x0410544804100100, 0x0040910841100000, 0x0400200042021100,
+    0x00004204850400c0, 0x0200100410a42102, 0x1040020801210102, 0x0805040410420000,
+    0x2884804130100200, 0x800c262201242000, 0x1058000194108800, 0x0014221054420204,
+    0x0104000012a02200, 0x0200881003300100, 0x0140400202840100, 0x0402020801010201,
+];
+
+/// Per-square magic lookup: `attacks[offset + ((occ & mask) * magic) >> shift]`.
+#[derive(Clone, Copy, Default)]
+struct Magic {
+    mask: u64,
+    magic: u64,
+    shift: u32,
+    offset: usize,
+}
+
+struct SliderTable {
+    magics: [Magic; 64],
+    attacks: Vec<u64>,
+}
+
+impl SliderTable {
+    fn new(dirs: &[(isize, isize); 4], magics: &[u64; 64]) -> Self {
+        let mut table = SliderTable {
+            magics: [Magic::default(); 64],
+            attacks: Vec::new(),
+        };
+        for sq in 0..64 {
+            let mask = relevant_mask(sq, dirs);
+            let bits = mask.count_ones();
+            let m = Magic {
+                mask,
+                magic: magics[sq],
+                shift: 64 - bits,
+                offset: table.attacks.len(),
+            };
+            table.attacks.resize(m.offset + (1 << bits), 0);
+            // Enumerate every subset of the mask (carry-rippler).
+            let mut occ = 0u64;
+            loop {
+                let idx = (occ.wrapping_mul(m.magic) >> m.shift) as usize;
+                table.attacks[m.offset + idx] = ray_attacks(sq, occ, dirs);
+                occ = occ.wrapping_sub(mask) & mask;
+                if occ == 0 {
+                    break;
                 }
             }
-            arr[y * 8 + x] = bb;
+            table.magics[sq] = m;
         }
+        table
     }
-    arr
-});
 
-pub static WHITE_PAWN_ATTACKS: Lazy<[u64; 64]> = Lazy::new(|| {
-    let mut arr = [0u64; 64];
-    for y in 0..8 {
-        for x in 0..8 {
-            let mut bb = 0u64;
-            if x > 0 && y < 7 {
-                bb |= 1u64 << ((y + 1) * 8 + (x - 1));
-            }
-            if x < 7 && y < 7 {
-                bb |= 1u64 << ((y + 1) * 8 + (x + 1));
-            }
-            arr[y * 8 + x] = bb;
-        }
+    #[inline(always)]
+    fn attacks(&self, sq: usize, occ: u64) -> u64 {
+        let m = &self.magics[sq];
+        let idx = ((occ & m.mask).wrapping_mul(m.magic) >> m.shift) as usize;
+        self.attacks[m.offset + idx]
     }
-    arr
-});
+}
 
-pub static BLACK_PAWN_ATTACKS: Lazy<[u64; 64]> = Lazy::new(|| {
-    let mut arr = [0u64; 64];
-    for y in 0..8 {
-        for x in 0..8 {
-            let mut bb = 0u64;
-            if x > 0 && y > 0 {
-                bb |= 1u64 << ((y - 1) * 8 + (x - 1));
-            }
-            if x < 7 && y > 0 {
-                bb |= 1u64 << ((y - 1) * 8 + (x + 1));
-            }
-            arr[y * 8 + x] = bb;
-        }
-    }
-    arr
-});
+static ROOK_TABLE: Lazy<SliderTable> = Lazy::new(|| SliderTable::new(&ROOK_DIRS, &ROOK_MAGICS));
+static BISHOP_TABLE: Lazy<SliderTable> =
+    Lazy::new(|| SliderTable::new(&BISHOP_DIRS, &BISHOP_MAGICS));
 
-fn rook_attacks(sq: usize, occ: u64) -> u64 {
+/// Squares a slider on `sq` sees along `dirs`, stopping at the first
+/// occupied square. Only used to fill the magic tables.
+fn ray_attacks(sq: usize, occ: u64, dirs: &[(isize, isize); 4]) -> u64 {
     let x = (sq % 8) as isize;
     let y = (sq / 8) as isize;
     let mut attacks = 0u64;
-    let mut ny = y + 1;
-    while ny < 8 {
-        let idx = (ny * 8 + x) as usize;
-        attacks |= 1u64 << idx;
-        if (occ & (1u64 << idx)) != 0 {
-            break;
-        }
-        ny += 1;
-    }
-    ny = y - 1;
-    while ny >= 0 {
-        let idx = (ny * 8 + x) as usize;
-        attacks |= 1u64 << idx;
-        if (occ & (1u64 << idx)) != 0 {
-            break;
-        }
-        if ny == 0 {
-            break;
-        }
-        ny -= 1;
-    }
-    let mut nx = x + 1;
-    while nx < 8 {
-        let idx = (y * 8 + nx) as usize;
-        attacks |= 1u64 << idx;
-        if (occ & (1u64 << idx)) != 0 {
-            break;
-        }
-        nx += 1;
-    }
-    nx = x - 1;
-    while nx >= 0 {
-        let idx = (y * 8 + nx) as usize;
-        attacks |= 1u64 << idx;
-        if (occ & (1u64 << idx)) != 0 {
-            break;
-        }
-        if nx == 0 {
-            break;
+    for (dx, dy) in dirs {
+        let mut nx = x + dx;
+        let mut ny = y + dy;
+        while (0..8).contains(&nx) && (0..8).contains(&ny) {
+            let bit = 1u64 << (ny * 8 + nx);
+            attacks |= bit;
+            if occ & bit != 0 {
+                break;
+            }
+            nx += dx;
+            ny += dy;
         }
-        nx -= 1;
     }
     attacks
 }
 
-fn bishop_attacks(sq: usize, occ: u64) -> u64 {
+/// Squares whose occupancy can change the attacks from `sq`: each ray minus
+/// its final (edge) square.
+fn relevant_mask(sq: usize, dirs: &[(isize, isize); 4]) -> u64 {
     let x = (sq % 8) as isize;
     let y = (sq / 8) as isize;
-    let mut attacks = 0u64;
-    let mut nx = x + 1;
-    let mut ny = y + 1;
-    while nx < 8 && ny < 8 {
-        let idx = (ny * 8 + nx) as usize;
-        attacks |= 1u64 << idx;
-        if (occ & (1u64 << idx)) != 0 {
-            break;
-        }
-        nx += 1;
-        ny += 1;
-    }
-    nx = x - 1;
-    ny = y + 1;
-    while nx >= 0 && ny < 8 {
-        let idx = (ny * 8 + nx) as usize;
-        attacks |= 1u64 << idx;
-        if (occ & (1u64 << idx)) != 0 {
-            break;
-        }
-        if nx == 0 {
-            break;
-        }
-        nx -= 1;
-        ny += 1;
-    }
-    nx = x + 1;
-    ny = y - 1;
-    while nx < 8 && ny >= 0 {
-        let idx = (ny * 8 + nx) as usize;
-        attacks |= 1u64 << idx;
-        if (occ & (1u64 << idx)) != 0 {
-            break;
-        }
-        if ny == 0 {
-            break;
-        }
-        nx += 1;
-        ny -= 1;
-    }
-    nx = x - 1;
-    ny = y - 1;
-    while nx >= 0 && ny >= 0 {
-        let idx = (ny * 8 + nx) as usize;
-        attacks |= 1u64 << idx;
-        if (occ & (1u64 << idx)) != 0 {
-            break;
-        }
-        if nx == 0 || ny == 0 {
-            attacks |= 0;
-        };
-        nx -= 1;
-        ny -= 1;
-        if nx < 0 || ny < 0 {
-            break;
+    let mut mask = 0u64;
+    for (dx, dy) in dirs {
+        let mut nx = x + dx;
+        let mut ny = y + dy;
+        while (0..8).contains(&(nx + dx)) && (0..8).contains(&(ny + dy)) {
+            mask |= 1u64 << (ny * 8 + nx);
+            nx += dx;
+            ny += dy;
         }
     }
-    attacks
+    mask
+}
+
+#[inline(always)]
+pub fn rook_attacks(sq: usize, occ: u64) -> u64 {
+    ROOK_TABLE.attacks(sq, occ)
+}
+
+#[inline(always)]
+pub fn bishop_attacks(sq: usize, occ: u64) -> u64 {
+    BISHOP_TABLE.attacks(sq, occ)
 }
 
-fn pawn_moves(
+const RANK_3: u64 = 0x0000_0000_00FF_0000;
+const RANK_6: u64 = 0x0000_FF00_0000_0000;
+const FILE_A: u64 = 0x0101_0101_0101_0101;
+const FILE_H: u64 = FILE_A << 7;
+const PROMOTION_RANKS: u64 = 0xFF00_0000_0000_00FF;
+
+/// Pushes and captures of a `US` pawn on `sq`; the colour is a const
+/// parameter so each side gets its own branch-free copy. A double push is
+/// a single push that lands on the third rank and can go one further.
+#[inline(always)]
+pub(crate) fn pawn_moves<const US: usize>(
     sq: usize,
-    color: Color,
     occ: u64,
     opp_occ: u64,
     en_passant: Option<(usize, usize)>,
 ) -> u64 {
-    let x = sq % 8;
-    let y = sq / 8;
-    let mut moves = 0u64;
-    match color {
-        Color::White => {
-            if y < 7 && (occ & (1u64 << ((y + 1) * 8 + x))) == 0 {
-                moves |= 1u64 << ((y + 1) * 8 + x);
-                if y == 1 && (occ & (1u64 << ((y + 2) * 8 + x))) == 0 {
-                    moves |= 1u64 << ((y + 2) * 8 + x);
-                }
-            }
-            if x > 0 && y < 7 && (opp_occ & (1u64 << ((y + 1) * 8 + x - 1))) != 0 {
-                moves |= 1u64 << ((y + 1) * 8 + x - 1);
-            }
-            if x < 7 && y < 7 && (opp_occ & (1u64 << ((y + 1) * 8 + x + 1))) != 0 {
-                moves |= 1u64 << ((y + 1) * 8 + x + 1);
-            }
-            if let Some((ex, ey)) = en_passant {
-                if ey == y + 1 && ((ex == x + 1) || (ex + 1 == x)) {
-                    moves |= 1u64 << (ey * 8 + ex);
-                }
-            }
+    let ep = en_passant.map_or(0, |(ex, ey)| 1u64 << (ey * 8 + ex));
+    let captures = PAWN_ATTACKS[US][sq] & (opp_occ | ep);
+    let bit = 1u64 << sq;
+    let pushes = if US == 0 {
+        let one = (bit << 8) & !occ;
+        one | (((one & RANK_3) << 8) & !occ)
+    } else {
+        let one = (bit >> 8) & !occ;
+        one | (((one & RANK_6) >> 8) & !occ)
+    };
+    captures | pushes
+}
+
+pub fn generate_moves(board: &Board, color: Color) -> Vec<(String, String)> {
+    generate_moves_to(board, color, !0)
+}
+
+/// Legal moves of `color` landing on `mask`, named for the string APIs.
+/// Promotions carry their piece letter on the destination (`e8q`).
+pub fn generate_moves_to(board: &Board, color: Color, mask: u64) -> Vec<(String, String)> {
+    let mut list = MoveList::new();
+    generate_moves_fast(board, color, &mut list);
+    list.iter()
+        .filter(|m| mask & (1u64 << m.to_sq()) != 0)
+        .map(|&m| move_names(m))
+        .collect()
+}
+
+/// The from/to names of `mv` as the string APIs spell them, with the
+/// promotion piece appended to the destination.
+pub fn move_names(mv: Move) -> (String, String) {
+    let from = SQUARE_NAMES[mv.from_sq() as usize].to_string();
+    let mut to = SQUARE_NAMES[mv.to_sq() as usize].to_string();
+    if let Some(pt) = mv.promotion_piece() {
+        to.push(match pt {
+            PieceType::Rook => 'r',
+            PieceType::Bishop => 'b',
+            PieceType::Knight => 'n',
+            _ => 'q',
+        });
+    }
+    (from, to)
+}
+
+/// Squares strictly between `a` and `b` when they share a rank, file or
+/// diagonal; empty otherwise.
+#[inline]
+fn between(a: usize, b: usize) -> u64 {
+    let (abit, bbit) = (1u64 << a, 1u64 << b);
+    if rook_attacks(a, 0) & bbit != 0 {
+        rook_attacks(a, bbit) & rook_attacks(b, abit)
+    } else if bishop_attacks(a, 0) & bbit != 0 {
+        bishop_attacks(a, bbit) & bishop_attacks(b, abit)
+    } else {
+        0
+    }
+}
+
+/// Check and pin state of the side to move, computed once per generation so
+/// each pseudo-legal move is vetted with a couple of mask tests instead of
+/// being played out.
+struct Legality {
+    /// Squares a non-king move must land on: everything when not in check,
+    /// the checker or a blocking square in single check, nothing in double.
+    evasion: u64,
+    pinned: u64,
+    /// Squares the king may not step onto: everything the enemy attacks,
+    /// with the king lifted off the board so it cannot hide in its own
+    /// shadow. Computed once instead of per king destination.
+    danger: u64,
+    /// For each pinned piece, the squares it may move to along its pin.
+    pin_ray: [u64; 64],
+}
+
+impl Legality {
+    fn new(board: &Board, color: Color) -> Self {
+        let cidx = color_idx(color);
+        let mut info = Legality {
+            evasion: !0,
+            pinned: 0,
+            danger: 0,
+            pin_ray: [0; 64],
+        };
+        let king_bb = board.bitboards[cidx][5];
+        if king_bb == 0 {
+            return info;
         }
-        Color::Black => {
-            if y > 0 && (occ & (1u64 << ((y - 1) * 8 + x))) == 0 {
-                moves |= 1u64 << ((y - 1) * 8 + x);
-                if y == 6 && (occ & (1u64 << ((y - 2) * 8 + x))) == 0 {
-                    moves |= 1u64 << ((y - 2) * 8 + x);
-                }
-            }
-            if x > 0 && y > 0 && (opp_occ & (1u64 << ((y - 1) * 8 + x - 1))) != 0 {
-                moves |= 1u64 << ((y - 1) * 8 + x - 1);
-            }
-            if x < 7 && y > 0 && (opp_occ & (1u64 << ((y - 1) * 8 + x + 1))) != 0 {
-                moves |= 1u64 << ((y - 1) * 8 + x + 1);
-            }
-            if let Some((ex, ey)) = en_passant {
-                if ey + 1 == y && ((ex == x + 1) || (ex + 1 == x)) {
-                    moves |= 1u64 << (ey * 8 + ex);
-                }
+        let ksq = king_bb.trailing_zeros() as usize;
+        let enemy = &board.bitboards[1 - cidx];
+        let occ = board.occupied();
+        info.danger = board.attacked_by(color.opposite(), occ ^ king_bb);
+
+        let checkers = board.checkers(color);
+        if checkers.count_ones() > 1 {
+            info.evasion = 0;
+        } else if checkers != 0 {
+            info.evasion = checkers | between(ksq, checkers.trailing_zeros() as usize);
+        }
+
+        let mut snipers = (rook_attacks(ksq, 0) & (enemy[3] | enemy[4]))
+            | (bishop_attacks(ksq, 0) & (enemy[2] | enemy[4]));
+        while snipers != 0 {
+            let s = pop_lsb(&mut snipers);
+            let ray = between(ksq, s);
+            let blockers = ray & occ;
+            if blockers.count_ones() == 1 && blockers & board.occupancy[cidx] != 0 {
+                info.pinned |= blockers;
+                info.pin_ray[blockers.trailing_zeros() as usize] = ray | (1u64 << s);
             }
         }
+        info
+    }
+
+    /// Squares a non-king piece on `from` may move to without exposing the
+    /// king: the evasion squares, narrowed to its pin ray when pinned.
+    /// Applied to a whole target set at once, so individual moves need no
+    /// further test.
+    #[inline(always)]
+    fn targets(&self, from: usize) -> u64 {
+        if self.pinned & (1u64 << from) != 0 {
+            self.evasion & self.pin_ray[from]
+        } else {
+            self.evasion
+        }
     }
-    moves
 }
 
-pub fn generate_moves(board: &mut Board, color: Color) -> Vec<(String, String)> {
-    let mut list = crate::types::MoveList::new();
-    generate_moves_fast(board, color, &mut list);
+pub fn generate_moves_fast(board: &Board, color: Color, list: &mut MoveList) {
+    match color {
+        Color::White => generate_moves_for::<0>(board, !0, list),
+        Color::Black => generate_moves_for::<1>(board, !0, list),
+    }
+}
 
-    let mut res = Vec::new();
-    for i in 0..list.len() {
-        let m = list.get(i).unwrap();
-        let f_str =
-            Board::index_to_algebraic((m.from_sq() % 8) as usize, (m.from_sq() / 8) as usize)
-                .unwrap();
-        let mut t_str =
-            Board::index_to_algebraic((m.to_sq() % 8) as usize, (m.to_sq() / 8) as usize).unwrap();
-
-        if m.is_promotion() {
-            if let Some(pt) = m.promotion_piece() {
-                let c = match pt {
-                    PieceType::Queen => 'q',
-                    PieceType::Rook => 'r',
-                    PieceType::Bishop => 'b',
-                    PieceType::Knight => 'n',
-                    _ => 'q',
-                };
-                t_str.push(c);
-            }
-        }
-        res.push((f_str, t_str));
+/// Legal captures of `color`, en passant and capturing promotions included,
+/// in the order `generate_moves_fast` would list them. Quiet moves are
+/// never generated, rather than generated and filtered out.
+pub fn generate_captures_fast(board: &Board, color: Color, list: &mut MoveList) {
+    let enemy = board.occupancy[1 - color_idx(color)];
+    match color {
+        Color::White => generate_moves_for::<0>(board, enemy, list),
+        Color::Black => generate_moves_for::<1>(board, enemy, list),
     }
-    res
 }
 
-pub fn generate_moves_fast(board: &mut Board, color: Color, list: &mut crate::types::MoveList) {
-    let cidx = color_idx(color);
-    let opp_color = if color == Color::White {
-        Color::Black
-    } else {
-        Color::White
-    };
-    let occ_self: u64 = board.bitboards[cidx].iter().fold(0u64, |a, &b| a | b);
-    let occ_opp: u64 = board.bitboards[1 - cidx].iter().fold(0u64, |a, &b| a | b);
+/// Legal move generation monomorphised on the side to move (`US` is the
+/// colour index), so every colour test below folds away at compile time.
+/// Each piece type has its own generator, in the order pawns, knights,
+/// bishops, rooks, queens, king. Only moves landing on `mask` are produced;
+/// en passant counts as landing on the pawn it takes.
+fn generate_moves_for<const US: usize>(board: &Board, mask: u64, list: &mut MoveList) {
+    let color = if US == 0 { Color::White } else { Color::Black };
+    let occ_self = board.occupancy[US];
+    let occ_opp = board.occupancy[1 - US];
     let occ_all = occ_self | occ_opp;
+    let allowed = !occ_self & mask;
+    let legality = Legality::new(board, color);
+    let own = board.bitboards[US];
 
-    for pt in [
-        PieceType::Pawn,
-        PieceType::Knight,
-        PieceType::Bishop,
-        PieceType::Rook,
-        PieceType::Queen,
-        PieceType::King,
-    ] {
-        let mut bb = board.bitboards[cidx][piece_index(pt)];
-        while bb != 0 {
-            let sq = bb.trailing_zeros() as usize;
-            let from = sq as u8;
-            let mut targets;
-
-            match pt {
-                PieceType::Pawn => {
-                    targets = pawn_moves(sq, color, occ_all, occ_opp, board.en_passant)
-                }
-                PieceType::Knight => targets = KNIGHT_TABLE[sq],
-                PieceType::Bishop => targets = bishop_attacks(sq, occ_all),
-                PieceType::Rook => targets = rook_attacks(sq, occ_all),
-                PieceType::Queen => {
-                    targets = bishop_attacks(sq, occ_all) | rook_attacks(sq, occ_all)
-                }
-                PieceType::King => {
-                    targets = KING_TABLE[sq];
-                    let rank = if color == Color::White { 0 } else { 7 };
-                    if sq == rank * 8 + 4 {
-                        if board.castling[cidx][0]
-                            && board.get_index(5, rank).is_none()
-                            && board.get_index(6, rank).is_none()
-                            && !board.is_square_attacked_by(sq as u8, opp_color) // King not in check
-                            && !board.is_square_attacked_by((rank*8+5) as u8, opp_color)
-                        {
-                            targets |= 1u64 << (rank * 8 + 6);
-                        }
-                        if board.castling[cidx][1]
-                            && board.get_index(1, rank).is_none()
-                            && board.get_index(2, rank).is_none()
-                            && board.get_index(3, rank).is_none()
-                            && !board.is_square_attacked_by(sq as u8, opp_color)
-                            && !board.is_square_attacked_by((rank * 8 + 3) as u8, opp_color)
-                        {
-                            targets |= 1u64 << (rank * 8 + 2);
-                        }
-                    }
-                }
-            }
-            targets &= !occ_self;
-
-            while targets != 0 {
-                let to_sq = targets.trailing_zeros() as usize;
-                let to = to_sq as u8;
+    pawn_moves_into::<US>(board, mask, &legality, list);
 
-                let is_capture = (occ_opp & (1u64 << to_sq)) != 0
-                    || (pt == PieceType::Pawn && (to_sq as isize - sq as isize).abs() % 8 != 0); // Diag pawn move
+    let mut knights = own[1];
+    while knights != 0 {
+        let sq = pop_lsb(&mut knights);
+        piece_moves_into(sq, KNIGHT_TABLE[sq] & allowed, occ_opp, &legality, list);
+    }
+    let mut bishops = own[2];
+    while bishops != 0 {
+        let sq = pop_lsb(&mut bishops);
+        let targets = bishop_attacks(sq, occ_all) & allowed;
+        piece_moves_into(sq, targets, occ_opp, &legality, list);
+    }
+    let mut rooks = own[3];
+    while rooks != 0 {
+        let sq = pop_lsb(&mut rooks);
+        let targets = rook_attacks(sq, occ_all) & allowed;
+        piece_moves_into(sq, targets, occ_opp, &legality, list);
+    }
+    let mut queens = own[4];
+    while queens != 0 {
+        let sq = pop_lsb(&mut queens);
+        let targets = (bishop_attacks(sq, occ_all) | rook_attacks(sq, occ_all)) & allowed;
+        piece_moves_into(sq, targets, occ_opp, &legality, list);
+    }
 
-                let mut flags = crate::types::Move::FLAG_NORMAL;
-                if is_capture {
-                    flags = crate::types::Move::FLAG_CAPTURE;
-                }
+    king_moves_into::<US>(board, mask, &legality, list);
+}
 
-                if pt == PieceType::Pawn {
-                    let dy = (to_sq as isize - sq as isize).abs();
-                    if dy == 16 {
-                        flags = crate::types::Move::FLAG_DOUBLE_PUSH;
-                    }
-                    if dy % 8 != 0 && (occ_opp & (1u64 << to_sq)) == 0 {
-                        flags = crate::types::Move::FLAG_EP_CAPTURE;
-                    }
-
-                    let rank_to = to_sq / 8;
-                    if rank_to == 0 || rank_to == 7 {
-                        let next_is_capture = (occ_opp & (1u64 << to_sq)) != 0;
-
-                        let f_s = Board::index_to_algebraic(sq % 8, sq / 8).unwrap();
-                        let t_s = Board::index_to_algebraic(to_sq % 8, to_sq / 8).unwrap();
-
-                        if board.is_legal(&f_s, &t_s, color) {
-                            list.push(crate::types::Move::promotion(
-                                from,
-                                to,
-                                PieceType::Queen,
-                                next_is_capture,
-                            ));
-                            list.push(crate::types::Move::promotion(
-                                from,
-                                to,
-                                PieceType::Rook,
-                                next_is_capture,
-                            ));
-                            list.push(crate::types::Move::promotion(
-                                from,
-                                to,
-                                PieceType::Bishop,
-                                next_is_capture,
-                            ));
-                            list.push(crate::types::Move::promotion(
-                                from,
-                                to,
-                                PieceType::Knight,
-                                next_is_capture,
-                            ));
-                        }
-
-                        targets &= targets - 1;
-                        continue; // Skip normal push (already handled all 4 promos)
-                    }
-                }
+/// Moves of a knight or slider on `sq` to `targets` (own squares already
+/// removed) that keep the king safe.
+#[inline(always)]
+fn piece_moves_into(
+    sq: usize,
+    targets: u64,
+    occ_opp: u64,
+    legality: &Legality,
+    list: &mut MoveList,
+) {
+    let mut targets = targets & legality.targets(sq);
+    while targets != 0 {
+        let to = pop_lsb(&mut targets);
+        let flags = if occ_opp & (1u64 << to) != 0 {
+            Move::FLAG_CAPTURE
+        } else {
+            Move::FLAG_NORMAL
+        };
+        list.push(Move::new(sq as u8, to as u8, flags));
+    }
+}
 
-                if pt == PieceType::King && (to_sq as isize - sq as isize).abs() == 2 {
-                    if to_sq > sq {
-                        flags = crate::types::Move::FLAG_KING_CASTLE;
-                    } else {
-                        flags = crate::types::Move::FLAG_QUEEN_CASTLE;
-                    }
-                }
+/// Pawn moves for `US`, generated setwise: each kind of move (single push,
+/// double push, capture towards either side) is one shift of the whole pawn
+/// bitboard, and each target's origin is a fixed offset behind it.
+#[inline(always)]
+fn pawn_moves_into<const US: usize>(
+    board: &Board,
+    mask: u64,
+    legality: &Legality,
+    list: &mut MoveList,
+) {
+    let them = if US == 0 { Color::Black } else { Color::White };
+    let occ_opp = board.occupancy[1 - US];
+    let occ_all = board.occupancy[US] | occ_opp;
+    let pawns = board.bitboards[US][0];
+    let ep = board.en_passant.map_or(0, |(ex, ey)| 1u64 << (ey * 8 + ex));
+
+    let single = forward::<US>(pawns, 8) & !occ_all;
+    let double = forward::<US>(single & if US == 0 { RANK_3 } else { RANK_6 }, 8) & !occ_all;
+    // Towards the h-file is +9 for White and -7 for Black, and vice versa.
+    let (east, west) = if US == 0 { (9, 7) } else { (7, 9) };
+    let east_caps = forward::<US>(pawns & !FILE_H, east);
+    let west_caps = forward::<US>(pawns & !FILE_A, west);
+
+    pawn_targets_into::<US>(single & mask, 8, Move::FLAG_NORMAL, legality, list);
+    pawn_targets_into::<US>(double & mask, 16, Move::FLAG_DOUBLE_PUSH, legality, list);
+    pawn_targets_into::<US>(
+        east_caps & occ_opp & mask,
+        east,
+        Move::FLAG_CAPTURE,
+        legality,
+        list,
+    );
+    pawn_targets_into::<US>(
+        west_caps & occ_opp & mask,
+        west,
+        Move::FLAG_CAPTURE,
+        legality,
+        list,
+    );
+
+    for (targets, back) in [(east_caps & ep, east), (west_caps & ep, west)] {
+        if targets == 0 {
+            continue;
+        }
+        let to = targets.trailing_zeros() as usize;
+        let from = behind::<US>(to, back);
+        // En passant empties two squares on one rank, which the pin masks
+        // cannot see; look at the king with both gone.
+        let captured = 1u64 << ((from & !7) | (to & 7));
+        if captured & mask == 0 {
+            continue;
+        }
+        let occ_after = occ_all ^ (1u64 << from) ^ targets ^ captured;
+        let king = board.bitboards[US][5];
+        let safe = king == 0 || {
+            let ksq = king.trailing_zeros() as u8;
+            board.attackers_to_with(ksq, them, occ_after) & !captured == 0
+        };
+        if safe {
+            list.push(Move::new(from as u8, to as u8, Move::FLAG_EP_CAPTURE));
+        }
+    }
+}
 
-                let mv = crate::types::Move::new(from, to, flags);
+#[inline(always)]
+fn forward<const US: usize>(bb: u64, by: u32) -> u64 {
+    if US == 0 { bb << by } else { bb >> by }
+}
 
-                let f_s = Board::index_to_algebraic(sq % 8, sq / 8).unwrap();
-                let t_s = Board::index_to_algebraic(to_sq % 8, to_sq / 8).unwrap();
+#[inline(always)]
+fn behind<const US: usize>(sq: usize, by: u32) -> usize {
+    if US == 0 {
+        sq - by as usize
+    } else {
+        sq + by as usize
+    }
+}
 
-                if board.is_legal(&f_s, &t_s, color) {
-                    list.push(mv);
-                }
+/// Pushes one pawn move per bit of `targets`, each from `back` squares
+/// behind it; moves onto the last rank become the four promotions.
+#[inline(always)]
+fn pawn_targets_into<const US: usize>(
+    targets: u64,
+    back: u32,
+    flags: u16,
+    legality: &Legality,
+    list: &mut MoveList,
+) {
+    // Evasions filter the whole set; only pinned pawns need a look of their own.
+    let mut targets = targets & legality.evasion;
+    while targets != 0 {
+        let to = pop_lsb(&mut targets);
+        let from = behind::<US>(to, back);
+        if legality.pinned & (1u64 << from) != 0 && legality.pin_ray[from] & (1u64 << to) == 0 {
+            continue;
+        }
+        if (1u64 << to) & PROMOTION_RANKS != 0 {
+            let capture = flags == Move::FLAG_CAPTURE;
+            for promo in [
+                PieceType::Queen,
+                PieceType::Rook,
+                PieceType::Bishop,
+                PieceType::Knight,
+            ] {
+                list.push(Move::promotion(from as u8, to as u8, promo, capture));
+            }
+        } else {
+            list.push(Move::new(from as u8, to as u8, flags));
+        }
+    }
+}
 
-                targets &= targets - 1;
+/// King steps and castling for `US`. Destinations are filtered against the
+/// enemy attack map, so nothing here needs a further legality test.
+#[inline(always)]
+fn king_moves_into<const US: usize>(
+    board: &Board,
+    mask: u64,
+    legality: &Legality,
+    list: &mut MoveList,
+) {
+    let color = if US == 0 { Color::White } else { Color::Black };
+    let occ_self = board.occupancy[US];
+    let occ_opp = board.occupancy[1 - US];
+    let occ_all = occ_self | occ_opp;
+    let rooks = board.bitboards[US][3];
+    let mut kings = board.bitboards[US][5];
+    while kings != 0 {
+        let sq = pop_lsb(&mut kings);
+        let mut targets = KING_TABLE[sq];
+        let back_rank = if US == 0 { 0 } else { 56 };
+        if sq == back_rank + 4 {
+            // Start, transit and destination squares must all be safe; a
+            // ray through the king's own square would already make the start
+            // square unsafe.
+            if board.can_castle(color, 0)
+                && rooks & (1u64 << (back_rank + 7)) != 0
+                && occ_all & (0x60u64 << back_rank) == 0
+                && legality.danger & (0x70u64 << back_rank) == 0
+            {
+                targets |= 1u64 << (back_rank + 6);
             }
-            bb &= bb - 1;
+            if board.can_castle(color, 1)
+                && rooks & (1u64 << back_rank) != 0
+                && occ_all & (0x0Eu64 << back_rank) == 0
+                && legality.danger & (0x1Cu64 << back_rank) == 0
+            {
+                targets |= 1u64 << (back_rank + 2);
+            }
+        }
+        targets &= !legality.danger & !occ_self & mask;
+
+        while targets != 0 {
+            let to = pop_lsb(&mut targets);
+            let flags = if to == sq + 2 {
+                Move::FLAG_KING_CASTLE
+            } else if to + 2 == sq {
+                Move::FLAG_QUEEN_CASTLE
+            } else if occ_opp & (1u64 << to) != 0 {
+                Move::FLAG_CAPTURE
+            } else {
+                Move::FLAG_NORMAL
+            };
+            list.push(Move::new(sq as u8, to as u8, flags));
         }
     }
 }
@@ -444,6 +614,21 @@ mod tests {
         board
     }
 
+    #[test]
+    fn test_magic_attacks_match_rays() {
+        let mut seed: u64 = 0x1234_5678_9abc_def0;
+        for _ in 0..2000 {
+            seed ^= seed << 13;
+            seed ^= seed >> 7;
+            seed ^= seed << 17;
+            let occ = seed & (seed >> 3);
+            for sq in 0..64 {
+                assert_eq!(rook_attacks(sq, occ), ray_attacks(sq, occ, &ROOK_DIRS));
+                assert_eq!(bishop_attacks(sq, occ), ray_attacks(sq, occ, &BISHOP_DIRS));
+            }
+        }
+    }
+
     #[test]
     fn test_starting_position_white_moves() {
         let mut board = setup_board();
@@ -883,6 +1068,96 @@ mod tests {
         assert!(ep_count >= 1, "Should have at least 1 en passant move");
     }
 
+    #[test]
+    fn test_captures_match_filtered_moves() {
+        let mut seed: u64 = 0x2545_f491_4f6c_dd1d;
+        for _ in 0..20 {
+            let mut board = setup_board();
+            let mut color = Color::White;
+            for _ in 0..120 {
+                let mut all = MoveList::new();
+                generate_moves_fast(&board, color, &mut all);
+                let mut captures = MoveList::new();
+                generate_captures_fast(&board, color, &mut captures);
+                let mut expected = all.clone();
+                expected.retain(|m| m.is_capture());
+                assert_eq!(captures.as_slice(), expected.as_slice());
+
+                if all.is_empty() {
+                    break;
+                }
+                seed ^= seed << 13;
+                seed ^= seed >> 7;
+                seed ^= seed << 17;
+                board.make_move_fast(all[(seed % all.len() as u64) as usize], color);
+                color = color.opposite();
+            }
+        }
+    }
+
+    #[test]
+    fn test_pins_checks_and_en_passant_discovery() {
+        let place = |board: &mut Board, sq: &str, piece_type: PieceType, color: Color| {
+            board.set(sq, Some(crate::pieces::Piece { piece_type, color }));
+        };
+        let moves = |board: &mut Board, color: Color| {
+            let mut list = MoveList::new();
+            generate_moves_fast(board, color, &mut list);
+            let mut v: Vec<(u8, u8)> = list.iter().map(|m| (m.from_sq(), m.to_sq())).collect();
+            v.sort();
+            v
+        };
+
+        // The d2 knight is pinned by the b4 bishop; the e2 rook may only
+        // slide along the e-file it is pinned on.
+        let mut board = Board::new();
+        place(&mut board, "e1", PieceType::King, Color::White);
+        place(&mut board, "d2", PieceType::Knight, Color::White);
+        place(&mut board, "e2", PieceType::Rook, Color::White);
+        place(&mut board, "b4", PieceType::Bishop, Color::Black);
+        place(&mut board, "e8", PieceType::Rook, Color::Black);
+        place(&mut board, "a8", PieceType::King, Color::Black);
+        let generated = moves(&mut board, Color::White);
+        assert!(generated.iter().all(|&(f, _)| f != 11));
+        assert!(
+            generated
+                .iter()
+                .filter(|&&(f, _)| f == 12)
+                .all(|&(_, t)| t % 8 == 4)
+        );
+        assert_eq!(generated.len(), board.all_legal_moves(Color::White).len());
+
+        // bxc6 e.p. would empty the fifth rank between the a5 king and the
+        // h5 rook.
+        let mut board = Board::new();
+        place(&mut board, "a5", PieceType::King, Color::White);
+        place(&mut board, "b5", PieceType::Pawn, Color::White);
+        place(&mut board, "c5", PieceType::Pawn, Color::Black);
+        place(&mut board, "h5", PieceType::Rook, Color::Black);
+        place(&mut board, "h8", PieceType::King, Color::Black);
+        board.en_passant = Some((2, 5));
+        let generated = moves(&mut board, Color::White);
+        assert!(generated.iter().all(|&(f, t)| !(f == 33 && t == 42)));
+        // Ka4, Ka6, Kb6 and b6; b4 is covered by the c5 pawn.
+        assert_eq!(generated.len(), 4);
+
+        // In check from the e8 rook, only king moves, the block on e2 and
+        // no rook move off the file survive.
+        let mut board = Board::new();
+        place(&mut board, "e1", PieceType::King, Color::White);
+        place(&mut board, "a2", PieceType::Rook, Color::White);
+        place(&mut board, "e8", PieceType::Rook, Color::Black);
+        place(&mut board, "a8", PieceType::King, Color::Black);
+        let generated = moves(&mut board, Color::White);
+        assert!(
+            generated
+                .iter()
+                .filter(|&&(f, _)| f == 8)
+                .all(|&(_, t)| t == 12)
+        );
+        assert_eq!(generated.len(), board.all_legal_moves(Color::White).len());
+    }
+
     #[test]
     fn test_knight_table() {
         let attacks = KNIGHT_TABLE[28];
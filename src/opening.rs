@@ -1,5 +1,9 @@
 use crate::board::Board;
+use crate::game::{Game, ZobristHasher};
 use crate::pieces::Color;
+use once_cell::sync::Lazy;
+use std::collections::HashMap;
+use std::hash::BuildHasherDefault;
 
 const BOOK_LINES: &[&[&str]] = &[
     &[
@@ -25,36 +29,37 @@ const BOOK_LINES: &[&[&str]] = &[
     ],
 ];
 
-pub fn book_move(
-    history: &[(String, String)],
-    board: &Board,
-    color: Color,
-) -> Option<(String, String)> {
-    let played: Vec<String> = history.iter().map(|(s, e)| format!("{}{}", s, e)).collect();
-
-    'outer: for line in BOOK_LINES {
-        if played.len() >= line.len() {
-            continue;
-        }
-
-        for (idx, mv) in played.iter().enumerate() {
-            if mv != line[idx] {
-                continue 'outer;
+/// The book as a map from position (Zobrist key with the side to move
+/// folded in) to the move to play there, built once by replaying every line.
+/// Keying by position lets transpositions into a line hit the book and keeps
+/// games set up from a FEN out of it. Where lines share a position the first
+/// one wins; a line stops at its first move that is not legal.
+static BOOK: Lazy<HashMap<u64, (&str, &str), BuildHasherDefault<ZobristHasher>>> =
+    Lazy::new(|| {
+        let mut book = HashMap::default();
+        for line in BOOK_LINES {
+            let mut game = Game::new();
+            for mv in line.iter() {
+                let (s, e) = mv.split_at(2);
+                let key = game.board.hash(game.current_turn);
+                if !game.make_move(s, e) {
+                    break;
+                }
+                book.entry(key).or_insert((s, e));
             }
         }
+        book
+    });
 
-        let next = line[played.len()];
-        if next.len() != 4 {
-            continue;
-        }
-        let (s, e) = next.split_at(2);
-        let mut board_copy = board.clone();
-        if board_copy.is_legal(s, e, color) {
-            return Some((s.to_string(), e.to_string()));
-        }
+pub fn book_move(board: &Board, color: Color) -> Option<(String, String)> {
+    let &(s, e) = BOOK.get(&board.hash(color))?;
+    // Guards against a key collision with a position outside the book.
+    let mut board_copy = *board;
+    if board_copy.is_legal(s, e, color) {
+        Some((s.to_string(), e.to_string()))
+    } else {
+        None
     }
-
-    None
 }
 
 #[cfg(test)]
@@ -65,7 +70,7 @@ mod tests {
     #[test]
     fn suggests_first_white_move() {
         let game = Game::new();
-        let mv = book_move(&game.history, &game.board, game.current_turn);
+        let mv = book_move(&game.board, game.current_turn);
         assert_eq!(mv, Some(("e2".into(), "e4".into())));
     }
 
@@ -73,7 +78,31 @@ mod tests {
     fn suggests_reply_for_black() {
         let mut game = Game::new();
         assert!(game.make_move("e2", "e4"));
-        let mv = book_move(&game.history, &game.board, game.current_turn);
+        let mv = book_move(&game.board, game.current_turn);
         assert_eq!(mv, Some(("e7".into(), "e5".into())));
     }
+
+    #[test]
+    fn follows_transposition_into_line() {
+        // Bc4 before Nf3 reaches the Italian position after 3.Bc4.
+        let mut game = Game::new();
+        for (s, e) in [
+            ("e2", "e4"),
+            ("e7", "e5"),
+            ("f1", "c4"),
+            ("b8", "c6"),
+            ("g1", "f3"),
+        ] {
+            assert!(game.make_move(s, e));
+        }
+        let mv = book_move(&game.board, game.current_turn);
+        assert_eq!(mv, Some(("f8".into(), "c5".into())));
+    }
+
+    #[test]
+    fn leaves_positions_outside_book() {
+        let mut game = Game::new();
+        assert!(game.make_move("a2", "a3"));
+        assert_eq!(book_move(&game.board, game.current_turn), None);
+    }
 }
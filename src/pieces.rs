@@ -1,17 +1,43 @@
 #[derive(Clone, Copy, PartialEq, Eq, Debug)]
+#[repr(u8)]
 pub enum Color {
-    White,
-    Black,
+    White = 0,
+    Black = 1,
 }
 
+impl Color {
+    #[inline(always)]
+    pub const fn opposite(self) -> Color {
+        match self {
+            Color::White => Color::Black,
+            Color::Black => Color::White,
+        }
+    }
+}
+
+/// The discriminant is the piece's index into per-type tables and the
+/// `bitboards` array, so `pt as usize` needs no lookup.
 #[derive(Clone, Copy, PartialEq, Eq, Debug)]
+#[repr(u8)]
 pub enum PieceType {
-    Pawn,
-    Knight,
-    Bishop,
-    Rook,
-    Queen,
-    King,
+    Pawn = 0,
+    Knight = 1,
+    Bishop = 2,
+    Rook = 3,
+    Queen = 4,
+    King = 5,
+}
+
+impl PieceType {
+    /// Every type, in index order.
+    pub const ALL: [PieceType; 6] = [
+        PieceType::Pawn,
+        PieceType::Knight,
+        PieceType::Bishop,
+        PieceType::Rook,
+        PieceType::Queen,
+        PieceType::King,
+    ];
 }
 
 #[derive(Clone, Copy, Debug)]
@@ -19,3 +45,9 @@ pub struct Piece {
     pub piece_type: PieceType,
     pub color: Color,
 }
+
+// A piece is a plain two-byte value stored inline (its square is implied by
+// where it sits), and `Option<Piece>` packs `None` into a spare
+// discriminant. Keep it that way: board reads copy these in hot loops.
+const _: () = assert!(std::mem::size_of::<Piece>() == 2);
+const _: () = assert!(std::mem::size_of::<Option<Piece>>() == 2);
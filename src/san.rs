@@ -1,70 +1,96 @@
 use crate::{
     game::Game,
     pieces::{Color, PieceType},
+    types::{SQUARE_NAMES, Square},
 };
-use regex::Regex;
 
+/// Piece named by a SAN piece letter.
+fn piece_letter(c: u8) -> Option<PieceType> {
+    match c {
+        b'N' => Some(PieceType::Knight),
+        b'B' => Some(PieceType::Bishop),
+        b'R' => Some(PieceType::Rook),
+        b'Q' => Some(PieceType::Queen),
+        b'K' => Some(PieceType::King),
+        _ => None,
+    }
+}
+
+/// File (`a`-`h`) or rank (`1`-`8`) index of a byte, from its `base`.
+fn coordinate(c: Option<&u8>, base: u8) -> Option<u8> {
+    c.map(|c| c.wrapping_sub(base)).filter(|&v| v < 8)
+}
+
+/// `O-O` (`len` 3) or `O-O-O` (`len` 5), also spelled with `0` or `o`.
+fn is_castle(san: &[u8], len: usize) -> bool {
+    san.len() == len
+        && san.iter().enumerate().all(|(i, &c)| {
+            if i % 2 == 1 {
+                c == b'-'
+            } else {
+                matches!(c, b'O' | b'o' | b'0')
+            }
+        })
+}
+
+/// Resolves `san` to the from/to squares of a legal move for `color`;
+/// a promotion piece is appended to the destination (`e8=N` gives `e8n`).
+/// The move is read in one pass over its bytes: promotion and destination
+/// from the end, then an optional piece letter and disambiguating file and
+/// rank from the front. The source comes from `Board::legal_sources`.
 pub fn parse_san(game: &mut Game, san: &str, color: Color) -> Option<(String, String)> {
-    let mut san = san.replace("0", "O");
-    san = san.trim_end_matches(|c| c == '+' || c == '#').to_string();
-    let upper = san.to_uppercase();
-    if upper == "O-O" {
-        let start = if color == Color::White { "e1" } else { "e8" };
-        let end = if color == Color::White { "g1" } else { "g8" };
-        return Some((start.into(), end.into()));
+    let mut san = san.trim_end_matches(['+', '#']).as_bytes();
+    let back_rank = if color == Color::White { "1" } else { "8" };
+    if is_castle(san, 3) {
+        return Some((format!("e{back_rank}"), format!("g{back_rank}")));
     }
-    if upper == "O-O-O" {
-        let start = if color == Color::White { "e1" } else { "e8" };
-        let end = if color == Color::White { "c1" } else { "c8" };
-        return Some((start.into(), end.into()));
+    if is_castle(san, 5) {
+        return Some((format!("e{back_rank}"), format!("c{back_rank}")));
     }
-    let re = Regex::new(r"^([NBRQK])?([a-h])?([1-8])?[x-]?([a-h][1-8])(=?[NBRQK])?$").ok()?;
-    let caps = re.captures(&san)?;
-    let mut piece_letter = caps.get(1).map(|m| m.as_str());
-    let mut dfile = caps.get(2).map(|m| m.as_str());
-    let drank = caps.get(3).map(|m| m.as_str());
-    let dest = caps.get(4)?.as_str();
-    if let Some(pl) = piece_letter {
-        if pl.chars().all(|c| c.is_ascii_lowercase()) && "abcdefgh".contains(pl) && dfile.is_none()
-        {
-            dfile = Some(pl);
-            piece_letter = None;
+
+    let mut promotion = None;
+    if let [rest @ .., last] = san {
+        if piece_letter(*last).is_some() {
+            promotion = Some(last.to_ascii_lowercase() as char);
+            san = rest.strip_suffix(b"=").unwrap_or(rest);
         }
     }
-    let ptype = match piece_letter {
-        Some("N") => PieceType::Knight,
-        Some("B") => PieceType::Bishop,
-        Some("R") => PieceType::Rook,
-        Some("Q") => PieceType::Queen,
-        Some("K") => PieceType::King,
-        None => PieceType::Pawn,
-        _ => return None,
+    let [rest @ .., file, rank] = san else {
+        return None;
     };
-    let moves = game.board.all_legal_moves(color);
-    let mut candidates = Vec::new();
-    for (start, end) in moves {
-        if end != dest {
-            continue;
-        }
-        if let Some(piece) = game.board.get(&start) {
-            if piece.piece_type != ptype {
-                continue;
-            }
-            if let Some(df) = dfile {
-                if &start[0..1] != df {
-                    continue;
-                }
-            }
-            if let Some(dr) = drank {
-                if &start[1..2] != dr {
-                    continue;
-                }
-            }
-            candidates.push(start);
+    let dest = coordinate(Some(rank), b'1')? * 8 + coordinate(Some(file), b'a')?;
+    let prefix = rest
+        .strip_suffix(b"x")
+        .or_else(|| rest.strip_suffix(b"-"))
+        .unwrap_or(rest);
+
+    let mut i = 0;
+    let ptype = match prefix.first().and_then(|&c| piece_letter(c)) {
+        Some(pt) => {
+            i += 1;
+            pt
         }
+        None => PieceType::Pawn,
+    };
+    let mut mask = !0u64;
+    if let Some(f) = coordinate(prefix.get(i), b'a') {
+        mask &= 0x0101_0101_0101_0101u64 << f;
+        i += 1;
+    }
+    if let Some(r) = coordinate(prefix.get(i), b'1') {
+        mask &= 0xFFu64 << (8 * r);
+        i += 1;
+    }
+    if i != prefix.len() {
+        return None;
     }
-    if candidates.len() == 1 {
-        Some((candidates.remove(0), dest.to_string()))
+
+    let sources = game.board.legal_sources(dest, ptype, color) & mask;
+    if sources.count_ones() == 1 {
+        let start = SQUARE_NAMES[sources.trailing_zeros() as usize];
+        let mut end = Square::name(dest).to_string();
+        end.extend(promotion);
+        Some((start.to_string(), end))
     } else {
         None
     }
@@ -90,4 +116,48 @@ mod tests {
         let mv = parse_san(&mut game, "Qd3", Color::White).unwrap();
         assert_eq!(mv, ("d1".to_string(), "d3".to_string()));
     }
+
+    #[test]
+    fn pawn_push_and_capture() {
+        let mut game = Game::new();
+        let mv = parse_san(&mut game, "e4", Color::White).unwrap();
+        assert_eq!(mv, ("e2".to_string(), "e4".to_string()));
+        game.make_move("e2", "e4");
+        game.make_move("d7", "d5");
+        let mv = parse_san(&mut game, "exd5", Color::White).unwrap();
+        assert_eq!(mv, ("e4".to_string(), "d5".to_string()));
+    }
+
+    #[test]
+    fn disambiguation() {
+        let mut game = Game::new();
+        game.make_move("d2", "d4");
+        game.make_move("d7", "d5");
+        game.make_move("g1", "f3");
+        game.make_move("g8", "f6");
+        assert_eq!(parse_san(&mut game, "Nd2", Color::White), None);
+        let mv = parse_san(&mut game, "Nbd2", Color::White).unwrap();
+        assert_eq!(mv, ("b1".to_string(), "d2".to_string()));
+    }
+
+    #[test]
+    fn underpromotion() {
+        use crate::board::Board;
+        use crate::pieces::Piece;
+
+        let mut game = Game::new();
+        game.board = Board::new();
+        for (sq, piece_type, color) in [
+            ("e1", PieceType::King, Color::White),
+            ("a7", PieceType::Pawn, Color::White),
+            ("e8", PieceType::King, Color::Black),
+        ] {
+            game.board.set(sq, Some(Piece { piece_type, color }));
+        }
+        let mv = parse_san(&mut game, "a8=N", Color::White).unwrap();
+        assert_eq!(mv, ("a7".to_string(), "a8n".to_string()));
+        assert!(game.make_move(&mv.0, &mv.1));
+        let promoted = game.board.get("a8").unwrap();
+        assert!(promoted.piece_type == PieceType::Knight && promoted.color == Color::White);
+    }
 }
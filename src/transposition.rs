@@ -1,9 +1,9 @@
-use once_cell::sync::Lazy;
 use std::sync::Arc;
-use std::sync::atomic::{AtomicI32, AtomicU8, AtomicU64, Ordering};
+use std::sync::atomic::{AtomicU8, AtomicU64, Ordering};
 
 use crate::board::Board;
 use crate::pieces::Color;
+use crate::types::{Move, pop_lsb};
 
 #[derive(Clone, Copy)]
 pub enum Bound {
@@ -17,27 +17,65 @@ pub struct TTEntry {
     pub depth: u32,
     pub value: i32,
     pub bound: Bound,
-    pub best: Option<(u8, u8)>,
+    pub best: Option<Move>,
 }
 
-struct RawEntry {
-    key: AtomicU64,
-    value: AtomicI32,
-    packed: AtomicU64,
+/// One table slot: a single word packing the key's top 16 bits with the
+/// whole entry. Loads and stores are one atomic access, so readers racing
+/// a writer can never see a torn entry and no lock is needed.
+type RawEntry = AtomicU64;
+
+// layout: key (16) | value (16) | depth (8) | age (6) | bound (2) | move (16)
+const KEY_SHIFT: u32 = 48;
+const VALUE_SHIFT: u32 = 32;
+const DEPTH_SHIFT: u32 = 24;
+const AGE_SHIFT: u32 = 18;
+const AGE_MASK: u8 = 0x3F;
+const BOUND_SHIFT: u32 = 16;
+
+#[inline(always)]
+fn key_check(key: u64) -> u64 {
+    key >> KEY_SHIFT
 }
 
-impl Default for RawEntry {
-    fn default() -> Self {
-        Self {
-            key: AtomicU64::new(0),
-            value: AtomicI32::new(0),
-            packed: AtomicU64::new(0),
-        }
-    }
+#[inline(always)]
+fn pack(key: u64, entry: &TTEntry, age: u8) -> u64 {
+    let bound = match entry.bound {
+        Bound::Exact => 0u64,
+        Bound::Lower => 1,
+        Bound::Upper => 2,
+    };
+    let mv = entry.best.unwrap_or(Move::NONE).0 as u64;
+    let value = entry.value.clamp(i16::MIN as i32, i16::MAX as i32) as i16;
+    (key_check(key) << KEY_SHIFT)
+        | ((value as u16 as u64) << VALUE_SHIFT)
+        | ((entry.depth.min(255) as u64) << DEPTH_SHIFT)
+        | (((age & AGE_MASK) as u64) << AGE_SHIFT)
+        | (bound << BOUND_SHIFT)
+        | mv
+}
+
+#[inline(always)]
+fn unpack_depth(data: u64) -> u32 {
+    ((data >> DEPTH_SHIFT) & 0xFF) as u32
 }
 
+#[inline(always)]
+fn unpack_age(data: u64) -> u8 {
+    ((data >> AGE_SHIFT) as u8) & AGE_MASK
+}
+
+const BUCKET_SIZE: usize = 8;
+
+/// Eight slots sharing one cache line: a probe costs a single line fill and a
+/// store can pick the least useful of eight entries instead of clobbering one.
+#[derive(Default)]
+#[repr(align(64))]
+struct Bucket([RawEntry; BUCKET_SIZE]);
+
 struct Inner {
-    entries: Vec<RawEntry>,
+    buckets: Vec<Bucket>,
+    mask: usize,
     age: AtomicU8,
 }
 
@@ -45,15 +83,26 @@ struct Inner {
 pub struct Table(Arc<Inner>);
 
 impl Table {
+    /// Creates a table with `size` slots rounded down to a power of two (and
+    /// at least one bucket), so indexing is a mask instead of a division and
+    /// never exceeds the budget.
     pub fn new(size: usize) -> Self {
-        let mut entries = Vec::with_capacity(size);
-        entries.resize_with(size, RawEntry::default);
+        let size = 1usize << (usize::BITS - 1 - size.max(1).leading_zeros());
+        let count = (size / BUCKET_SIZE).max(1);
+        let mut buckets = Vec::with_capacity(count);
+        buckets.resize_with(count, Bucket::default);
         Self(Arc::new(Inner {
-            entries,
+            buckets,
+            mask: count - 1,
             age: AtomicU8::new(0),
         }))
     }
 
+    #[inline(always)]
+    fn bucket(&self, key: u64) -> &Bucket {
+        &self.0.buckets[(key as usize) & self.0.mask]
+    }
+
     fn current_age(&self) -> u8 {
         self.0.age.load(Ordering::Relaxed)
     }
@@ -63,110 +112,272 @@ impl Table {
         self.0.age.store(age, Ordering::Relaxed);
     }
 
-    pub fn get(&self, key: u64) -> Option<TTEntry> {
-        let idx = (key as usize) % self.0.entries.len();
-        let entry = &self.0.entries[idx];
-        if entry.key.load(Ordering::Acquire) == key {
-            let value = entry.value.load(Ordering::Relaxed);
-            let packed = entry.packed.load(Ordering::Relaxed);
-            let depth = (packed >> 32) as u32;
-            let bound = match ((packed >> 16) & 0xFF) as u8 {
-                1 => Bound::Lower,
-                2 => Bound::Upper,
-                _ => Bound::Exact,
-            };
-            let from = ((packed >> 8) & 0xFF) as u8;
-            let to = (packed & 0xFF) as u8;
-            let best = if from == 0xFF { None } else { Some((from, to)) };
-            Some(TTEntry {
-                depth,
-                value,
-                bound,
-                best,
-            })
-        } else {
-            None
+    /// Hints the CPU to start loading the bucket for `key`, so a probe issued
+    /// shortly afterwards (typically by the child node) finds it in cache.
+    #[inline(always)]
+    pub fn prefetch(&self, key: u64) {
+        #[cfg(target_arch = "x86_64")]
+        unsafe {
+            use std::arch::x86_64::{_MM_HINT_T0, _mm_prefetch};
+            _mm_prefetch::<_MM_HINT_T0>(self.bucket(key) as *const Bucket as *const i8);
         }
+        #[cfg(not(target_arch = "x86_64"))]
+        let _ = key;
+    }
+
+    pub fn get(&self, key: u64) -> Option<TTEntry> {
+        let check = key_check(key);
+        let data = self.bucket(key).0.iter().find_map(|slot| {
+            let data = slot.load(Ordering::Relaxed);
+            (data >> KEY_SHIFT == check && data != 0).then_some(data)
+        })?;
+        let bound = match (data >> BOUND_SHIFT) & 3 {
+            1 => Bound::Lower,
+            2 => Bound::Upper,
+            _ => Bound::Exact,
+        };
+        let mv = Move(data as u16);
+        let best = if mv.is_valid() { Some(mv) } else { None };
+        Some(TTEntry {
+            depth: unpack_depth(data),
+            value: (data >> VALUE_SHIFT) as u16 as i16 as i32,
+            bound,
+            best,
+        })
     }
 
     pub fn store(&self, key: u64, entry: TTEntry) {
-        let idx = (key as usize) % self.0.entries.len();
-        let slot = &self.0.entries[idx];
-        let age = self.current_age();
-        let packed_new = ((entry.depth as u64) << 32)
-            | ((age as u64) << 24)
-            | (((match entry.bound {
-                Bound::Exact => 0,
-                Bound::Lower => 1,
-                Bound::Upper => 2,
-            }) as u64)
-                << 16)
-            | ((entry.best.map(|b| b.0).unwrap_or(0xFF) as u64) << 8)
-            | (entry.best.map(|b| b.1).unwrap_or(0xFF) as u64);
-
-        let existing_key = slot.key.load(Ordering::Acquire);
-        if existing_key != key {
-            let existing = slot.packed.load(Ordering::Relaxed);
-            let existing_depth = (existing >> 32) as u32;
-            let existing_age = ((existing >> 24) & 0xFF) as u8;
-            if entry.depth >= existing_depth || age.wrapping_sub(existing_age) > 5 {
-                slot.key.store(key, Ordering::Release);
-                slot.value.store(entry.value, Ordering::Relaxed);
-                slot.packed.store(packed_new, Ordering::Relaxed);
+        let bucket = self.bucket(key);
+        let age = self.current_age() & AGE_MASK;
+        let mut data_new = pack(key, &entry, age);
+        let check = key_check(key);
+
+        // Reuse the slot already holding this position; otherwise evict the
+        // shallowest entry, counting each search of age as eight plies.
+        let mut victim = &bucket.0[0];
+        let mut victim_worth = i32::MAX;
+        for slot in &bucket.0 {
+            let existing = slot.load(Ordering::Relaxed);
+            if existing >> KEY_SHIFT == check && existing != 0 {
+                // Fail-low nodes have no best move of their own; keep the
+                // previous one as an ordering hint for the next visit.
+                if entry.best.is_none() {
+                    data_new |= existing & 0xFFFF;
+                }
+                if entry.depth < unpack_depth(existing) && unpack_age(existing) == age {
+                    return;
+                }
+                victim = slot;
+                break;
             }
-        } else {
-            let existing = slot.packed.load(Ordering::Relaxed);
-            let existing_depth = (existing >> 32) as u32;
-            if entry.depth >= existing_depth {
-                slot.value.store(entry.value, Ordering::Relaxed);
-                slot.packed.store(packed_new, Ordering::Relaxed);
+            let stale = (age.wrapping_sub(unpack_age(existing)) & AGE_MASK) as i32;
+            let worth = unpack_depth(existing) as i32 - 8 * stale;
+            if worth < victim_worth {
+                victim = slot;
+                victim_worth = worth;
             }
         }
+        victim.store(data_new, Ordering::Relaxed);
     }
 }
 
-pub static ZOBRIST: Lazy<[[[u64; 64]; 6]; 2]> = Lazy::new(|| {
-    let mut arr = [[[0u64; 64]; 6]; 2];
+/// Piece-square keys, flattened to `[(color * 6 + piece) * 64 + square]` and
+/// generated at compile time so a lookup is a single load with no lazy
+/// initialisation check.
+pub static ZOBRIST: [u64; 768] = {
+    let mut arr = [0u64; 768];
     let mut seed: u64 = 0xcbf29ce484222325;
-    for c in 0..2 {
-        for p in 0..6 {
-            for s in 0..64 {
-                seed ^= seed >> 12;
-                seed ^= seed << 25;
-                seed ^= seed >> 27;
-                seed = seed.wrapping_mul(0x2545F4914F6CDD1D);
-                arr[c][p][s] = seed;
+    let mut i = 0;
+    while i < 768 {
+        seed ^= seed >> 12;
+        seed ^= seed << 25;
+        seed ^= seed >> 27;
+        seed = seed.wrapping_mul(0x2545F4914F6CDD1D);
+        arr[i] = seed;
+        i += 1;
+    }
+    arr
+};
+
+#[inline(always)]
+pub fn zobrist_key(color_idx: usize, piece_idx: usize, sq: usize) -> u64 {
+    ZOBRIST[(color_idx * 6 + piece_idx) * 64 + sq]
+}
+
+/// Side-to-move keys indexed by colour; black's entry is zero so hashing the
+/// side is an unconditional XOR.
+pub static ZOBRIST_SIDE: [u64; 2] = [0x9d39247e33776d41, 0];
+
+/// Keys for the castling-rights mask (bit 0 = white king-side, bit 1 = white
+/// queen-side, bit 2 = black king-side, bit 3 = black queen-side). Entry `m`
+/// is the XOR of the keys of every right set in `m`, so a whole change of
+/// rights is a single lookup.
+pub static ZOBRIST_CASTLING: [u64; 16] = {
+    let mut rights = [0u64; 4];
+    let mut seed: u64 = 0x84222325cbf29ce4;
+    let mut i = 0;
+    while i < 4 {
+        seed ^= seed >> 12;
+        seed ^= seed << 25;
+        seed ^= seed >> 27;
+        seed = seed.wrapping_mul(0x2545F4914F6CDD1D);
+        rights[i] = seed;
+        i += 1;
+    }
+    let mut arr = [0u64; 16];
+    let mut mask = 0;
+    while mask < 16 {
+        let mut bit = 0;
+        while bit < 4 {
+            if mask & (1 << bit) != 0 {
+                arr[mask] ^= rights[bit];
             }
+            bit += 1;
         }
+        mask += 1;
     }
     arr
-});
+};
 
-pub static ZOBRIST_SIDE: Lazy<u64> = Lazy::new(|| 0x9d39247e33776d41);
+/// Keys for the file of the en-passant target square.
+pub static ZOBRIST_EP: [u64; 8] = {
+    let mut arr = [0u64; 8];
+    let mut seed: u64 = 0x6d41_9d39_247e_3377;
+    let mut i = 0;
+    while i < 8 {
+        seed ^= seed >> 12;
+        seed ^= seed << 25;
+        seed ^= seed >> 27;
+        seed = seed.wrapping_mul(0x2545F4914F6CDD1D);
+        arr[i] = seed;
+        i += 1;
+    }
+    arr
+};
 
 impl Board {
     pub fn hash(&self, side: Color) -> u64 {
-        if side == Color::White {
-            self.hash ^ *ZOBRIST_SIDE
-        } else {
-            self.hash
-        }
+        self.hash ^ ZOBRIST_SIDE[side as usize]
     }
 
     pub fn recompute_hash(&mut self) {
         let mut h = 0u64;
         for c in 0..2 {
             for p in 0..6 {
+                let offset = (c * 6 + p) * 64;
                 let mut bb = self.bitboards[c][p];
                 while bb != 0 {
-                    let sq = bb.trailing_zeros() as usize;
-                    h ^= ZOBRIST[c][p][sq];
-                    bb &= bb - 1;
+                    h ^= ZOBRIST[offset + pop_lsb(&mut bb)];
                 }
             }
         }
-        self.hash = h;
+        self.hash = h ^ self.state_key();
     }
 }
 
 pub const TABLE_SIZE: usize = 4_194_304;
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    #[test]
+    fn store_and_probe_round_trip() {
+        let table = Table::new(1024);
+        let key = 0x1234_5678_9abc_def0;
+        table.store(
+            key,
+            TTEntry {
+                depth: 7,
+                value: -321,
+                bound: Bound::Upper,
+                best: Some(Move::new(12, 28, Move::FLAG_DOUBLE_PUSH)),
+            },
+        );
+        let entry = table.get(key).unwrap();
+        assert_eq!(entry.depth, 7);
+        assert_eq!(entry.value, -321);
+        assert!(matches!(entry.bound, Bound::Upper));
+        assert_eq!(entry.best, Some(Move::new(12, 28, Move::FLAG_DOUBLE_PUSH)));
+        assert!(table.get(key ^ (1 << 60)).is_none());
+    }
+
+    #[test]
+    fn size_is_rounded_down_to_power_of_two() {
+        assert_eq!(Table::new(1000).0.buckets.len() * BUCKET_SIZE, 512);
+        assert_eq!(Table::new(1024).0.buckets.len() * BUCKET_SIZE, 1024);
+        assert_eq!(Table::new(0).0.buckets.len(), 1);
+    }
+
+    #[test]
+    fn full_bucket_evicts_shallowest_entry() {
+        let table = Table::new(1024);
+        // Same bucket, different positions: only the checked top bits differ.
+        let key = |i: u64| 5 | (i << KEY_SHIFT);
+        let entry = |depth| TTEntry {
+            depth,
+            value: 1,
+            bound: Bound::Exact,
+            best: None,
+        };
+        let depths = [9, 2, 7, 5, 8, 6, 4, 3];
+        for (i, depth) in depths.into_iter().enumerate() {
+            table.store(key(i as u64 + 1), entry(depth));
+        }
+        table.store(key(9), entry(1));
+        assert!(table.get(key(2)).is_none());
+        for i in [1, 3, 4, 5, 6, 7, 8, 9] {
+            assert!(table.get(key(i)).is_some());
+        }
+
+        // After a new search starts, old entries lose to fresh shallow ones.
+        table.next_age();
+        table.store(key(10), entry(1));
+        assert!(table.get(key(10)).is_some());
+    }
+
+    #[test]
+    fn values_round_trip_through_sixteen_bits() {
+        let table = Table::new(64);
+        for value in [-10000, -1, 0, 1, 10000] {
+            table.store(
+                42,
+                TTEntry {
+                    depth: 1,
+                    value,
+                    bound: Bound::Exact,
+                    best: None,
+                },
+            );
+            assert_eq!(table.get(42).unwrap().value, value);
+        }
+    }
+
+    #[test]
+    fn store_without_move_keeps_previous_move() {
+        let table = Table::new(1024);
+        let key = 0x0fed_cba9_8765_4321;
+        let mv = Move::new(6, 21, Move::FLAG_NORMAL);
+        table.store(
+            key,
+            TTEntry {
+                depth: 2,
+                value: 15,
+                bound: Bound::Lower,
+                best: Some(mv),
+            },
+        );
+        table.store(
+            key,
+            TTEntry {
+                depth: 3,
+                value: -40,
+                bound: Bound::Upper,
+                best: None,
+            },
+        );
+        let entry = table.get(key).unwrap();
+        assert_eq!(entry.depth, 3);
+        assert_eq!(entry.best, Some(mv));
+    }
+}
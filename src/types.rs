@@ -112,14 +112,9 @@ impl Move {
     }
 
     pub fn to_algebraic(self) -> String {
-        let from = self.from_sq();
-        let to = self.to_sq();
-        let from_file = (b'a' + (from % 8)) as char;
-        let from_rank = (b'1' + (from / 8)) as char;
-        let to_file = (b'a' + (to % 8)) as char;
-        let to_rank = (b'1' + (to / 8)) as char;
-
-        let mut s = format!("{}{}{}{}", from_file, from_rank, to_file, to_rank);
+        let mut s = String::with_capacity(5);
+        s.push_str(SQUARE_NAMES[self.from_sq() as usize]);
+        s.push_str(SQUARE_NAMES[self.to_sq() as usize]);
 
         if let Some(promo) = self.promotion_piece() {
             let c = match promo {
@@ -232,6 +227,19 @@ impl MoveList {
         self.count = 0;
     }
 
+    /// Keeps only the moves matching `keep`, compacting them in place.
+    #[inline]
+    pub fn retain(&mut self, mut keep: impl FnMut(&Move) -> bool) {
+        let mut kept = 0;
+        for i in 0..self.count {
+            if keep(&self.moves[i]) {
+                self.moves[kept] = self.moves[i];
+                kept += 1;
+            }
+        }
+        self.count = kept;
+    }
+
     #[inline(always)]
     pub fn swap(&mut self, i: usize, j: usize) {
         self.moves.swap(i, j);
@@ -285,14 +293,7 @@ impl PieceValues {
 
     #[inline(always)]
     pub const fn value(pt: PieceType) -> i32 {
-        match pt {
-            PieceType::Pawn => Self::PAWN,
-            PieceType::Knight => Self::KNIGHT,
-            PieceType::Bishop => Self::BISHOP,
-            PieceType::Rook => Self::ROOK,
-            PieceType::Queen => Self::QUEEN,
-            PieceType::King => Self::KING,
-        }
+        Self::VALUES[pt as usize]
     }
 
     #[inline(always)]
@@ -301,15 +302,18 @@ impl PieceValues {
     }
 }
 
-pub static MVV_LVA: [[i32; 6]; 6] = {
-    let mut table = [[0i32; 6]; 6];
+/// MVV-LVA scores flattened to `[victim << 3 | attacker]`. Index 6 stands for
+/// "no piece" (see `Board::piece_type_idx_at`) and scores 0, so callers can
+/// index straight from the board without range checks.
+pub static MVV_LVA: [i32; 64] = {
+    let mut table = [0i32; 64];
     let values = [100, 320, 330, 500, 900, 20000]; // Pawn, Knight, Bishop, Rook, Queen, King
 
     let mut victim = 0;
     while victim < 6 {
         let mut attacker = 0;
         while attacker < 6 {
-            table[victim][attacker] = values[victim] * 10 - values[attacker];
+            table[(victim << 3) | attacker] = values[victim] * 10 - values[attacker];
             attacker += 1;
         }
         victim += 1;
@@ -319,7 +323,7 @@ pub static MVV_LVA: [[i32; 6]; 6] = {
 
 #[inline(always)]
 pub const fn mvv_lva_score(victim_idx: usize, attacker_idx: usize) -> i32 {
-    MVV_LVA[victim_idx][attacker_idx]
+    MVV_LVA[(victim_idx << 3) | attacker_idx]
 }
 
 pub struct Phase;
@@ -374,6 +378,21 @@ impl UndoState {
     }
 }
 
+pub const SQUARE_NAMES: [&str; 64] = [
+    "a1", "b1", "c1", "d1", "e1", "f1", "g1", "h1", "a2", "b2", "c2", "d2", "e2", "f2", "g2", "h2",
+    "a3", "b3", "c3", "d3", "e3", "f3", "g3", "h3", "a4", "b4", "c4", "d4", "e4", "f4", "g4", "h4",
+    "a5", "b5", "c5", "d5", "e5", "f5", "g5", "h5", "a6", "b6", "c6", "d6", "e6", "f6", "g6", "h6",
+    "a7", "b7", "c7", "d7", "e7", "f7", "g7", "h7", "a8", "b8", "c8", "d8", "e8", "f8", "g8", "h8",
+];
+
+/// Index of the lowest set bit of `bb`, clearing it. `bb` must be non-zero.
+#[inline(always)]
+pub fn pop_lsb(bb: &mut u64) -> usize {
+    let sq = bb.trailing_zeros() as usize;
+    *bb &= *bb - 1;
+    sq
+}
+
 pub struct Square;
 
 impl Square {
@@ -397,10 +416,13 @@ impl Square {
         sq ^ 56
     }
 
+    #[inline(always)]
+    pub const fn name(sq: u8) -> &'static str {
+        SQUARE_NAMES[sq as usize]
+    }
+
     pub fn to_algebraic(sq: u8) -> String {
-        let file = (b'a' + (sq % 8)) as char;
-        let rank = (b'1' + (sq / 8)) as char;
-        format!("{}{}", file, rank)
+        Self::name(sq).to_string()
     }
 
     pub fn from_algebraic(s: &str) -> Option<u8> {
@@ -457,6 +479,11 @@ mod tests {
         assert_eq!(list.len(), 2);
         assert_eq!(list[0].from_sq(), 12);
         assert_eq!(list[1].is_capture(), true);
+
+        list.push(Move::normal(6, 21));
+        list.retain(|m| !m.is_capture());
+        assert_eq!(list.len(), 2);
+        assert_eq!(list[1].from_sq(), 6);
     }
 
     #[test]
@@ -464,6 +491,8 @@ mod tests {
         let pxq = mvv_lva_score(4, 0); // Queen victim, Pawn attacker
         let qxp = mvv_lva_score(0, 4); // Pawn victim, Queen attacker
         assert!(pxq > qxp);
+        assert_eq!(mvv_lva_score(6, 0), 0); // Empty target
+        assert_eq!(mvv_lva_score(0, 6), 0);
     }
 
     #[test]
@@ -473,4 +502,15 @@ mod tests {
         assert_eq!(Square::make(4, 1), 12); // e2
         assert_eq!(Square::flip(12), 52); // e2 -> e7
     }
+
+    #[test]
+    fn test_square_names() {
+        for sq in 0..64u8 {
+            assert_eq!(Square::from_algebraic(Square::name(sq)), Some(sq));
+        }
+        assert_eq!(Square::name(0), "a1");
+        assert_eq!(Square::name(63), "h8");
+        let m = Move::new(52, 60, Move::FLAG_PROMO_QUEEN);
+        assert_eq!(m.to_algebraic(), "e7e8q");
+    }
 }